@@ -0,0 +1,237 @@
+import math
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from models import Option, Question, Quiz, QuizAttempt, StudentAnswer
+
+# Item difficulties are Rasch logits: P(correct) = 1 / (1 + exp(b - ability)).
+# Items with little history lean on a prior from the quiz's difficulty label.
+DIFFICULTY_PRIORS = {"easy": -1.0, "medium": 0.0, "hard": 1.0}
+PRIOR_WEIGHT = 4 # pseudo-answers behind the prior
+MAX_DIFFICULTY = 4.0
+
+# Elo-style ability updates: big steps first, settling as evidence builds up
+BASE_K = 1.0
+MIN_K = 0.25
+
+DEFAULT_MAX_QUESTIONS = 10
+
+ITEM_INDEX_TTL_SECONDS = 600
+SESSION_TTL_SECONDS = 3 * 60 * 60
+MAX_SESSIONS = 10000
+
+
+def probability_correct(ability: float, difficulty: float) -> float:
+    return 1 / (1 + math.exp(difficulty - ability))
+
+
+def calibrate_difficulty(correct: int, answered: int, prior: float = 0.0) -> float:
+    """Rasch difficulty from answer history, smoothed towards `prior`."""
+    p = (correct + PRIOR_WEIGHT * probability_correct(0.0, prior)) / (answered + PRIOR_WEIGHT)
+    b = math.log((1 - p) / p)
+    return max(-MAX_DIFFICULTY, min(MAX_DIFFICULTY, b))
+
+
+class ItemIndex:
+    """
+    A quiz's questions sorted by calibrated difficulty, with everything needed
+    to serve and grade them, so per-click selection never touches the database.
+    """
+
+    def __init__(self, quiz_id: int, items: list, built_at: float = None):
+        # items: (difficulty, question_id, payload, correct_option_ids)
+        items = sorted(items, key=lambda item: (item[0], item[1]))
+        self.quiz_id = quiz_id
+        self.difficulties = [item[0] for item in items]
+        self.question_ids = [item[1] for item in items]
+        self.payloads = {item[1]: item[2] for item in items}
+        self.correct_options = {item[1]: item[3] for item in items}
+        self.difficulty_of = {item[1]: item[0] for item in items}
+        self.built_at = built_at if built_at is not None else time.monotonic()
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    def nearest(self, target: float, exclude) -> Optional[int]:
+        """
+        Unanswered question whose difficulty is closest to `target`: bisect,
+        then walk outwards past questions already asked.
+        """
+        n = len(self.difficulties)
+        right = bisect_left(self.difficulties, target)
+        left = right - 1
+        while left >= 0 or right < n:
+            if right < n and self.question_ids[right] in exclude:
+                right += 1
+                continue
+            if left >= 0 and self.question_ids[left] in exclude:
+                left -= 1
+                continue
+            if right >= n:
+                return self.question_ids[left]
+            if left < 0:
+                return self.question_ids[right]
+            if target - self.difficulties[left] <= self.difficulties[right] - target:
+                return self.question_ids[left]
+            return self.question_ids[right]
+        return None
+
+
+def build_item_index(db: Session, quiz: Quiz) -> ItemIndex:
+    """Calibrate a quiz's questions from all recorded answers."""
+    prior = DIFFICULTY_PRIORS.get((quiz.difficulty or "").lower(), 0.0)
+
+    history = {
+        question_id: (correct or 0, answered)
+        for question_id, correct, answered in db.execute(
+            select(StudentAnswer.question_id, func.sum(StudentAnswer.is_correct), func.count())
+            .join(Question, Question.id == StudentAnswer.question_id)
+            .where(Question.quiz_id == quiz.id)
+            .group_by(StudentAnswer.question_id)
+        )
+    }
+
+    questions = {}
+    for question_id, text, option_id, option_text, is_correct in db.execute(
+        select(Question.id, Question.text, Option.id, Option.text, Option.is_correct)
+        .outerjoin(Option, Option.question_id == Question.id)
+        .where(Question.quiz_id == quiz.id)
+        .order_by(Question.id, Option.id)
+    ):
+        payload, correct_ids = questions.setdefault(question_id, ({"id": question_id, "text": text, "options": []}, set()))
+        if option_id is not None:
+            payload["options"].append({"id": option_id, "text": option_text}) # Exclude is_correct
+            if is_correct:
+                correct_ids.add(option_id)
+
+    items = []
+    for question_id, (payload, correct_ids) in questions.items():
+        correct, answered = history.get(question_id, (0, 0))
+        items.append((calibrate_difficulty(correct, answered, prior), question_id, payload, frozenset(correct_ids)))
+    return ItemIndex(quiz.id, items)
+
+
+class AdaptiveSession:
+    """One student's run through an adaptive quiz."""
+
+    def __init__(self, quiz_id: int, attempt_id: int, max_questions: int):
+        self.quiz_id = quiz_id
+        self.attempt_id = attempt_id
+        self.max_questions = max_questions
+        self.ability = 0.0
+        self.information = 0.0
+        self.asked = set()
+        self.answers = {} # question_id -> selected_option_id
+        self.current = None
+        self.touched = time.monotonic()
+
+    def record(self, index: ItemIndex, question_id: int, option_id: int) -> bool:
+        difficulty = index.difficulty_of[question_id]
+        correct = option_id in index.correct_options[question_id]
+        p = probability_correct(self.ability, difficulty)
+        k = max(MIN_K, BASE_K / math.sqrt(len(self.answers) + 1))
+        self.ability += k * ((1 if correct else 0) - p)
+        self.information += p * (1 - p)
+        self.answers[question_id] = option_id
+        return correct
+
+    @property
+    def standard_error(self) -> Optional[float]:
+        return 1 / math.sqrt(self.information) if self.information else None
+
+
+class AdaptiveEngine:
+    """
+    In-process item indexes (per quiz, rebuilt after ITEM_INDEX_TTL_SECONDS)
+    and adaptive sessions (per student and quiz, least recently used evicted).
+    """
+
+    def __init__(self):
+        self._indexes = {}
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def item_index(self, db: Session, quiz_id: int) -> Optional[ItemIndex]:
+        index = self._indexes.get(quiz_id)
+        if index is None or time.monotonic() - index.built_at > ITEM_INDEX_TTL_SECONDS:
+            quiz = db.query(Quiz).filter(Quiz.id == quiz_id).first()
+            if not quiz:
+                return None
+            index = build_item_index(db, quiz)
+            self._indexes[quiz_id] = index
+        return index
+
+    def invalidate(self, quiz_id: int):
+        self._indexes.pop(quiz_id, None)
+        with self._lock:
+            for key in [key for key in self._sessions if key[1] == quiz_id]:
+                del self._sessions[key]
+
+    def session(self, student_id: int, quiz_id: int) -> Optional[AdaptiveSession]:
+        with self._lock:
+            session = self._sessions.get((student_id, quiz_id))
+            if session is None:
+                return None
+            if time.monotonic() - session.touched > SESSION_TTL_SECONDS:
+                del self._sessions[(student_id, quiz_id)]
+                return None
+            self._sessions.move_to_end((student_id, quiz_id))
+            session.touched = time.monotonic()
+            return session
+
+    def start_session(self, student_id: int, quiz_id: int, attempt_id: int, max_questions: int) -> AdaptiveSession:
+        session = AdaptiveSession(quiz_id, attempt_id, max_questions)
+        with self._lock:
+            self._sessions[(student_id, quiz_id)] = session
+            self._sessions.move_to_end((student_id, quiz_id))
+            while len(self._sessions) > MAX_SESSIONS:
+                self._sessions.popitem(last=False)
+        return session
+
+    def end_session(self, student_id: int, quiz_id: int):
+        with self._lock:
+            self._sessions.pop((student_id, quiz_id), None)
+
+
+def next_question(index: ItemIndex, session: AdaptiveSession) -> Optional[dict]:
+    """Pick the unanswered question nearest the student's ability, or None when done."""
+    if len(session.answers) >= min(session.max_questions, len(index)):
+        return None
+    if session.current is None:
+        session.current = index.nearest(session.ability, session.asked)
+        if session.current is None:
+            return None
+        session.asked.add(session.current)
+    return index.payloads[session.current]
+
+
+def session_state(session: AdaptiveSession) -> dict:
+    return {
+        "attempt_id": session.attempt_id,
+        "answered": len(session.answers),
+        "max_questions": session.max_questions,
+        "ability": round(session.ability, 3),
+        "standard_error": round(session.standard_error, 3) if session.standard_error else None,
+        # Ready for /submit once the quiz is done
+        "answers": [
+            {"question_id": question_id, "selected_option_id": option_id}
+            for question_id, option_id in session.answers.items()
+        ],
+    }
+
+
+def find_open_attempt(db: Session, quiz_id: int, student_id: int) -> Optional[QuizAttempt]:
+    return db.query(QuizAttempt).filter(
+        QuizAttempt.quiz_id == quiz_id,
+        QuizAttempt.student_id == student_id,
+        QuizAttempt.status != "completed"
+    ).first()
+
+
+adaptive_engine = AdaptiveEngine()
@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from database import get_db
+from models import User
+from auth import get_current_user
+from student_analytics import get_student_dashboard
+from teacher_analytics import get_teacher_rollup
+
+router = APIRouter()
+
+@router.get("/me")
+def get_my_progress(
+    days: int = Query(30, ge=1, le=365),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Progress dashboard: totals, streak, daily activity for the last `days`
+    days, per-goal and per-topic numbers. Served from the precomputed
+    aggregate tables, so the cost doesn't grow with the student's history.
+    """
+    return get_student_dashboard(db, current_user.id, days)
+
+@router.get("/teacher")
+def get_teacher_dashboard(
+    days: int = Query(30, ge=1, le=365),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Cohort rollup across all of the teacher's quizzes: per quiz attempts,
+    completion rate, mean/median score and average time; per topic accuracy
+    with a daily trend over the last `days` days.
+    """
+    if not current_user.teacher_profile:
+        raise HTTPException(status_code=403, detail="Teacher profile not found")
+    return get_teacher_rollup(db, current_user.teacher_profile.id, days)
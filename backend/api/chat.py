@@ -1,26 +1,17 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-import google.generativeai as genai
-import os
+from google.api_core.exceptions import ResourceExhausted
 import time
 
-# Load environment variables
-from dotenv import load_dotenv
-from pathlib import Path
-
-# Explicitly load .env from project root
-env_path = Path(__file__).resolve().parent.parent.parent / '.env'
-load_dotenv(dotenv_path=env_path)
+from auth import get_current_user
+from models import User
+from llm import get_model, llm_configured
+from rate_limit import llm_governor, govern, RateLimitExceeded, PRIORITY_CHAT
 
 router = APIRouter()
 
-# Configure Gemini
-GENAI_API_KEY = os.getenv("GEMINI_API_KEY")
-
-if not GENAI_API_KEY:
+if not llm_configured():
     print("WARNING: GEMINI_API_KEY not found environment variables. Doubt Solver will not work.")
-else:
-    genai.configure(api_key=GENAI_API_KEY)
 
 class ChatRequest(BaseModel):
     message: str
@@ -31,29 +22,41 @@ class ChatResponse(BaseModel):
     timestamp: float
 
 @router.post("/chat")
-async def chat_with_ai(request: ChatRequest):
+def chat_with_ai(request: ChatRequest, current_user: User = Depends(get_current_user)):
     if not request.message.strip():
         raise HTTPException(status_code=400, detail="Message cannot be empty")
-    
-    if not GENAI_API_KEY:
+
+    if not llm_configured():
          raise HTTPException(status_code=500, detail="Server misconfiguration: API Key missing.")
 
     try:
-        # Initialize the model
-        model = genai.GenerativeModel('gemini-flash-latest')
-        
+        # Shared limiter for remote backends: per-user first, then a role/global
+        # slot per message (chat yields to quiz generation)
+        model = govern(get_model(), current_user.role, PRIORITY_CHAT)
+        if model.rate_limited:
+            llm_governor.check_user(current_user.id, PRIORITY_CHAT)
+
         # Prepare chat history if needed (Gemini supports history, but we'll start simple)
         # For now, we'll just send the current message as a prompt.
         # Ideally, map 'history' from request to Gemini's expected format.
-        
+
         chat = model.start_chat(history=[]) # You can convert request.history here
-        
+
         response = chat.send_message(request.message)
-        
+
         return {
             "response": response.text,
             "timestamp": time.time()
         }
+    except RateLimitExceeded as e:
+        raise HTTPException(
+            status_code=429,
+            detail="The AI tutor is busy right now. Please try again shortly.",
+            headers={"Retry-After": str(max(1, int(e.retry_after + 0.5)))}
+        )
+    except ResourceExhausted as e:
+        print(f"Gemini quota exceeded: {e}")
+        raise HTTPException(status_code=429, detail="AI quota exceeded. Please try again shortly.", headers={"Retry-After": "30"})
     except Exception as e:
         print(f"Gemini API Error: {e}")
         raise HTTPException(status_code=500, detail=f"AI Error: {str(e)}")
@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from database import get_db
-from models import StudyGoal, User
+from models import StudyGoal, CreateTaskAI, User
 from auth import get_current_user
+from task_sync import bump_plan_version, delete_tasks
+from student_analytics import set_task_status
 
 router = APIRouter()
 
@@ -24,8 +26,11 @@ def delete_goal(
         raise HTTPException(status_code=403, detail="Not authorized to delete this goal")
 
     # Delete the goal
-    # database is configured with ON DELETE CASCADE for tasks, so we just delete the goal
+    # database is configured with ON DELETE CASCADE for tasks, but delete them explicitly
+    # first so they leave tombstones for planner delta sync
+    delete_tasks(db, "ai", current_user.id, CreateTaskAI.goal_id == goal_id)
     db.delete(goal)
+    bump_plan_version(db, current_user.id)
     db.commit()
 
     return {"message": "Goal deleted successfully"}
@@ -55,14 +60,13 @@ def complete_goal(
         # Import models here to avoid circular imports if any, or ensure top-level import
         from models import CreateTaskAI, CreateTaskManual
         
-        # Update AI Tasks
-        db.query(CreateTaskAI).filter(
-            CreateTaskAI.goal_id == goal_id,
-            CreateTaskAI.student_id == current_user.id
-        ).update({CreateTaskAI.task_status: status}, synchronize_session=False)
+        # Update AI Tasks (keeps the progress aggregates in step)
+        set_task_status(db, "ai", current_user.id, status, CreateTaskAI.goal_id == goal_id)
 
         # 4. Manual Tasks - (Skip as discussed in previous analysis - no safe link)
         
+        bump_plan_version(db, current_user.id)
+
         # 5. Commit
         db.commit()
     except Exception as e:
@@ -1,17 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, or_, select, update
 from typing import List, Optional
-from database import get_db
+from fastapi.responses import StreamingResponse
+from database import get_db, SessionLocal
 
-from models import Quiz, Question, Option, User, QuizAttempt, StudentAnswer, StudentTeacherFollow, Student, Teacher
+from models import Quiz, Question, Option, User, QuizAttempt, StudentAnswer, StudentTeacherFollow, Student, Teacher, AIJob
 from pydantic import BaseModel
 from datetime import datetime
-import google.generativeai as genai
+from google.api_core.exceptions import ResourceExhausted
 import os
 import json
-import re
-from auth import get_current_user
+import threading
+import time
+from collections import OrderedDict
+from auth import authenticate_token, get_current_user, oauth2_scheme, user_from_token
+from starlette.concurrency import run_in_threadpool
+from event_bus import event_bus, publish_attempt_event, quiz_topic
+from jobs import job_queue, job_to_response, job_topic, JOB_DONE_STATES
+from llm import get_model, llm_configured, TASK_QUIZ
+from quiz_generation import IncompleteQuizError, generate_quiz
+from quiz_schemas import QuestionCreate
+from adaptive_quiz import DEFAULT_MAX_QUESTIONS, adaptive_engine, find_open_attempt, next_question, session_state
+from item_analysis import load_item_analysis
+from write_buffer import WARNING_FLUSH_SECONDS, answer_buffer, restore_rows, warning_buffer
+from quiz_export import EXPORT_FORMATS, EXPORT_KINDS, parquet_available, stream_quiz_export
+from teacher_analytics import forget_quiz, record_attempt_started
+from quiz_grading import attempt_expires_at, format_duration, grade_attempt, is_past
+from attempt_scheduler import attempt_scheduler
+from rate_limit import llm_governor, govern, RateLimitExceeded, PRIORITY_GENERATION, PRIORITY_CHAT
 
 router = APIRouter()
 
@@ -19,14 +36,6 @@ router = APIRouter()
 
 # --- Pydantic Models ---
 
-class OptionCreate(BaseModel):
-    text: str
-    is_correct: bool
-
-class QuestionCreate(BaseModel):
-    text: str
-    options: List[OptionCreate]
-
 class QuizCreate(BaseModel):
     title: str
     description: str
@@ -65,6 +74,18 @@ class QuizSubmission(BaseModel):
     submission_type: Optional[str] = "manual"
     tab_switch_count: Optional[int] = None
 
+class AutosaveRequest(BaseModel):
+    answers: List[SubmissionAnswer]
+
+class AdaptiveAnswer(BaseModel):
+    question_id: int
+    selected_option_id: int
+
+class AdaptiveStep(BaseModel):
+    answer: Optional[AdaptiveAnswer] = None # Answer to the question served last
+    max_questions: Optional[int] = None # Used when the adaptive run starts
+    restart: bool = False
+
 class GenerateQuizRequest(BaseModel):
     subject: str
     topic: str
@@ -115,24 +136,9 @@ def list_quizzes(db: Session = Depends(get_db), current_user: User = Depends(get
         status = "active"
         score = None
         attempted_count = None
-        is_expired = False
-        
-        # Calculate expiry
-        if q.deadline:
-            # Ensure deadline is aware for comparison
-            # Treat naive DB value as UTC (Strict Source of Truth)
-            deadline_val = q.deadline
-            if deadline_val.tzinfo is None:
-                deadline_val = deadline_val.replace(tzinfo=timezone.utc)
-            else:
-                 # Already aware, convert to UTC to be safe
-                 deadline_val = deadline_val.astimezone(timezone.utc)
-            
-            if now > deadline_val:
-                is_expired = True
-
-        # Ensure the response uses the aware UTC datetime which serializes to ISO 8601 with Z
-        deadline_response = deadline_val if q.deadline else None
+        # Loaded as aware UTC (models.UTCDateTime), so it serializes as ISO 8601 with an offset
+        deadline_response = q.deadline
+        is_expired = is_past(deadline_response, now)
 
         attempt = attempts_map.get(q.id)
         if attempt:
@@ -180,20 +186,28 @@ def start_quiz(quiz_id: int, db: Session = Depends(get_db), current_user: User =
     
     if not attempt:
         # Create new attempt with start time
-        now_str = datetime.utcnow().isoformat()
+        start_time = datetime.now(timezone.utc)
         attempt = QuizAttempt(
             quiz_id=quiz_id,
             student_id=student_id,
-            start_time=now_str,
+            start_time=start_time,
+            expires_at=attempt_expires_at(start_time, quiz.duration_minutes, quiz.deadline),
             status="started"
         )
         db.add(attempt)
+        record_attempt_started(db, quiz)
         db.commit()
         db.refresh(attempt)
+        publish_attempt_event("started", quiz_id, attempt.id, student_id, start_time=attempt.start_time.isoformat())
     elif not attempt.start_time:
         # Backfill start time if missing (e.g. re-entering started quiz)
-        attempt.start_time = datetime.utcnow().isoformat()
+        attempt.start_time = datetime.now(timezone.utc)
+        attempt.expires_at = attempt_expires_at(attempt.start_time, quiz.duration_minutes, quiz.deadline)
         db.commit()
+
+    if attempt.status != "completed":
+        # Auto-submit from the saved answers once time runs out
+        attempt_scheduler.schedule(attempt.id, attempt.expires_at)
     
     return {"message": "Quiz started", "attempt_id": attempt.id, "start_time": attempt.start_time}
 
@@ -211,94 +225,124 @@ def submit_quiz(quiz_id: int, submission: QuizSubmission, db: Session = Depends(
 
     # Check deadline
     quiz = db.query(Quiz).filter(Quiz.id == quiz_id).first()
-    if quiz and quiz.deadline:
-        # Strict expiry check with UTC awareness
-        deadline_val = quiz.deadline
-        if deadline_val.tzinfo is None:
-             deadline_val = deadline_val.replace(tzinfo=timezone.utc)
-        else:
-             deadline_val = deadline_val.astimezone(timezone.utc)
-        
-        now = datetime.now(timezone.utc)
-        if now > deadline_val:
-             raise HTTPException(status_code=400, detail="Quiz has expired") 
-
-    score = 0
-    attempted_count = len(submission.answers)
-    
-    submitted_option_ids = [answer.selected_option_id for answer in submission.answers]
-    
-    if submitted_option_ids:
-        fetched_options = db.query(Option).filter(Option.id.in_(submitted_option_ids)).all()
-        options_map = {opt.id: opt for opt in fetched_options}
-    else:
-        options_map = {}
+    if quiz and is_past(quiz.deadline):
+         raise HTTPException(status_code=400, detail="Quiz has expired") 
 
-    for answer in submission.answers:
-        option = options_map.get(answer.selected_option_id)
-        if option and option.is_correct:
-            score += 1
-            
-    now_str = datetime.utcnow().isoformat()
     submission_type = getattr(submission, 'submission_type', 'manual') # Handle optional field safely
     tab_switch_count = getattr(submission, 'tab_switch_count', None)
 
     if not attempt:
         # Fallback if start wasn't called (shouldn't happen in new flow)
+        start_time = datetime.now(timezone.utc) # Approximation
         attempt = QuizAttempt(
             quiz_id=quiz_id,
             student_id=student_id,
-            start_time=now_str, # Approximation
+            start_time=start_time,
+            expires_at=attempt_expires_at(start_time, quiz.duration_minutes, quiz.deadline) if quiz else None,
             status="started"
         )
         db.add(attempt)
-    
-    # Get actual total questions count from DB
-    total_questions_count = db.query(Question).filter(Question.quiz_id == quiz_id).count()
-
-    attempt.score = score
-    attempt.total_questions = total_questions_count
-    attempt.status = "completed"
-    attempt.timestamp = now_str
-    attempt.submission_type = submission_type
-    attempt.tab_switch_count = tab_switch_count
-    
-    db.commit()
-    db.refresh(attempt)
+        if quiz:
+            record_attempt_started(db, quiz)
 
-    # Save Student Answers
-    # First clear existing answers for this attempt (retry logic)
-    db.query(StudentAnswer).filter(StudentAnswer.attempt_id == attempt.id).delete()
-    
-    for answer in submission.answers:
-        if not answer.selected_option_id:
-            continue
-            
-        option = options_map.get(answer.selected_option_id)
-        is_correct = 1 if (option and option.is_correct) else 0
-        
-        student_ans = StudentAnswer(
-            attempt_id=attempt.id,
-            question_id=answer.question_id,
-            selected_option_id=answer.selected_option_id,
-            is_correct=is_correct
+    # Autosaved answers are the starting point; answers in the payload override them
+    taken_rows = []
+    try:
+        result = grade_attempt(
+            db, attempt, quiz, current_user.id, submission.answers,
+            submission_type=submission_type, tab_switch_count=tab_switch_count, taken_rows=taken_rows
         )
-        db.add(student_ans)
-    
-    db.commit()
-    
+        if result is not None:
+            db.commit()
+    except Exception:
+        # Buffered answers were moved into the rolled back transaction
+        db.rollback()
+        restore_rows(taken_rows)
+        raise
+    if result is None:
+        # Finalized meanwhile by the expiry scheduler
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Quiz already submitted")
+    _forget_warning_attempt(attempt.id)
+
+    score = result["score"]
+    total_questions = result["total_questions"]
+    publish_attempt_event("submitted", quiz_id, attempt.id, student_id, submission_type=submission_type, **result)
+
     return {
         "message": "Quiz submitted successfully",
         "quiz_id": quiz_id,
         "student_id": student_id,
         "status": "attempted", # Frontend expects 'attempted' to show Result button
         "score": score,
-        "total_questions": attempt.total_questions,
-        "percentage": round((score / attempt.total_questions * 100)) if attempt.total_questions > 0 else 0
+        "total_questions": total_questions,
+        "percentage": round((score / total_questions * 100)) if total_questions > 0 else 0
     }
 
 # ... (AI Generation endpoint remains)
 
+@router.post("/{quiz_id}/adaptive/next")
+def adaptive_next_question(quiz_id: int, step: AdaptiveStep, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """
+    Adaptive mode: record the answer to the current question (if any) and
+    serve the unanswered question whose difficulty is closest to the
+    student's updated ability estimate. When it reports done, the collected
+    answers go to /submit as usual.
+    """
+    if not current_user.student_profile:
+         raise HTTPException(status_code=400, detail="Student profile not found")
+    student_id = current_user.student_profile.id
+
+    index = adaptive_engine.item_index(db, quiz_id)
+    if index is None:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+
+    # 1. Start (or resume) the adaptive run for the student's open attempt
+    session = None if step.restart else adaptive_engine.session(student_id, quiz_id)
+    if session is None:
+        attempt = find_open_attempt(db, quiz_id, student_id)
+        if not attempt:
+            raise HTTPException(status_code=400, detail="Start the quiz before requesting questions")
+        max_questions = min(step.max_questions or DEFAULT_MAX_QUESTIONS, len(index))
+        session = adaptive_engine.start_session(student_id, quiz_id, attempt.id, max(1, max_questions))
+
+    # 2. Grade the answer in memory and update the ability estimate
+    if step.answer:
+        if step.answer.question_id != session.current:
+            raise HTTPException(status_code=400, detail="Answer does not match the current question")
+        if not any(opt["id"] == step.answer.selected_option_id for opt in index.payloads[session.current]["options"]):
+            raise HTTPException(status_code=400, detail=f"Invalid answer for question {step.answer.question_id}")
+        correct = session.record(index, step.answer.question_id, step.answer.selected_option_id)
+        session.current = None
+        # Saved like /answers autosaves, so an auto-submit or a restart keeps it
+        answer_buffer.put({
+            "attempt_id": session.attempt_id,
+            "question_id": step.answer.question_id,
+            "selected_option_id": step.answer.selected_option_id,
+            "is_correct": 1 if correct else 0
+        })
+
+    # 3. Next question, nearest the new estimate
+    served = len(session.asked)
+    question = next_question(index, session)
+
+    # 4. Keep the attempt's question count in step, so grading (including the
+    # auto-submit) scores the run against the questions it actually served
+    if len(session.asked) > served:
+        db.execute(
+            update(QuizAttempt)
+            .where(
+                QuizAttempt.id == session.attempt_id,
+                QuizAttempt.status != "completed",
+                or_(QuizAttempt.questions_served.is_(None), QuizAttempt.questions_served < len(session.asked))
+            )
+            .values(questions_served=len(session.asked))
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+
+    return {"done": question is None, "question": question, **session_state(session)}
+
 @router.get("/{quiz_id}/analytics")
 def get_quiz_analytics(quiz_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     # Verify quiz exists
@@ -311,48 +355,25 @@ def get_quiz_analytics(quiz_id: int, db: Session = Depends(get_db), current_user
         .join(User, Student.user_id == User.id)\
         .filter(
             QuizAttempt.quiz_id == quiz_id,
-            QuizAttempt.status == "completed" 
+            QuizAttempt.status == "completed",
+            QuizAttempt.timestamp.isnot(None)
         ).order_by(QuizAttempt.timestamp.desc()).all()
     
-    results = []
-    for attempt, user, student in attempts:
-        # Double check for timestamp validity
-        if not attempt.timestamp or attempt.timestamp == "":
-            continue
-
-        # Validate and convert timestamps
-        time_taken_str = "—"
-        if attempt.start_time and attempt.timestamp:
-            try:
-                start = attempt.start_time
-                if isinstance(start, str):
-                    start = datetime.fromisoformat(start)
-                
-                end = attempt.timestamp
-                if isinstance(end, str):
-                    end = datetime.fromisoformat(end)
+    # Attempted count per attempt: unique StudentAnswers with actual selections, in one query
+    attempted_counts = dict(
+        db.query(StudentAnswer.attempt_id, func.count(func.distinct(StudentAnswer.question_id)))
+        .join(QuizAttempt, StudentAnswer.attempt_id == QuizAttempt.id)
+        .filter(QuizAttempt.quiz_id == quiz_id, StudentAnswer.selected_option_id.isnot(None))
+        .group_by(StudentAnswer.attempt_id).all()
+    )
 
-                duration = end - start
-                
-                total_seconds = int(duration.total_seconds())
-                minutes = total_seconds // 60
-                seconds = total_seconds % 60
-                
-                if minutes > 0:
-                    time_taken_str = f"{minutes}m {seconds}s"
-                else:
-                    time_taken_str = f"{seconds}s"
-            except ValueError:
-                pass
+    total_questions = db.query(Question).filter(Question.quiz_id == quiz_id).count()
 
+    results = []
+    for attempt, user, student in attempts:
         # Use Student name if available, else fallback to User name
         student_name = student.full_name if (student and student.full_name) else user.full_name
-
-        # Calculate attempted count by counting unique StudentAnswers with actual selections
-        attempted_count = db.query(StudentAnswer.question_id).filter(
-            StudentAnswer.attempt_id == attempt.id,
-            StudentAnswer.selected_option_id.isnot(None)
-        ).distinct().count()
+        attempted_count = attempted_counts.get(attempt.id, 0)
         
         results.append({
             "id": attempt.id,
@@ -360,11 +381,11 @@ def get_quiz_analytics(quiz_id: int, db: Session = Depends(get_db), current_user
             "student_email": user.email,
             "score": attempt.score,
             "attempted_count": attempted_count,
-            "total_questions": len(quiz.questions) if quiz.questions else 0, # Add total questions info if needed
+            "total_questions": attempt.total_questions if attempt.questions_served else total_questions,
             "submitted_at": attempt.timestamp,
             "warnings_count": attempt.warnings_count,
             "tab_switch_count": attempt.tab_switch_count,
-            "time_taken": time_taken_str, 
+            "time_taken": format_duration(attempt.duration_seconds),
             "submission_type": attempt.submission_type or "manual"
         })
         
@@ -373,55 +394,149 @@ def get_quiz_analytics(quiz_id: int, db: Session = Depends(get_db), current_user
 
 @router.post("/generate-ai")
 def generate_quiz_ai(request: GenerateQuizRequest, current_user: User = Depends(get_current_user)):
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
+    if not llm_configured(TASK_QUIZ):
         raise HTTPException(status_code=500, detail="Gemini API Key not configured")
 
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-flash-latest')
+    if request.count < 1:
+        raise HTTPException(status_code=400, detail="Question count must be at least 1")
 
-    prompt = f"""
-    Generate a quiz for the following parameters:
-    Subject: {request.subject}
-    Topic: {request.topic}
-    Difficulty: {request.difficulty}
-    Number of Questions: {request.count}
-    
-    Provide the response strictly in valid JSON format with the following structure:
-    {{
-        "title": "A creative, short, professional title (e.g., 'Routing Protocols Fundamentals' instead of 'Routing Quiz')",
-        "description": "A brief, professional description of what the quiz covers (1-2 sentences).",
-        "questions": [
-            {{
-                "text": "Question text here?",
-                "options": [
-                    {{"text": "Option A", "is_correct": false}},
-                    {{"text": "Option B", "is_correct": true}},
-                    {{"text": "Option C", "is_correct": false}},
-                    {{"text": "Option D", "is_correct": false}}
-                ]
-            }}
-        ]
-    }}
-    Ensure there are exactly 4 options per question and exactly one correct answer.
-    No markdown code blocks, just raw JSON.
-    """
+    # Teachers' generation is served ahead of chat when the shared limiter is queueing
+    priority = PRIORITY_GENERATION if current_user.role == "teacher" else PRIORITY_CHAT
+    model = govern(get_model(TASK_QUIZ), current_user.role, priority)
 
     try:
-        response = model.generate_content(prompt)
-        text = response.text
-        
-        # Clean potential markdown formatting
-        text = re.sub(r"```json\s*", "", text)
-        text = re.sub(r"```", "", text)
-        
-        quiz_data = json.loads(text)
+        if model.rate_limited:
+            llm_governor.check_user(current_user.id, priority)
+
+        # Large quizzes are generated as parallel chunks and merged
+        quiz_data = generate_quiz(model, request.subject, request.topic, request.difficulty, request.count)
         return quiz_data
-        
+
+    except RateLimitExceeded as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Quiz generation is busy right now. Please try again shortly.",
+            headers={"Retry-After": str(max(1, int(e.retry_after + 0.5)))}
+        )
+    except ResourceExhausted:
+        raise HTTPException(status_code=429, detail="AI quota exceeded. Please try again shortly.", headers={"Retry-After": "30"})
+    except IncompleteQuizError as e:
+        raise HTTPException(status_code=502, detail=f"Failed to generate quiz: {str(e)}")
     except Exception as e:
 
         raise HTTPException(status_code=500, detail=f"Failed to generate quiz: {str(e)}")
 
+# --- Background AI Generation Jobs ---
+
+# How often the event stream re-reads job state, and how long it stays open.
+# Jobs run by this process push their progress, so the poll only matters for
+# jobs running in another process.
+JOB_STREAM_POLL_SECONDS = 5.0
+JOB_STREAM_TIMEOUT_SECONDS = 600
+# Idle seconds before a live event stream sends a keepalive
+EVENT_STREAM_KEEPALIVE_SECONDS = 15
+
+def run_quiz_generation_job(payload: dict, progress):
+    model = govern(get_model(TASK_QUIZ), payload["role"], payload["priority"])
+    return generate_quiz(
+        model,
+        payload["subject"],
+        payload["topic"],
+        payload["difficulty"],
+        payload["count"],
+        progress=progress
+    )
+
+job_queue.register("quiz_generation", run_quiz_generation_job)
+
+@router.post("/generate-ai/jobs", status_code=status.HTTP_202_ACCEPTED)
+def submit_quiz_generation_job(request: GenerateQuizRequest, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """
+    Queue AI quiz generation and return a job id immediately.
+    Poll GET /generate-ai/jobs/{job_id} or stream /generate-ai/jobs/{job_id}/events for progress.
+    """
+    if not llm_configured(TASK_QUIZ):
+        raise HTTPException(status_code=500, detail="Gemini API Key not configured")
+
+    if request.count < 1:
+        raise HTTPException(status_code=400, detail="Question count must be at least 1")
+
+    priority = PRIORITY_GENERATION if current_user.role == "teacher" else PRIORITY_CHAT
+
+    try:
+        if get_model(TASK_QUIZ).rate_limited:
+            llm_governor.check_user(current_user.id, priority)
+    except RateLimitExceeded as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Quiz generation is busy right now. Please try again shortly.",
+            headers={"Retry-After": str(max(1, int(e.retry_after + 0.5)))}
+        )
+
+    job = job_queue.submit(db, "quiz_generation", current_user.id, {
+        "subject": request.subject,
+        "topic": request.topic,
+        "difficulty": request.difficulty,
+        "count": request.count,
+        "role": current_user.role,
+        "priority": priority
+    }, total=request.count)
+
+    return {"job_id": job.job_id, "status": job.status}
+
+@router.get("/generate-ai/jobs/{job_id}")
+def get_quiz_generation_job(job_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    job = db.query(AIJob).filter(AIJob.job_id == job_id, AIJob.user_id == current_user.id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_to_response(job)
+
+def _load_job_response(job_id: str) -> Optional[dict]:
+    session = SessionLocal()
+    try:
+        job = session.query(AIJob).filter(AIJob.job_id == job_id).first()
+        return job_to_response(job) if job else None
+    finally:
+        session.close()
+
+@router.get("/generate-ai/jobs/{job_id}/events")
+def stream_quiz_generation_job(job_id: str, token: str = Depends(oauth2_scheme)):
+    """
+    Server-Sent Events stream of job progress; closes once the job completes or fails.
+    """
+    # Short-lived session: the stream must not keep a pooled connection open
+    db = SessionLocal()
+    try:
+        current_user = authenticate_token(db, token)
+        job = db.query(AIJob.job_id).filter(AIJob.job_id == job_id, AIJob.user_id == current_user.id).first()
+    finally:
+        db.close()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        # Jobs run by this process publish their progress, which wakes the stream
+        # at once; jobs running in another process are picked up by the poll
+        subscription = event_bus.subscribe(job_topic(job_id))
+        try:
+            last_seen = None
+            deadline = time.monotonic() + JOB_STREAM_TIMEOUT_SECONDS
+            while time.monotonic() < deadline:
+                current = await run_in_threadpool(_load_job_response, job_id)
+                if current is None:
+                    break
+                snapshot = (current["status"], current["progress"])
+                if snapshot != last_seen:
+                    last_seen = snapshot
+                    yield f"event: {current['status']}\ndata: {json.dumps(current, default=str)}\n\n"
+                if current["status"] in JOB_DONE_STATES:
+                    break
+                await subscription.next_events(JOB_STREAM_POLL_SECONDS)
+        finally:
+            subscription.close()
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @router.post("/")
 def create_quiz(quiz_data: QuizCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     # Use authenticated user ID
@@ -516,14 +631,8 @@ def get_quiz(quiz_id: int, db: Session = Depends(get_db)):
     
     # Check deadline
     deadline_val = quiz.deadline
-    if deadline_val:
-        if deadline_val.tzinfo is None:
-             deadline_val = deadline_val.replace(tzinfo=timezone.utc)
-        else:
-             deadline_val = deadline_val.astimezone(timezone.utc)
-
-        if datetime.now(timezone.utc) > deadline_val:
-             raise HTTPException(status_code=400, detail="Quiz has expired")
+    if is_past(deadline_val):
+         raise HTTPException(status_code=400, detail="Quiz has expired")
 
     return {
         "id": quiz.id,
@@ -554,6 +663,9 @@ def delete_quiz(quiz_id: int, db: Session = Depends(get_db), current_user: User
     attempt_ids = [a.id for a in attempts]
     
     if attempt_ids:
+        deleted_attempts = set(attempt_ids)
+        answer_buffer.discard(lambda key: key[0] in deleted_attempts)
+        warning_buffer.discard(lambda key: key[0] in deleted_attempts)
         # Use synchronize_session=False for efficient bulk delete without loading objects
         db.query(StudentAnswer).filter(StudentAnswer.attempt_id.in_(attempt_ids)).delete(synchronize_session=False)
         
@@ -570,7 +682,9 @@ def delete_quiz(quiz_id: int, db: Session = Depends(get_db), current_user: User
     # 4. Delete Questions
     db.query(Question).filter(Question.quiz_id == quiz_id).delete(synchronize_session=False)
     
-    # 5. Delete Quiz
+    # 5. Delete Quiz (and its rollups)
+    forget_quiz(db, quiz_id)
+    adaptive_engine.invalidate(quiz_id)
     db.delete(quiz)
     db.commit()
     return {"message": "Quiz deleted successfully"}
@@ -587,32 +701,216 @@ def get_quiz_status(quiz_id: int, db: Session = Depends(get_db), current_user: U
         
     # Check for expiration
     quiz = db.query(Quiz).filter(Quiz.id == quiz_id).first()
-    if quiz and quiz.deadline:
-        deadline_val = quiz.deadline
-        if deadline_val.tzinfo is None:
-            deadline_val = deadline_val.replace(tzinfo=timezone.utc)
-        else:
-            deadline_val = deadline_val.astimezone(timezone.utc)
-
-        if datetime.now(timezone.utc) > deadline_val:
-            return {"status": "expired"}
+    if quiz and is_past(quiz.deadline):
+        return {"status": "expired"}
             
     return {"status": "active"}
 
 
 
+# Buffered warnings: open attempts already checked, so repeat warnings skip the database.
+# attempt_id -> [student_id, quiz_id, warnings_count], least recently used evicted
+WARNING_CACHE_SIZE = 10000
+_warning_attempts = OrderedDict()
+_warning_attempts_lock = threading.Lock()
+
+def _cached_warning_attempt(db: Session, attempt_id: int, student_id: int) -> list:
+    with _warning_attempts_lock:
+        cached = _warning_attempts.get(attempt_id)
+        if cached is not None:
+            _warning_attempts.move_to_end(attempt_id)
+    if cached is None:
+        stored = db.execute(
+            select(QuizAttempt.student_id, QuizAttempt.quiz_id, QuizAttempt.warnings_count, QuizAttempt.status)
+            .where(QuizAttempt.id == attempt_id)
+        ).first()
+        if not stored or stored.student_id != student_id:
+            raise HTTPException(status_code=404, detail="Attempt not found")
+        if stored.status == "completed":
+            raise HTTPException(status_code=400, detail="Quiz already submitted")
+        pending = sum(row["warnings_count"] for row in warning_buffer.pending(lambda key: key[0] == attempt_id))
+        with _warning_attempts_lock:
+            cached = _warning_attempts.setdefault(
+                attempt_id, [stored.student_id, stored.quiz_id, (stored.warnings_count or 0) + pending]
+            )
+            while len(_warning_attempts) > WARNING_CACHE_SIZE:
+                _warning_attempts.popitem(last=False)
+    if cached[0] != student_id:
+        raise HTTPException(status_code=404, detail="Attempt not found")
+    return cached
+
+def _forget_warning_attempt(attempt_id: int):
+    with _warning_attempts_lock:
+        _warning_attempts.pop(attempt_id, None)
+
 @router.post("/attempt/{attempt_id}/warning")
 def record_warning(attempt_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     # Verify attempt belongs to user
     if not current_user.student_profile:
          raise HTTPException(status_code=400, detail="Student profile not found")
-    attempt = db.query(QuizAttempt).filter(QuizAttempt.id == attempt_id, QuizAttempt.student_id == current_user.student_profile.id).first()
+    student_id = current_user.student_profile.id
+    owned = (QuizAttempt.id == attempt_id, QuizAttempt.student_id == student_id)
+
+    if WARNING_FLUSH_SECONDS > 0:
+        # Buffered: count in memory, written in batches by the warning buffer;
+        # the attempt is only looked up on its first warning
+        cached = _cached_warning_attempt(db, attempt_id, student_id)
+        warning_buffer.add(attempt_id)
+        with _warning_attempts_lock:
+            cached[2] += 1
+            quiz_id, count = cached[1], cached[2]
+    else:
+        # Atomic increment in one round trip; concurrent warnings are never lost
+        updated = db.execute(
+            update(QuizAttempt).where(*owned)
+            .values(warnings_count=func.coalesce(QuizAttempt.warnings_count, 0) + 1)
+            .returning(QuizAttempt.quiz_id, QuizAttempt.warnings_count)
+        ).first()
+        if updated is None:
+             raise HTTPException(status_code=404, detail="Attempt not found")
+        db.commit()
+        quiz_id, count = updated.quiz_id, updated.warnings_count
+
+    publish_attempt_event("warning", quiz_id, attempt_id, student_id, warnings_count=count)
+    return {"message": "Warning recorded", "count": count}
+
+
+def _teacher_owns_quiz(db: Session, quiz_id: int, user: User) -> bool:
+    if not user.teacher_profile:
+        return False
+    return db.query(Quiz.id).filter(Quiz.id == quiz_id, Quiz.teacher_id == user.teacher_profile.id).first() is not None
+
+@router.get("/{quiz_id}/events")
+def stream_quiz_events(quiz_id: int, token: str = Depends(oauth2_scheme)):
+    """
+    Server-Sent Events stream of live attempts on the teacher's quiz:
+    started, warning and submitted, pushed as they happen (no polling).
+    A "dropped" event tells a client that fell behind how many it missed.
+    """
+    # Short-lived session: the stream must not keep a pooled connection open
+    db = SessionLocal()
+    try:
+        current_user = authenticate_token(db, token)
+        allowed = _teacher_owns_quiz(db, quiz_id, current_user)
+    finally:
+        db.close()
+    if not allowed:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    subscription = event_bus.subscribe(quiz_topic(quiz_id))
+
+    async def event_stream():
+        try:
+            while True:
+                events, dropped = await subscription.next_events(EVENT_STREAM_KEEPALIVE_SECONDS)
+                if dropped:
+                    yield f"event: dropped\ndata: {json.dumps({'type': 'dropped', 'count': dropped})}\n\n"
+                for event in events:
+                    yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+                if not events and not dropped:
+                    yield ": keepalive\n\n"
+        finally:
+            subscription.close()
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+def _token_owns_quiz(quiz_id: int, token: str) -> bool:
+    db = SessionLocal()
+    try:
+        user = user_from_token(db, token)
+        return user is not None and _teacher_owns_quiz(db, quiz_id, user)
+    finally:
+        db.close()
+
+@router.websocket("/{quiz_id}/events/ws")
+async def quiz_events_socket(websocket: WebSocket, quiz_id: int, token: str = ""):
+    """WebSocket variant of /{quiz_id}/events; pass the access token as ?token=."""
+    # Blocking database lookups stay off the event loop
+    allowed = await run_in_threadpool(_token_owns_quiz, quiz_id, token)
+    if not allowed:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    subscription = event_bus.subscribe(quiz_topic(quiz_id))
+    try:
+        while True:
+            events, dropped = await subscription.next_events(EVENT_STREAM_KEEPALIVE_SECONDS)
+            if dropped:
+                await websocket.send_json({"type": "dropped", "count": dropped})
+            for event in events:
+                await websocket.send_text(json.dumps(event, default=str))
+            if not events and not dropped:
+                # Also notices clients that went away without closing
+                await websocket.send_json({"type": "keepalive"})
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        subscription.close()
+
+def _open_attempt_for_autosave(db: Session, attempt_id: int, current_user: User) -> QuizAttempt:
+    if not current_user.student_profile:
+         raise HTTPException(status_code=400, detail="Student profile not found")
+    attempt = db.query(QuizAttempt).filter(
+        QuizAttempt.id == attempt_id,
+        QuizAttempt.student_id == current_user.student_profile.id
+    ).first()
     if not attempt:
          raise HTTPException(status_code=404, detail="Attempt not found")
-    
-    attempt.warnings_count += 1
-    db.commit()
-    return {"message": "Warning recorded", "count": attempt.warnings_count}
+    if attempt.status == "completed":
+         raise HTTPException(status_code=400, detail="Quiz already submitted")
+    return attempt
+
+@router.put("/attempt/{attempt_id}/answers")
+def autosave_answers(attempt_id: int, request: AutosaveRequest, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """
+    Save answers while the quiz is in progress. Writes are buffered and
+    coalesced server-side (latest selection per question wins) and reach
+    the database within a couple of seconds; /submit finalizes from them.
+    """
+    attempt = _open_attempt_for_autosave(db, attempt_id, current_user)
+
+    # Accepted until the scheduler finalizes the attempt (expiry plus the grace period)
+    if is_past(attempt_scheduler.due_at(attempt.expires_at)):
+        raise HTTPException(status_code=400, detail="Quiz has expired")
+
+    # Validate and grade against the cached question index (no per-answer queries)
+    index = adaptive_engine.item_index(db, attempt.quiz_id)
+    rows = []
+    for answer in request.answers:
+        payload = index.payloads.get(answer.question_id) if index else None
+        if not payload or not any(opt["id"] == answer.selected_option_id for opt in payload["options"]):
+            raise HTTPException(status_code=400, detail=f"Invalid answer for question {answer.question_id}")
+        rows.append({
+            "attempt_id": attempt_id,
+            "question_id": answer.question_id,
+            "selected_option_id": answer.selected_option_id,
+            "is_correct": 1 if answer.selected_option_id in index.correct_options[answer.question_id] else 0
+        })
+
+    for row in rows:
+        answer_buffer.put(row)
+
+    return {"message": "Answers saved", "attempt_id": attempt_id, "saved": len(rows)}
+
+@router.get("/attempt/{attempt_id}/answers")
+def get_saved_answers(attempt_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Answers saved so far, e.g. to restore the quiz after a dropped connection."""
+    attempt = _open_attempt_for_autosave(db, attempt_id, current_user)
+
+    saved = dict(
+        db.query(StudentAnswer.question_id, StudentAnswer.selected_option_id)
+        .filter(StudentAnswer.attempt_id == attempt.id).all()
+    )
+    for row in answer_buffer.pending(lambda key: key[0] == attempt.id):
+        saved[row["question_id"]] = row["selected_option_id"]
+
+    return {
+        "attempt_id": attempt.id,
+        "answers": [
+            {"question_id": question_id, "selected_option_id": option_id}
+            for question_id, option_id in saved.items()
+        ]
+    }
 
 @router.get("/{quiz_id}/analytics/heatmap")
 def get_quiz_heatmap(quiz_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
@@ -652,6 +950,67 @@ def get_quiz_heatmap(quiz_id: int, db: Session = Depends(get_db), current_user:
 
 
 
+@router.get("/{quiz_id}/analytics/items")
+def get_quiz_item_analysis(quiz_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    # Psychometrics for the quiz owner: difficulty, point-biserial discrimination,
+    # distractor analysis and Cronbach's alpha over all completed attempts
+    quiz = db.query(Quiz).filter(Quiz.id == quiz_id).first()
+    if not quiz:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+
+    if not current_user.teacher_profile or quiz.teacher_id != current_user.teacher_profile.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    return {"quiz_id": quiz_id, **load_item_analysis(db, quiz_id)}
+
+
+
+@router.get("/{quiz_id}/export")
+def export_quiz_results(
+    quiz_id: int,
+    kind: str = "attempts", # 'attempts' or 'answers'
+    format: str = "csv", # 'csv' or 'parquet'
+    gzip: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Download a quiz's attempts or per-question answers. Rows are streamed from
+    a server-side cursor, so large cohorts export in constant memory.
+    """
+    if kind not in EXPORT_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unknown export kind '{kind}'")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown export format '{format}'")
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+
+    quiz = db.query(Quiz).filter(Quiz.id == quiz_id).first()
+    if not quiz:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    if not current_user.teacher_profile or quiz.teacher_id != current_user.teacher_profile.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    def export_stream():
+        # Own session: the request's session is closed before a streamed body is sent
+        session = SessionLocal()
+        try:
+            yield from stream_quiz_export(session, quiz_id, kind, format, gzip)
+        finally:
+            session.close()
+
+    filename = f"quiz-{quiz_id}-{kind}.{format}"
+    media_type = "application/vnd.apache.parquet" if format == "parquet" else "text/csv; charset=utf-8"
+    if gzip and format == "csv":
+        filename += ".gz"
+        media_type = "application/gzip"
+
+    return StreamingResponse(
+        export_stream(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @router.get("/{quiz_id}/result", response_model=dict)
 def get_student_quiz_result(quiz_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     if not current_user.student_profile:
@@ -720,31 +1079,6 @@ def get_student_quiz_result(quiz_id: int, db: Session = Depends(get_db), current
             "is_correct": is_correct
         })
 
-    # Time Calculation
-    time_taken_str = "—"
-    if attempt.start_time and attempt.timestamp:
-        try:
-            start = attempt.start_time
-            if isinstance(start, str):
-                start = datetime.fromisoformat(start)
-            
-            end = attempt.timestamp
-            if isinstance(end, str):
-                end = datetime.fromisoformat(end)
-                
-            duration = end - start
-            total_seconds = int(duration.total_seconds())
-            
-            
-            minutes = total_seconds // 60
-            seconds = total_seconds % 60
-            if minutes > 0:
-                time_taken_str = f"{minutes}m {seconds}s"
-            else:
-                time_taken_str = f"{seconds}s"
-        except:
-            pass
-
     # Calculate stats
     # Use set to ensure unique question IDs and filter out stale answers for deleted questions
     current_quiz_question_ids = set(q.id for q in questions)
@@ -754,6 +1088,9 @@ def get_student_quiz_result(quiz_id: int, db: Session = Depends(get_db), current
     
     attempted_count = len(answered_ids)
     actual_total_questions = len(questions) # Source of truth from Quiz definition
+    if attempt.questions_served:
+        # Adaptive run: graded against the questions it served
+        actual_total_questions = attempt.total_questions
     unattempted_count = actual_total_questions - attempted_count
     if unattempted_count < 0: unattempted_count = 0 
 
@@ -766,7 +1103,7 @@ def get_student_quiz_result(quiz_id: int, db: Session = Depends(get_db), current
         "correct_count": correct_count,
         "wrong_count": wrong_count,
         "unattempted_count": unattempted_count,
-        "time_taken": time_taken_str,
+        "time_taken": format_duration(attempt.duration_seconds),
         "tab_switch_count": attempt.tab_switch_count or 0,
         "submission_type": attempt.submission_type,
         "questions": questions_review
@@ -1,14 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, literal, select, tuple_, union_all, update
+from collections import Counter
 from typing import List, Optional, Union
 from pydantic import BaseModel
 from datetime import datetime, date as PyDate, timedelta
+import base64
+import json
 import os
 
-from database import get_db
-from models import StudyGoal, CreateTaskAI, CreateTaskManual, User
+from database import SessionLocal, get_db
+from models import StudyGoal, CreateTaskAI, CreateTaskManual, TaskTombstone, User, Quiz, QuizAttempt, StudentAnswer
 from auth import get_current_user
+from student_analytics import record_task_changes, task_state
+from calendar_feed import etag_matches, feed_etag, feed_signature, feeds_enabled, render_calendar, verify_feed_signature
+from plan_engine import (
+    REPLACE_MODES, PLAN_MODES, EMPTY_PLAN, PLAN_ROW_COLUMNS, build_plan_rows, diff_plan, insert_plan_rows,
+    load_plan_state, parse_topics, plan_fingerprint, plan_state_from_tasks
+)
+from task_sync import bump_plan_version, delete_tasks, get_plan_version, get_pruned_version, encode_sync_token, decode_sync_token, prune_tombstones
 
 router = APIRouter()
 
@@ -74,6 +85,7 @@ def create_manual_task(
     )
     
     db.add(db_task)
+    bump_plan_version(db, current_user.id)
     db.commit()
     db.refresh(db_task)
     
@@ -89,14 +101,12 @@ def delete_manual_task(
     Delete a manual task.
     """
     try:
-        deleted = db.query(CreateTaskManual).filter(
-            CreateTaskManual.task_id == task_id,
-            CreateTaskManual.student_id == current_user.id
-        ).delete(synchronize_session=False)
+        deleted = delete_tasks(db, "manual", current_user.id, CreateTaskManual.task_id == task_id)
         
-        if deleted == 0:
+        if not deleted:
             raise HTTPException(status_code=404, detail="Task not found")
             
+        bump_plan_version(db, current_user.id)
         db.commit()
         
         return {"message": "Manual task deleted successfully"}
@@ -117,14 +127,12 @@ def delete_ai_task(
     Delete an AI-generated task.
     """
     try:
-        deleted = db.query(CreateTaskAI).filter(
-            CreateTaskAI.task_id == task_id,
-            CreateTaskAI.student_id == current_user.id
-        ).delete(synchronize_session=False)
+        deleted = delete_tasks(db, "ai", current_user.id, CreateTaskAI.task_id == task_id)
         
-        if deleted == 0:
+        if not deleted:
             raise HTTPException(status_code=404, detail="Task not found")
             
+        bump_plan_version(db, current_user.id)
         db.commit()
         
         return {"message": "AI task deleted successfully"}
@@ -184,7 +192,10 @@ def delete_goal(
     if not goal:
         raise HTTPException(status_code=404, detail="Goal not found")
         
+    # Delete the goal's tasks explicitly so they leave sync tombstones
+    delete_tasks(db, "ai", current_user.id, CreateTaskAI.goal_id == goal_id)
     db.delete(goal)
+    bump_plan_version(db, current_user.id)
     db.commit()
     
     return {"message": "Goal deleted successfully"}
@@ -271,66 +282,278 @@ class StudyTaskResponse(BaseModel):
         from_attributes = True
 
 
+# Fields a client may request through `fields=` projection
+TASK_FIELDS = tuple(StudyTaskResponse.model_fields.keys())
+
+# Calendar page size bounds
+CALENDAR_DEFAULT_LIMIT = 200
+CALENDAR_MAX_LIMIT = 1000
+
+
+def _task_union(student_id: int, from_date: Optional[PyDate] = None, to_date: Optional[PyDate] = None,
+                changed_since: Optional[int] = None):
+    """
+    AI and manual tasks as one UNION ALL subquery with a shared column layout,
+    so filtering, ordering and pagination all happen in the database.
+
+    Sort key: (sort_date, sequence_no, is_manual, task_id), matching the old
+    in-Python sort: undated tasks first, and manual tasks (sequence 0) ahead of
+    the day's AI tasks.
+    """
+    ai = select(
+        CreateTaskAI.task_id.label("task_id"),
+        CreateTaskAI.goal_id.label("goal_id"),
+        CreateTaskAI.title.label("title"),
+        CreateTaskAI.task_date.label("task_date"),
+        CreateTaskAI.task_time.label("task_time"),
+        CreateTaskAI.duration_minutes.label("duration_minutes"),
+        func.coalesce(CreateTaskAI.sequence_no, 0).label("sequence_no"),
+        CreateTaskAI.task_status.label("task_status"),
+        literal(0).label("is_manual"),
+        func.coalesce(CreateTaskAI.task_date, PyDate.min).label("sort_date"),
+    ).where(CreateTaskAI.student_id == student_id)
+
+    # Manual tasks don't belong to a goal and have no duration/sequence columns
+    manual = select(
+        CreateTaskManual.task_id.label("task_id"),
+        literal(0).label("goal_id"),
+        CreateTaskManual.title.label("title"),
+        CreateTaskManual.task_date.label("task_date"),
+        CreateTaskManual.task_time.label("task_time"),
+        literal(60).label("duration_minutes"),
+        literal(0).label("sequence_no"),
+        CreateTaskManual.status.label("task_status"),
+        literal(1).label("is_manual"),
+        CreateTaskManual.task_date.label("sort_date"),
+    ).where(CreateTaskManual.student_id == student_id)
+
+    if from_date:
+        ai = ai.where(CreateTaskAI.task_date >= from_date)
+        manual = manual.where(CreateTaskManual.task_date >= from_date)
+    if to_date:
+        ai = ai.where(CreateTaskAI.task_date <= to_date)
+        manual = manual.where(CreateTaskManual.task_date <= to_date)
+    if changed_since is not None:
+        # Plan version cursor; unstamped (NULL) rows are never visible outside their own transaction
+        ai = ai.where(CreateTaskAI.sync_version > changed_since)
+        manual = manual.where(CreateTaskManual.sync_version > changed_since)
+
+    return union_all(ai, manual).subquery("tasks")
+
+
+def _row_to_task(row) -> dict:
+    return {
+        "task_id": row.task_id,
+        "goal_id": row.goal_id,
+        "title": row.title,
+        "task_date": row.task_date,
+        "task_time": row.task_time,
+        "duration_minutes": row.duration_minutes,
+        "sequence_no": row.sequence_no,
+        "task_status": row.task_status,
+        "is_manual": bool(row.is_manual),
+        "task_type": "manual" if row.is_manual else "ai"
+    }
+
+
+def _encode_cursor(row) -> str:
+    key = [row.sort_date.isoformat(), row.sequence_no, row.is_manual, row.task_id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        sort_date, sequence_no, is_manual, task_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return PyDate.fromisoformat(sort_date), int(sequence_no), int(is_manual), int(task_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @router.get("/tasks", response_model=List[StudyTaskResponse])
 def list_tasks(
     date: Optional[PyDate] = None,
+    from_date: Optional[PyDate] = Query(None, alias="from"),
+    to_date: Optional[PyDate] = Query(None, alias="to"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    # Fetch AI Tasks
-    ai_query = db.query(CreateTaskAI).filter(CreateTaskAI.student_id == current_user.id)
-    if date:
-        ai_query = ai_query.filter(CreateTaskAI.task_date == date)
-    ai_tasks = ai_query.all()
-    
-    # Fetch Manual Tasks (if table exists and is used)
-    # The user mentioned merging if planner supports it. Assuming yes.
-    manual_query = db.query(CreateTaskManual).filter(CreateTaskManual.student_id == current_user.id)
+    # A single `date` is shorthand for from=date&to=date
     if date:
-        manual_query = manual_query.filter(CreateTaskManual.task_date == date)
-    manual_tasks = manual_query.all()
-    
-    # Convert and Combine
-    combined_tasks = []
-    
-    for t in ai_tasks:
-        combined_tasks.append(StudyTaskResponse(
-            task_id=t.task_id,
-            goal_id=t.goal_id,
-            title=t.title,
-            task_date=t.task_date,
-            task_time=t.task_time,
-            duration_minutes=t.duration_minutes,
-            sequence_no=t.sequence_no or 0,
-            task_status=t.task_status,
-            is_manual=False,
-            task_type="ai"
-        ))
-        
-    # Manual tasks might not have goal_id, sequence_no etc. 
-    # For now, mapping manually to match schema.
-    # Note: StudyTaskResponse requires goal_id. CreateTaskManual doesn't have it.
-    # We might need to adjust schema or use a dummy goal_id (e.g. 0).
-    for t in manual_tasks:
-         # Simplified mapping
-         combined_tasks.append(StudyTaskResponse(
-            task_id=t.task_id,
-            goal_id=0, # Manual tasks don't belong to a goal
-            title=t.title,
-            task_date=t.task_date,
-            task_time=t.task_time, # Manual tasks have task_time too
-            duration_minutes=60, # Default if missing
-            sequence_no=0,
-            task_status=t.status,
-            is_manual=True,
-            task_type="manual"
-        ))
-    
-    # Sort: Date ASC, Sequence ASC
-    combined_tasks.sort(key=lambda x: (x.task_date or PyDate.min, x.sequence_no or 0))
-    
-    return combined_tasks
+        from_date = to_date = date
+
+    tasks = _task_union(current_user.id, from_date, to_date)
+    rows = db.execute(
+        select(tasks).order_by(tasks.c.sort_date, tasks.c.sequence_no, tasks.c.is_manual, tasks.c.task_id)
+    ).all()
+
+    return [StudyTaskResponse(**_row_to_task(row)) for row in rows]
+
+
+@router.get("/tasks/calendar")
+def list_calendar_tasks(
+    from_date: PyDate = Query(..., alias="from"),
+    to_date: PyDate = Query(..., alias="to"),
+    cursor: Optional[str] = None,
+    limit: int = Query(CALENDAR_DEFAULT_LIMIT, ge=1, le=CALENDAR_MAX_LIMIT),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Tasks for the visible calendar window, keyset-paginated.
+    Pass the returned `next_cursor` back as `cursor` to fetch the next page;
+    `fields` (comma separated) limits which task fields are returned.
+    """
+    if from_date > to_date:
+        raise HTTPException(status_code=400, detail="'from' must be on or before 'to'")
+
+    selected_fields = TASK_FIELDS
+    if fields:
+        selected_fields = tuple(f.strip() for f in fields.split(",") if f.strip())
+        unknown = set(selected_fields) - set(TASK_FIELDS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    tasks = _task_union(current_user.id, from_date, to_date)
+    sort_key = (tasks.c.sort_date, tasks.c.sequence_no, tasks.c.is_manual, tasks.c.task_id)
+
+    query = select(tasks).order_by(*sort_key).limit(limit + 1)
+    if cursor:
+        query = query.where(tuple_(*sort_key) > tuple_(*_decode_cursor(cursor)))
+
+    rows = db.execute(query).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1])
+
+    results = []
+    for row in rows:
+        task = _row_to_task(row)
+        results.append({field: task[field] for field in selected_fields})
+
+    return {"tasks": results, "next_cursor": next_cursor}
+
+
+@router.get("/tasks/sync")
+def sync_tasks(
+    since: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Delta sync for the planner. Send the `sync_token` from the previous call as
+    `since` to receive only tasks created/updated since then (`upserts`) and
+    tasks deleted since then (`deleted`). Without a token, or with one older than
+    the pruned tombstones, a full snapshot is returned (`full: true`).
+    """
+    # Read the version before the rows: everything stamped up to it is already
+    # committed, so the rows below include it; anything newer is re-sent next time
+    version = get_plan_version(db, current_user.id)
+
+    since_version = None
+    if since:
+        try:
+            since_version = decode_sync_token(since)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid sync token")
+        if since_version is not None and not get_pruned_version(db, current_user.id) <= since_version <= version:
+            since_version = None
+
+    full = since_version is None
+
+    tasks = _task_union(current_user.id, changed_since=since_version)
+    rows = db.execute(
+        select(tasks).order_by(tasks.c.sort_date, tasks.c.sequence_no, tasks.c.is_manual, tasks.c.task_id)
+    ).all()
+
+    deleted = []
+    if full:
+        prune_tombstones(db, current_user.id)
+        db.commit()
+    else:
+        tombstones = db.query(TaskTombstone.task_type, TaskTombstone.task_id).filter(
+            TaskTombstone.student_id == current_user.id,
+            TaskTombstone.sync_version > since_version
+        ).all()
+        deleted = [{"task_type": t.task_type, "task_id": t.task_id} for t in tombstones]
+
+    return {
+        "full": full,
+        "upserts": [_row_to_task(row) for row in rows],
+        "deleted": deleted,
+        "sync_token": encode_sync_token(version)
+    }
+
+
+# --- Calendar (.ics) Feed ---
+
+@router.get("/calendar/feed-url")
+def get_calendar_feed_url(
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Signed iCalendar subscription URL for the current student; it works without
+    a login token so calendar apps can poll it.
+    """
+    if not feeds_enabled():
+        raise HTTPException(status_code=503, detail="Calendar feeds are not configured")
+    url = str(request.url_for(
+        "calendar_feed", student_id=current_user.id, signature=feed_signature(current_user.id)
+    ))
+    return {"url": url, "webcal_url": "webcal://" + url.split("://", 1)[-1]}
+
+def _stream_calendar(student_id: int):
+    # Own session: the request's session is closed before a streamed body is sent
+    db = SessionLocal()
+    try:
+        tasks = _task_union(student_id)
+        result = db.execute(
+            select(tasks)
+            .order_by(tasks.c.sort_date, tasks.c.sequence_no, tasks.c.is_manual, tasks.c.task_id)
+            .execution_options(yield_per=500)
+        )
+        yield from render_calendar(_row_to_task(row) for row in result)
+    finally:
+        db.close()
+
+@router.get("/calendar/{student_id}/{signature}.ics", name="calendar_feed")
+def calendar_feed(
+    student_id: int,
+    signature: str,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    iCalendar feed of a student's AI and manual tasks. The ETag is the
+    student's plan version, so an unchanged plan costs one primary-key lookup
+    and a 304; otherwise the calendar is streamed straight from the database.
+    """
+    if not feeds_enabled():
+        raise HTTPException(status_code=503, detail="Calendar feeds are not configured")
+    if not verify_feed_signature(student_id, signature):
+        raise HTTPException(status_code=404, detail="Calendar not found")
+
+    etag = feed_etag(student_id, get_plan_version(db, student_id))
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    headers["Content-Disposition"] = 'inline; filename="study-plan.ics"'
+    return StreamingResponse(
+        _stream_calendar(student_id),
+        media_type="text/calendar; charset=utf-8",
+        headers=headers
+    )
+
+
+def _ai_task_state(task: CreateTaskAI) -> tuple:
+    return task_state("ai", task.task_status, task.goal_id, task.task_date, task.duration_minutes)
 
+def _manual_task_state(task: CreateTaskManual) -> tuple:
+    return task_state("manual", task.status, None, task.task_date, None)
 
 @router.patch("/tasks/ai/{task_id}/complete")
 def complete_ai_task(
@@ -347,7 +570,10 @@ def complete_ai_task(
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
         
+    before = _ai_task_state(task)
     task.task_status = 'completed'
+    record_task_changes(db, current_user.id, [(before, _ai_task_state(task))])
+    bump_plan_version(db, current_user.id)
     db.commit()
     db.refresh(task)
     
@@ -377,6 +603,8 @@ def update_ai_task(
     if not task:
         raise HTTPException(status_code=404, detail="AI Task not found")
 
+    before = _ai_task_state(task)
+
     if update_data.title:
         task.title = update_data.title
     if update_data.status:
@@ -388,6 +616,8 @@ def update_ai_task(
     if update_data.duration_minutes is not None:
         task.duration_minutes = update_data.duration_minutes
         
+    record_task_changes(db, current_user.id, [(before, _ai_task_state(task))])
+    bump_plan_version(db, current_user.id)
     db.commit()
     db.refresh(task)
     return {"message": "AI Task updated", "task_id": task_id, "status": task.task_status}
@@ -408,6 +638,8 @@ def update_manual_task(
     if not manual_task:
         raise HTTPException(status_code=404, detail="Manual Task not found")
 
+    before = _manual_task_state(manual_task)
+
     if update_data.title:
         manual_task.title = update_data.title
     if update_data.status:
@@ -421,6 +653,8 @@ def update_manual_task(
          if hasattr(manual_task, 'duration_minutes'):
             manual_task.duration_minutes = update_data.duration_minutes
         
+    record_task_changes(db, current_user.id, [(before, _manual_task_state(manual_task))])
+    bump_plan_version(db, current_user.id)
     db.commit()
     db.refresh(manual_task)
     return {"message": "Manual Task updated", "task_id": task_id, "status": manual_task.status}
@@ -450,13 +684,281 @@ def update_task_any(
     raise HTTPException(status_code=404, detail="Task not found")
 
 
+# --- Batch Task Mutations ---
+
+BATCH_MAX_OPERATIONS = 500
+
+class TaskBatchOperation(BaseModel):
+    op: str # 'complete', 'update', 'delete'
+    task_type: str # 'ai' or 'manual'
+    task_id: int
+    changes: Optional[TaskUpdate] = None # Required for 'update'
+
+class TaskBatchRequest(BaseModel):
+    operations: List[TaskBatchOperation]
+    atomic: bool = False # If true, apply nothing unless every operation is valid
+
+def _batch_update_values(task_type: str, changes: TaskUpdate) -> dict:
+    # Same field semantics as update_ai_task / update_manual_task
+    values = {}
+    if changes.title:
+        values["title"] = changes.title
+    if changes.status:
+        values["task_status" if task_type == "ai" else "status"] = changes.status
+    if changes.task_date:
+        values["task_date"] = changes.task_date
+    if changes.task_time:
+        values["task_time"] = changes.task_time
+    if changes.duration_minutes is not None and task_type == "ai":
+        values["duration_minutes"] = changes.duration_minutes
+    return values
+
+@router.post("/tasks/batch")
+def batch_update_tasks(
+    batch: TaskBatchRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Apply many complete/update/delete operations on AI and manual tasks in one
+    round trip. Ownership is checked with a single query and all valid operations
+    are committed in one transaction; each operation gets its own result entry.
+    A task may appear at most once per batch.
+    """
+    if len(batch.operations) > BATCH_MAX_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_OPERATIONS} operations per batch")
+
+    results = [
+        {"index": i, "op": op.op, "task_type": op.task_type, "task_id": op.task_id, "status": "ok"}
+        for i, op in enumerate(batch.operations)
+    ]
+
+    # 1. Shape validation
+    for op, result in zip(batch.operations, results):
+        if op.op not in ("complete", "update", "delete"):
+            result.update(status="invalid", detail=f"Unknown op '{op.op}'")
+        elif op.task_type not in ("ai", "manual"):
+            result.update(status="invalid", detail=f"Unknown task_type '{op.task_type}'")
+        elif op.op == "update" and (not op.changes or not _batch_update_values(op.task_type, op.changes)):
+            result.update(status="invalid", detail="Update requires at least one change")
+
+    # Ops are applied grouped by kind and their analytics are diffed against the
+    # pre-batch state, which is only order-independent if each task appears once.
+    # Every op on a repeated task is rejected, so none wins by position.
+    occurrences = Counter((op.task_type, op.task_id) for op in batch.operations)
+    for op, result in zip(batch.operations, results):
+        if result["status"] == "ok" and occurrences[(op.task_type, op.task_id)] > 1:
+            result.update(status="invalid", detail="Task appears more than once in batch")
+
+    # 2. Ownership check for every referenced task in one query
+    ai_ids = [op.task_id for op, r in zip(batch.operations, results) if r["status"] == "ok" and op.task_type == "ai"]
+    manual_ids = [op.task_id for op, r in zip(batch.operations, results) if r["status"] == "ok" and op.task_type == "manual"]
+
+    # Current state (for analytics) comes back with the same query
+    owned = {}
+    if ai_ids or manual_ids:
+        owned_query = union_all(
+            select(
+                literal("ai").label("task_type"), CreateTaskAI.task_id, CreateTaskAI.task_status.label("status"),
+                CreateTaskAI.goal_id, CreateTaskAI.task_date, CreateTaskAI.duration_minutes
+            ).where(
+                CreateTaskAI.student_id == current_user.id,
+                CreateTaskAI.task_id.in_(ai_ids or [-1])
+            ),
+            select(
+                literal("manual").label("task_type"), CreateTaskManual.task_id, CreateTaskManual.status.label("status"),
+                literal(None).label("goal_id"), CreateTaskManual.task_date, literal(None).label("duration_minutes")
+            ).where(
+                CreateTaskManual.student_id == current_user.id,
+                CreateTaskManual.task_id.in_(manual_ids or [-1])
+            )
+        )
+        owned = {
+            (row.task_type, row.task_id): task_state(row.task_type, row.status, row.goal_id, row.task_date, row.duration_minutes)
+            for row in db.execute(owned_query)
+        }
+
+    for op, result in zip(batch.operations, results):
+        if result["status"] == "ok" and (op.task_type, op.task_id) not in owned:
+            result.update(status="not_found", detail="Task not found")
+
+    failed = [r for r in results if r["status"] != "ok"]
+    if batch.atomic and failed:
+        raise HTTPException(status_code=409, detail={"message": "Batch rejected", "results": results})
+
+    # 3. Apply, grouped into as few statements as possible
+    valid = [op for op, r in zip(batch.operations, results) if r["status"] == "ok"]
+    now = datetime.utcnow()
+
+    try:
+        for task_type, model in (("ai", CreateTaskAI), ("manual", CreateTaskManual)):
+            status_column = model.task_status if task_type == "ai" else model.status
+
+            complete_ids = [op.task_id for op in valid if op.task_type == task_type and op.op == "complete"]
+            if complete_ids:
+                db.execute(
+                    update(model)
+                    .where(model.student_id == current_user.id, model.task_id.in_(complete_ids))
+                    .values({status_column: "completed"})
+                    .execution_options(synchronize_session=False)
+                )
+
+            updates = [
+                {"task_id": op.task_id, "updated_at": now, **_batch_update_values(task_type, op.changes)}
+                for op in valid if op.task_type == task_type and op.op == "update"
+            ]
+            if updates:
+                # ORM bulk UPDATE by primary key; ownership was verified above
+                db.execute(update(model), updates)
+
+            delete_ids = [op.task_id for op in valid if op.task_type == task_type and op.op == "delete"]
+            if delete_ids:
+                delete_tasks(db, task_type, current_user.id, model.task_id.in_(delete_ids))
+
+        # Completed-task aggregates (deleting a task keeps its completion in the history)
+        changes = []
+        for op in valid:
+            if op.op == "delete":
+                continue
+            before = owned[(op.task_type, op.task_id)]
+            status, goal_id, task_date, minutes = before
+            if op.op == "complete":
+                status = "completed"
+            else:
+                values = _batch_update_values(op.task_type, op.changes)
+                status = values.get("task_status", values.get("status", status))
+                task_date = values.get("task_date", task_date)
+                minutes = values.get("duration_minutes", minutes)
+            changes.append((before, task_state(op.task_type, status, goal_id, task_date, minutes)))
+        record_task_changes(db, current_user.id, changes)
+
+        bump_plan_version(db, current_user.id)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Batch task update error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to apply batch")
+
+    return {
+        "applied": len(valid),
+        "failed": len(failed),
+        "results": results
+    }
+
+
+# --- Schedule Optimization ---
+
+class OptimizeScheduleRequest(BaseModel):
+    start_date: PyDate
+    end_date: PyDate
+    energy_preference: Optional[str] = "none" # 'morning', 'afternoon', 'night', 'none'
+    max_hours_per_day: Optional[float] = None
+    day_start_hour: Optional[int] = None # Defaults per energy preference
+    day_end_hour: int = 23
+    goal_id: Optional[int] = None # Only move this goal's tasks; others stay where they are
+    apply: bool = False # Persist the new times instead of only returning them
+
+@router.post("/tasks/optimize")
+def optimize_tasks(
+    request: OptimizeScheduleRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Assign task times across a date range from the student's energy preference,
+    task difficulty and daily hour limit (server-side version of energyPlanner.ts).
+    Manual and completed tasks are kept in place; active AI tasks are moved.
+    """
+    from schedule_optimizer import optimize_schedule, parse_task_title
+
+    if request.start_date > request.end_date:
+        raise HTTPException(status_code=400, detail="Start Date must be before End Date")
+    if not (0 <= (request.day_start_hour or 0) < request.day_end_hour <= 24):
+        raise HTTPException(status_code=400, detail="Invalid day hours")
+
+    # 1. Load the range in one query
+    tasks = _task_union(current_user.id, request.start_date, request.end_date)
+    rows = db.execute(select(tasks)).all()
+
+    items = []
+    for row in rows:
+        task = _row_to_task(row)
+        task["locked"] = (
+            task["is_manual"]
+            or task["task_status"] == "completed"
+            or (request.goal_id is not None and task["goal_id"] != request.goal_id)
+        )
+        task["kind"], task["topics"] = parse_task_title(task["title"])
+        items.append(task)
+
+    # Task difficulty from the student's quiz accuracy: the weakest topic of the task decides
+    accuracy = topic_accuracy(db, current_user, sorted({topic for task in items for topic in task["topics"]}))
+    for task in items:
+        known = [accuracy[topic.lower()] for topic in task["topics"] if topic.lower() in accuracy]
+        task["topic_accuracy"] = min(known) if known else None
+
+    # 2. Optimize
+    max_minutes = int(request.max_hours_per_day * 60) if request.max_hours_per_day is not None else None
+    result = optimize_schedule(
+        items,
+        preference=request.energy_preference or "none",
+        max_minutes_per_day=max_minutes,
+        day_start_hour=request.day_start_hour,
+        day_end_hour=request.day_end_hour,
+        horizon_end=request.end_date
+    )
+
+    # 3. Persist moved AI tasks with one bulk UPDATE by primary key
+    if request.apply:
+        now = datetime.utcnow()
+        changes = [
+            {"task_id": t["task_id"], "task_date": t["task_date"], "task_time": t["task_time"], "updated_at": now}
+            for t in result["tasks"] if t["moved"] and t["task_type"] == "ai"
+        ]
+        try:
+            if changes:
+                db.execute(update(CreateTaskAI), changes)
+                bump_plan_version(db, current_user.id)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Optimize apply error: {str(e)}")
+            raise HTTPException(status_code=500, detail="Failed to save optimized schedule")
+
+    result["applied"] = request.apply
+    return result
+
+
+def topic_accuracy(db: Session, user: User, topics: List[str]) -> dict:
+    """
+    Share of correct answers per quiz topic for this student, keyed by lower-cased
+    topic. Only quizzes whose topic matches one of `topics` are counted.
+    """
+    student = user.student_profile
+    if not student or not topics:
+        return {}
+
+    topic_key = func.lower(Quiz.topic)
+    rows = db.query(topic_key, func.avg(StudentAnswer.is_correct)).join(
+        QuizAttempt, StudentAnswer.attempt_id == QuizAttempt.id
+    ).join(
+        Quiz, QuizAttempt.quiz_id == Quiz.id
+    ).filter(
+        QuizAttempt.student_id == student.id,
+        topic_key.in_([t.lower() for t in topics])
+    ).group_by(topic_key).all()
+
+    return {topic: float(avg) for topic, avg in rows if avg is not None}
+
+
 class GeneratePlanRequest(BaseModel):
     goal_id: int
     topics: str
     start_date: PyDate
     end_date: PyDate
     hours_per_day: int
-    mode: Optional[str] = "create" # 'create', 'full_regenerate', 'extend_only', 'keep_existing'
+    mode: Optional[str] = "create" # 'create', 'full_regenerate', 'extend_only', 'keep_existing', 'spaced_repetition'
+    use_quiz_performance: bool = True # spaced_repetition: space topics by the student's quiz accuracy
 
 @router.post("/generate", response_model=List[StudyTaskResponse])
 def generate_study_plan(
@@ -467,6 +969,7 @@ def generate_study_plan(
     """
     Dedicated endpoint for generating AI study plans.
     ⚠️ DO NOT MODIFY — Core AI Generation Route
+    Generation itself lives in plan_engine (shared with /api/ai/generate-plan).
     """
     # 0. Validate Goal ownership
     goal = db.query(StudyGoal).filter(
@@ -479,138 +982,44 @@ def generate_study_plan(
 
     # Mode Handling
     mode = request.mode or "create"
-    
-    # 1. Handle Deletion (if applicable)
+    if mode not in PLAN_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown mode '{mode}'")
+    if mode == "keep_existing":
+        return []
+
     # 1. Handle Deletion (if applicable)
-    if mode in ["full_regenerate", "create"]:
+    if mode in REPLACE_MODES:
         try:
              # SAFEGUARD: Explicitly target ONLY AI tasks
              # Manual tasks (CreateTaskManual) are NEVER touched by this process
-             deleted_count = db.query(CreateTaskAI).filter(
-                 CreateTaskAI.goal_id == request.goal_id,
-                 CreateTaskAI.student_id == current_user.id
-             ).delete(synchronize_session=False)
-             # print(f"Deleted {deleted_count} AI tasks. Manual tasks preserved.")
+             delete_tasks(db, "ai", current_user.id, CreateTaskAI.goal_id == request.goal_id)
         except Exception as e:
             db.rollback()
             raise HTTPException(status_code=500, detail="Failed to clear existing tasks")
 
-    elif mode == "keep_existing":
-        return []
+    # 2. Existing plan state (extend_only: NO tasks are deleted, we strictly append/fill)
+    state = load_plan_state(db, goal.goal_id, current_user.id) if mode == "extend_only" else EMPTY_PLAN
 
-    elif mode == "extend_only":
-        # CRITICAL SAFETY GUARD:
-        # In 'extend_only' mode, NO tasks are deleted.
-        # We strictly strictly append/fill.
-        pass
-
-    # 2. Validate Dates
-    start_dt = request.start_date
-    exam_dt = request.end_date
-
-    # STRICT: For extend_only, derive start_date from DATABASE
-    if mode == "extend_only":
-        max_date = db.query(func.max(CreateTaskAI.task_date)).filter(
-            CreateTaskAI.goal_id == request.goal_id,
-            CreateTaskAI.student_id == current_user.id
-        ).scalar()
-        
-        if max_date:
-            start_dt = max_date + timedelta(days=1)
-        else:
-            start_dt = PyDate.today()
-    
-    if start_dt >= exam_dt:
-         # For extend_only, if calculated start > end, we might return empty or error
-         # But the logic below handles loop
-         if start_dt > exam_dt: 
-              return [] 
-         if start_dt == exam_dt:
-             pass
-         else:
-             if mode != "extend_only": # Only raise for user-provided dates
-                raise HTTPException(status_code=400, detail="Start Date must be before End Date")
+    accuracy = None
+    if mode == "spaced_repetition" and request.use_quiz_performance:
+        accuracy = topic_accuracy(db, current_user, parse_topics(request.topics))
 
     # 3. Deterministic Task Generation
     try:
-        # Calculate Duration (Minutes)
-        duration_minutes = request.hours_per_day * 60
-        
-        # Parse Topics
-        topic_list = [t.strip() for t in request.topics.split(',') if t.strip()]
-        if not topic_list:
-            topic_list = ["General Study"]
+        plan_rows = build_plan_rows(
+            goal.goal_id, goal.student_id, request.topics,
+            request.start_date, request.end_date, request.hours_per_day,
+            mode=mode, state=state, accuracy=accuracy
+        )
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
 
-        # Calculate Date Range
-        total_days = (exam_dt - start_dt).days + 1
-        
-        created_tasks = []
-        
-        # Determine starting sequence and existing dates if extending
-        start_seq = 1
-        existing_dates = set()
-        
-        if mode == "extend_only":
-            last_task = db.query(CreateTaskAI).filter(
-                CreateTaskAI.goal_id == request.goal_id
-            ).order_by(CreateTaskAI.sequence_no.desc()).first()
-            
-            if last_task and last_task.sequence_no:
-                start_seq = last_task.sequence_no + 1
-                
-            existing_tasks_dates = db.query(CreateTaskAI.task_date).filter(
-                CreateTaskAI.goal_id == request.goal_id,
-                CreateTaskAI.student_id == current_user.id
-            ).all()
-            existing_dates = {t[0] for t in existing_tasks_dates}
-        
-        current_seq = start_seq
-        
-        for i in range(total_days):
-            current_date = start_dt + timedelta(days=i)
-            
-            # Skip if date already has tasks (ONLY for extend mode)
-            if mode == "extend_only" and current_date in existing_dates:
-                continue
-            
-            # Topic Distribution Logic
-            day_topics = []
-            
-            if len(topic_list) > total_days:
-                start_idx = int(i * len(topic_list) / total_days)
-                end_idx = int((i + 1) * len(topic_list) / total_days)
-                day_topics = topic_list[start_idx:end_idx]
-                
-                if not day_topics:
-                    day_topics = [topic_list[i % len(topic_list)]]
-            else:
-                day_topics = [topic_list[i % len(topic_list)]]
-            
-            task_title = f"Study {' & '.join(day_topics)}"
-            
-            task_time = datetime.combine(current_date, datetime.min.time()).replace(hour=9)
-            
-            task = CreateTaskAI(
-                goal_id=goal.goal_id,
-                student_id=goal.student_id,
-                title=task_title,
-                task_time=task_time,
-                task_date=current_date,
-                duration_minutes=duration_minutes,
-                sequence_no=current_seq,
-                task_status='active'
-            )
-            
-            db.add(task)
-            created_tasks.append(task)
-            current_seq += 1
-            
+    try:
+        # Single bulk INSERT ... RETURNING; the response is built from the returned rows
+        response_tasks = insert_plan_rows(db, plan_rows)
+        bump_plan_version(db, current_user.id)
         db.commit()
-        
-        # Map to Response Schema
-        response_tasks = []
-        for t in created_tasks:
-            response_tasks.append(study_task_to_response(t))
             
         return response_tasks
         
@@ -619,16 +1028,250 @@ def generate_study_plan(
         print(f"Gen Error: {e}")
         raise HTTPException(status_code=500, detail="Task Generation Failed")
 
-def study_task_to_response(t):
-    return StudyTaskResponse(
-        task_id=t.task_id,
-        goal_id=t.goal_id,
-        title=t.title,
-        task_date=t.task_date,
-        task_time=t.task_time,
-        duration_minutes=t.duration_minutes,
-        sequence_no=t.sequence_no,
-        task_status=t.task_status,
-        is_manual=False,
-        task_type="ai"
+# --- Plan Preview / Apply ---
+
+class ApplyPlanRequest(GeneratePlanRequest):
+    plan_token: str # From /generate/preview; the plan must not have changed since
+
+def _plan_diff(request: GeneratePlanRequest, db: Session, current_user: User):
+    """
+    Generate the plan in memory and diff it against the goal's current AI tasks.
+    Returns (goal, diff, plan_token). Nothing is written.
+    """
+    goal = db.query(StudyGoal).filter(
+        StudyGoal.goal_id == request.goal_id,
+        StudyGoal.student_id == current_user.id
+    ).first()
+    if not goal:
+        raise HTTPException(status_code=404, detail="Study Goal not found")
+
+    mode = request.mode or "create"
+    if mode not in PLAN_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown mode '{mode}'")
+
+    # All existing-plan state in one query
+    existing = [
+        dict(row._mapping) for row in db.execute(
+            select(
+                CreateTaskAI.task_id, CreateTaskAI.sequence_no, CreateTaskAI.title,
+                CreateTaskAI.task_time, CreateTaskAI.task_date, CreateTaskAI.duration_minutes,
+                CreateTaskAI.task_status
+            ).where(CreateTaskAI.goal_id == goal.goal_id, CreateTaskAI.student_id == current_user.id)
+        )
+    ]
+
+    accuracy = None
+    if mode == "spaced_repetition" and request.use_quiz_performance:
+        accuracy = topic_accuracy(db, current_user, parse_topics(request.topics))
+
+    try:
+        rows = build_plan_rows(
+            goal.goal_id, goal.student_id, request.topics,
+            request.start_date, request.end_date, request.hours_per_day,
+            mode=mode, state=plan_state_from_tasks(existing), accuracy=accuracy
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Only replace modes can remove or move tasks; extend_only just adds
+    diff = diff_plan(existing if mode in REPLACE_MODES else [], rows)
+    return goal, diff, plan_fingerprint(existing)
+
+@router.post("/generate/preview")
+def preview_study_plan(
+    request: GeneratePlanRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Dry run of /generate: returns what would be added, removed or moved,
+    plus a plan_token to pass to /generate/apply.
+    """
+    _, diff, plan_token = _plan_diff(request, db, current_user)
+
+    return {
+        "plan_token": plan_token,
+        "summary": {
+            "added": len(diff["added"]),
+            "removed": len(diff["removed"]),
+            "moved": len(diff["moved"]),
+            "unchanged": diff["unchanged"]
+        },
+        "added": [
+            {field: row[i] for i, field in enumerate(PLAN_ROW_COLUMNS) if field not in ("goal_id", "student_id", "task_status")}
+            for row in diff["added"]
+        ],
+        "removed": [
+            {"task_id": t["task_id"], "sequence_no": t["sequence_no"], "title": t["title"], "task_date": t["task_date"]}
+            for t in diff["removed"]
+        ],
+        "moved": [
+            {
+                "task_id": t["task_id"],
+                "sequence_no": t["sequence_no"],
+                "changes": {field: {"from": t[field], "to": value} for field, value in changes.items()}
+            }
+            for t, changes in diff["moved"]
+        ]
+    }
+
+@router.post("/generate/apply")
+def apply_study_plan(
+    request: ApplyPlanRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Write a previewed plan by applying only its diff: delete removed tasks,
+    update moved ones in place and insert the new ones. Returns 409 if the
+    goal's tasks changed since the preview.
+    """
+    goal, diff, plan_token = _plan_diff(request, db, current_user)
+    if plan_token != request.plan_token:
+        raise HTTPException(status_code=409, detail="Plan changed since preview; preview again")
+
+    try:
+        removed_ids = [t["task_id"] for t in diff["removed"]]
+        if removed_ids:
+            delete_tasks(db, "ai", current_user.id, CreateTaskAI.task_id.in_(removed_ids))
+
+        if diff["moved"]:
+            now = datetime.utcnow()
+            db.execute(update(CreateTaskAI), [
+                {"task_id": t["task_id"], "updated_at": now, **changes}
+                for t, changes in diff["moved"]
+            ])
+            # Completed tasks that move to another day take their progress with them
+            record_task_changes(db, current_user.id, [
+                (
+                    task_state("ai", t["task_status"], goal.goal_id, t["task_date"], t["duration_minutes"]),
+                    task_state(
+                        "ai", t["task_status"], goal.goal_id,
+                        changes.get("task_date", t["task_date"]),
+                        changes.get("duration_minutes", t["duration_minutes"])
+                    )
+                )
+                for t, changes in diff["moved"]
+            ])
+
+        added = insert_plan_rows(db, diff["added"])
+        bump_plan_version(db, current_user.id)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Plan apply error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to apply plan")
+
+    return {
+        "added": added,
+        "removed": removed_ids,
+        "moved": [t["task_id"] for t, _ in diff["moved"]],
+        "unchanged": diff["unchanged"]
+    }
+
+# --- Multi-Goal Plan Generation ---
+
+class GoalPlanInput(BaseModel):
+    goal_id: int
+    topics: Optional[str] = None # Defaults to the goal title
+    weight: float = 1.0 # Relative share of study time
+    hours_per_day: Optional[float] = None # Per-goal daily cap
+
+class MultiGoalPlanRequest(BaseModel):
+    goals: Optional[List[GoalPlanInput]] = None # Defaults to all active goals
+    start_date: PyDate
+    end_date: Optional[PyDate] = None # Defaults to the latest goal deadline
+    hours_per_day: float # Total daily study capacity across all goals
+    block_minutes: int = 30
+
+@router.post("/generate-multi", response_model=List[StudyTaskResponse])
+def generate_multi_goal_plan(
+    request: MultiGoalPlanRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Plan several goals together so days are never booked beyond `hours_per_day`,
+    counting manual tasks and other goals' tasks already on the calendar.
+    Replaces the selected goals' unfinished AI tasks from start_date onwards.
+    """
+    from multi_goal_planner import allocate_goals, build_allocation_rows
+
+    if request.hours_per_day <= 0 or not (5 <= request.block_minutes <= 240):
+        raise HTTPException(status_code=400, detail="Invalid hours_per_day or block_minutes")
+
+    # 0. Resolve goals
+    query = db.query(StudyGoal).filter(
+        StudyGoal.student_id == current_user.id,
+        StudyGoal.current_status == 'active'
     )
+    inputs = {g.goal_id: g for g in request.goals} if request.goals else None
+    if inputs is not None:
+        query = query.filter(StudyGoal.goal_id.in_(list(inputs)))
+    goals = query.all()
+
+    if inputs is not None and len(goals) != len(inputs):
+        raise HTTPException(status_code=404, detail="Study Goal not found")
+    if not goals:
+        return []
+
+    end_dt = request.end_date or max((g.date for g in goals if g.date), default=None)
+    if not end_dt:
+        raise HTTPException(status_code=400, detail="end_date is required when goals have no date")
+    if request.start_date > end_dt:
+        raise HTTPException(status_code=400, detail="Start Date must be before End Date")
+
+    goal_ids = [g.goal_id for g in goals]
+    try:
+        # 1. Clear the selected goals' unfinished tasks in the window; completed work stays
+        delete_tasks(
+            db, "ai", current_user.id,
+            CreateTaskAI.goal_id.in_(goal_ids),
+            CreateTaskAI.task_date >= request.start_date,
+            CreateTaskAI.task_status != 'completed'
+        )
+
+        # 2. Existing load per day (manual tasks + remaining AI tasks) in one grouped query
+        tasks = _task_union(current_user.id, request.start_date, end_dt)
+        load_rows = db.execute(
+            select(tasks.c.task_date, func.sum(func.coalesce(tasks.c.duration_minutes, 60)))
+            .group_by(tasks.c.task_date)
+        ).all()
+        load_minutes = {task_date: int(minutes) for task_date, minutes in load_rows}
+
+        # 3. Continue each goal's sequence numbering
+        seq_rows = db.query(CreateTaskAI.goal_id, func.max(CreateTaskAI.sequence_no)).filter(
+            CreateTaskAI.goal_id.in_(goal_ids)
+        ).group_by(CreateTaskAI.goal_id).all()
+        start_seq = {goal_id: (max_seq or 0) + 1 for goal_id, max_seq in seq_rows}
+
+        # 4. Allocate and insert
+        plan_goals = []
+        for g in goals:
+            goal_input = inputs.get(g.goal_id) if inputs else None
+            topics = goal_input.topics if goal_input and goal_input.topics else g.title
+            plan_goals.append({
+                "goal_id": g.goal_id,
+                "deadline": g.date,
+                "weight": goal_input.weight if goal_input else 1.0,
+                "max_minutes_per_day": int(goal_input.hours_per_day * 60) if goal_input and goal_input.hours_per_day else None,
+                "topics": [t.strip() for t in topics.split(',') if t.strip()],
+            })
+
+        allocation = allocate_goals(
+            plan_goals, request.start_date, end_dt,
+            capacity_minutes=int(request.hours_per_day * 60),
+            load_minutes=load_minutes,
+            block_minutes=request.block_minutes
+        )
+        plan_rows = build_allocation_rows(plan_goals, allocation, current_user.id, start_seq)
+
+        response_tasks = insert_plan_rows(db, plan_rows)
+        bump_plan_version(db, current_user.id)
+        db.commit()
+        return response_tasks
+
+    except Exception as e:
+        db.rollback()
+        print(f"Multi-goal Gen Error: {e}")
+        raise HTTPException(status_code=500, detail="Task Generation Failed")
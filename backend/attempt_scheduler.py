@@ -0,0 +1,219 @@
+import heapq
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from database import SessionLocal
+from event_bus import publish_attempt_event
+from models import Quiz, QuizAttempt, Student
+from quiz_grading import grade_attempt
+from write_buffer import restore_rows
+
+# Delay before retrying a batch (or a single attempt) that failed to finalize
+RETRY_SECONDS = 30
+
+# An attempt that fails this many times in a row is parked until restart, so it stops being retried
+MAX_FINALIZE_FAILURES = 5
+
+
+class AttemptScheduler:
+    """
+    Finalizes open quiz attempts when they run out of time, so expiry is
+    enforced in one place instead of being recomputed on every request.
+
+    Expiry times (QuizAttempt.expires_at, stored when the attempt starts, plus
+    a grace period) sit in a min-heap; a single background
+    thread sleeps until the earliest one is due and grades everything due by
+    then in batches, from the answers saved so far.
+
+    The heap only knows attempts started in this process, so it is reloaded
+    from the database on start and every `resync_interval` seconds; attempts
+    are claimed atomically, so several processes never grade one twice.
+    Each attempt is graded in its own savepoint: one that fails is retried
+    on its own without holding back the rest of the batch.
+    """
+
+    def __init__(self, grace_seconds: float, batch_size: int, resync_interval: float):
+        self.grace_seconds = grace_seconds
+        self.batch_size = batch_size
+        self.resync_interval = resync_interval
+        self._heap = [] # (expires_at, attempt_id)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self._next_resync = None
+        self._failures = {} # attempt_id -> consecutive failed finalizations
+        self._parked = set() # attempt ids given up on
+
+    def due_at(self, expires_at: Optional[datetime]) -> Optional[datetime]:
+        """When an attempt expiring at `expires_at` is finalized (answers in flight get the grace period)."""
+        return expires_at + timedelta(seconds=self.grace_seconds) if expires_at is not None else None
+
+    def schedule(self, attempt_id: int, expires_at: Optional[datetime]):
+        expires_at = self.due_at(expires_at)
+        if expires_at is None or attempt_id in self._parked:
+            return
+        with self._cond:
+            heapq.heappush(self._heap, (expires_at, attempt_id))
+            # Wake the thread only if this is the new earliest expiry
+            if self._heap[0][1] == attempt_id:
+                self._cond.notify()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="attempt-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def resync(self):
+        """Rebuild the heap from every open attempt in the database."""
+        db = SessionLocal()
+        try:
+            rows = db.query(QuizAttempt.id, QuizAttempt.expires_at)\
+                .filter(QuizAttempt.status != "completed").all()
+        finally:
+            db.close()
+
+        heap = []
+        for attempt_id, expires_at in rows:
+            if attempt_id in self._parked:
+                continue
+            expires_at = self.due_at(expires_at)
+            if expires_at is not None:
+                heap.append((expires_at, attempt_id))
+        loaded = {attempt_id for _, attempt_id in heap}
+        with self._cond:
+            # Keep entries scheduled while the query ran
+            heap.extend(entry for entry in self._heap if entry[1] not in loaded)
+            heapq.heapify(heap)
+            self._heap = heap
+        return len(loaded)
+
+    def _take_due(self, now: datetime) -> list:
+        due = []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+                due.append(heapq.heappop(self._heap))
+        return due
+
+    def _attempt_failed(self, attempt_id: int, now: datetime, error: Exception):
+        failures = self._failures.get(attempt_id, 0) + 1
+        if failures >= MAX_FINALIZE_FAILURES:
+            self._failures.pop(attempt_id, None)
+            self._parked.add(attempt_id)
+            print(f"[ERROR] Giving up auto-submitting attempt {attempt_id} after {failures} failures: {error}")
+            return
+        self._failures[attempt_id] = failures
+        print(f"[WARN] Auto-submit of attempt {attempt_id} failed, will retry: {error}")
+        with self._cond:
+            heapq.heappush(self._heap, (now + timedelta(seconds=RETRY_SECONDS), attempt_id))
+
+    def finalize(self, due: list, now: datetime) -> int:
+        """
+        Grade the given (expires_at, attempt_id) entries in one transaction,
+        each inside its own savepoint.
+        """
+        expiry_of = {attempt_id: expires_at for expires_at, attempt_id in due}
+        taken_rows = [] # Buffered rows moved into this transaction
+        db = SessionLocal()
+        try:
+            rows = db.query(QuizAttempt, Quiz, Student.user_id)\
+                .join(Quiz, QuizAttempt.quiz_id == Quiz.id)\
+                .join(Student, QuizAttempt.student_id == Student.id)\
+                .filter(QuizAttempt.id.in_(list(expiry_of)), QuizAttempt.status != "completed")\
+                .order_by(QuizAttempt.id).all() # Same lock order as the answer buffer's flush
+
+            finalized = []
+            for attempt, quiz, user_id in rows:
+                expires_at = self.due_at(attempt.expires_at)
+                if expires_at is None or expires_at > now:
+                    # Expiry changed since it was scheduled
+                    if expires_at is not None:
+                        with self._cond:
+                            heapq.heappush(self._heap, (expires_at, attempt.id))
+                    continue
+                # Record the end of the allowed time, not when the thread got to it
+                finished_at = expires_at - timedelta(seconds=self.grace_seconds)
+                attempt_id, quiz_id, student_id = attempt.id, attempt.quiz_id, attempt.student_id
+                attempt_rows = []
+                try:
+                    with db.begin_nested():
+                        result = grade_attempt(db, attempt, quiz, user_id, submission_type="auto",
+                                               finished_at=finished_at, taken_rows=attempt_rows)
+                except Exception as e:
+                    # Only this attempt's savepoint rolled back; its autosaves go back to the buffer
+                    restore_rows(attempt_rows)
+                    self._attempt_failed(attempt_id, now, e)
+                    continue
+                taken_rows.extend(attempt_rows)
+                self._failures.pop(attempt_id, None)
+                if result:
+                    finalized.append((quiz_id, attempt_id, student_id, result))
+            db.commit()
+        except Exception:
+            db.rollback()
+            restore_rows(taken_rows)
+            raise
+        finally:
+            db.close()
+
+        for quiz_id, attempt_id, student_id, result in finalized:
+            publish_attempt_event("submitted", quiz_id, attempt_id, student_id, submission_type="auto", **result)
+        return len(finalized)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+            now = datetime.now(timezone.utc)
+
+            # 1. Reload from the database now and then (other processes, restarts)
+            if self._next_resync is None or now >= self._next_resync:
+                try:
+                    self.resync()
+                except Exception as e:
+                    print(f"[WARN] Attempt scheduler could not load open attempts: {e}")
+                self._next_resync = now + timedelta(seconds=self.resync_interval)
+
+            # 2. Finalize everything that is due, a batch at a time
+            due = self._take_due(now)
+            while due:
+                try:
+                    finalized = self.finalize(due, now)
+                    if finalized:
+                        print(f"[INFO] Auto-submitted {finalized} expired quiz attempt(s)")
+                except Exception as e:
+                    print(f"[ERROR] Auto-submit of {len(due)} attempt(s) failed, will retry: {e}")
+                    retry_at = now + timedelta(seconds=RETRY_SECONDS)
+                    with self._cond:
+                        for _, attempt_id in due:
+                            heapq.heappush(self._heap, (retry_at, attempt_id))
+                    break
+                due = self._take_due(now)
+
+            # 3. Sleep until the next expiry (or a new, earlier one is scheduled)
+            with self._cond:
+                if self._stopped:
+                    return
+                wake_at = self._next_resync
+                if self._heap and self._heap[0][0] < wake_at:
+                    wake_at = self._heap[0][0]
+                self._cond.wait(max(0.0, (wake_at - datetime.now(timezone.utc)).total_seconds()))
+
+
+attempt_scheduler = AttemptScheduler(
+    grace_seconds=float(os.getenv("QUIZ_EXPIRY_GRACE_SECONDS", "30")),
+    batch_size=int(os.getenv("QUIZ_EXPIRY_BATCH_SIZE", "200")),
+    resync_interval=float(os.getenv("QUIZ_EXPIRY_RESYNC_SECONDS", "300"))
+)
@@ -5,6 +5,7 @@ from pydantic import BaseModel
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
+from typing import Optional
 from database import get_db
 from models import User, Student
 
@@ -46,24 +47,34 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+def user_from_token(db: Session, token: str) -> Optional[User]:
+    """User for a bearer token, or None if it is invalid (e.g. for WebSockets, which cannot send headers)."""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
-    user = db.query(User).filter(User.email == email).first()
+        return None
+    email: str = payload.get("sub")
+    if email is None:
+        return None
+    return db.query(User).filter(User.email == email).first()
+
+def authenticate_token(db: Session, token: str) -> User:
+    """
+    Like get_current_user, for endpoints that must not hold the request's
+    session open (long-lived streams authenticate with a short-lived one).
+    """
+    user = user_from_token(db, token)
     if user is None:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    return authenticate_token(db, token)
+
 @router.post("/register", response_model=Token)
 def register(user: UserCreate, db: Session = Depends(get_db)):
     db_user = db.query(User).filter(User.email == user.email).first()
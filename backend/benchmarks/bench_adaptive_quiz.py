@@ -0,0 +1,79 @@
+"""
+Per-click cost of adaptive question selection: ItemIndex.nearest (bisect plus
+a walk past already-asked questions) and the ability update, on item banks
+of 50 to 50k calibrated questions.
+
+Usage (from backend/):
+    python benchmarks/bench_adaptive_quiz.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from adaptive_quiz import AdaptiveSession, ItemIndex, calibrate_difficulty, next_question, probability_correct  # noqa: E402
+
+BANK_SIZES = (50, 500, 5000, 50000)
+QUESTIONS_PER_RUN = 30
+RUNS = 200
+
+
+def item_bank(size, rng):
+    items = []
+    for question_id in range(1, size + 1):
+        answered = rng.randint(0, 400)
+        correct = sum(rng.random() < 0.6 for _ in range(answered)) if answered < 50 else int(answered * rng.random())
+        payload = {"id": question_id, "text": f"Question {question_id}", "options": [{"id": 1, "text": "a"}, {"id": 2, "text": "b"}]}
+        items.append((calibrate_difficulty(correct, answered), question_id, payload, frozenset({1})))
+    return ItemIndex(1, items)
+
+
+def brute_force_nearest(index, target, exclude):
+    best = None
+    for difficulty, question_id in zip(index.difficulties, index.question_ids):
+        if question_id in exclude:
+            continue
+        if best is None or abs(difficulty - target) < best[0]:
+            best = (abs(difficulty - target), question_id)
+    return best[1] if best else None
+
+
+def main():
+    rng = random.Random(7)
+    print(f"{'bank':>7} {'us/click':>9} {'ability rmse':>13}")
+    for size in BANK_SIZES:
+        index = item_bank(size, rng)
+
+        # Selection must match a linear scan (same distance; ties may pick either side)
+        for _ in range(200):
+            target = rng.uniform(-4, 4)
+            exclude = set(rng.sample(index.question_ids, min(20, size - 1)))
+            chosen = index.nearest(target, exclude)
+            expected = brute_force_nearest(index, target, exclude)
+            assert abs(abs(index.difficulty_of[chosen] - target) - abs(index.difficulty_of[expected] - target)) < 1e-12
+
+        clicks = 0
+        abilities = []
+        start = time.perf_counter()
+        for _ in range(RUNS):
+            true_ability = rng.gauss(0, 1)
+            session = AdaptiveSession(1, 1, QUESTIONS_PER_RUN)
+            question = next_question(index, session)
+            while question is not None:
+                correct = rng.random() < probability_correct(true_ability, index.difficulty_of[question["id"]])
+                session.record(index, question["id"], 1 if correct else 2)
+                session.current = None
+                question = next_question(index, session)
+                clicks += 1
+            abilities.append(session.ability - true_ability)
+        elapsed = time.perf_counter() - start
+
+        error_sd = (sum(e * e for e in abilities) / len(abilities)) ** 0.5
+        print(f"{size:>7} {elapsed / clicks * 1e6:>9.1f} {error_sd:>13.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Time item_analysis.analyze_items on synthetic quizzes up to 10k attempts x
+100 questions, and check its statistics against a straightforward per-item
+reference on a small quiz.
+
+Usage (from backend/):
+    python benchmarks/bench_item_analysis.py
+"""
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import numpy as np  # noqa: E402
+
+from item_analysis import analyze_items  # noqa: E402
+
+SIZES = ((500, 20), (2000, 50), (10000, 100))
+OPTIONS_PER_QUESTION = 4
+REPEATS = 3
+
+
+def synthetic_quiz(n_attempts, n_questions, seed=0):
+    """Rasch-style responses: P(correct) rises with ability minus item difficulty."""
+    rng = np.random.default_rng(seed)
+    questions = [(1000 + j, f"Question {j}") for j in range(n_questions)]
+    options = [
+        (10000 + j * OPTIONS_PER_QUESTION + o, 1000 + j, f"Option {o}", 1 if o == 0 else 0)
+        for j in range(n_questions) for o in range(OPTIONS_PER_QUESTION)
+    ]
+
+    ability = rng.normal(size=(n_attempts, 1))
+    hardness = rng.normal(size=(1, n_questions))
+    correct = rng.random((n_attempts, n_questions)) < 1 / (1 + np.exp(hardness - ability))
+    # ~5% of questions left unanswered
+    answered = rng.random((n_attempts, n_questions)) > 0.05
+
+    attempt_idx, question_idx = np.nonzero(answered)
+    is_correct = correct[attempt_idx, question_idx]
+    wrong_choice = rng.integers(1, OPTIONS_PER_QUESTION, size=len(attempt_idx))
+    option_ids = 10000 + question_idx * OPTIONS_PER_QUESTION + np.where(is_correct, 0, wrong_choice)
+
+    answers = np.column_stack((attempt_idx + 1, question_idx + 1000, option_ids, is_correct.astype(np.int64)))
+    return answers, np.arange(1, n_attempts + 1), questions, options
+
+
+def reference(answers, attempt_ids, questions):
+    """Per-item statistics with plain Python, for checking."""
+    correct = {(a, q): c for a, q, _, c in answers.tolist()}
+    matrix = [[correct.get((a, q), 0) for q, _ in questions] for a in attempt_ids.tolist()]
+    n, k = len(matrix), len(questions)
+    totals = [sum(row) for row in matrix]
+
+    def pearson(xs, ys):
+        mx, my = sum(xs) / n, sum(ys) / n
+        cov = sum((x - mx) * (y - my) for x, y in zip(xs, ys))
+        sx = math.sqrt(sum((x - mx) ** 2 for x in xs))
+        sy = math.sqrt(sum((y - my) ** 2 for y in ys))
+        return cov / (sx * sy)
+
+    def var(xs):
+        m = sum(xs) / len(xs)
+        return sum((x - m) ** 2 for x in xs) / (len(xs) - 1)
+
+    items = []
+    for j in range(k):
+        column = [row[j] for row in matrix]
+        rest = [t - c for t, c in zip(totals, column)]
+        items.append((sum(column) / n, pearson(column, rest)))
+    alpha = k / (k - 1) * (1 - sum(var([row[j] for row in matrix]) for j in range(k)) / var(totals))
+    return items, alpha
+
+
+def main():
+    answers, attempt_ids, questions, options = synthetic_quiz(300, 15, seed=1)
+    result = analyze_items(answers, attempt_ids, questions, options)
+    items, alpha = reference(answers, attempt_ids, questions)
+    for item, (p, r) in zip(result["items"], items):
+        assert abs(item["difficulty"] - p) < 1e-3 and abs(item["discrimination"] - r) < 1e-3
+    assert abs(result["cronbach_alpha"] - alpha) < 1e-3
+    print(f"reference check ok (alpha={result['cronbach_alpha']})")
+
+    print(f"{'attempts':>9} {'questions':>10} {'answers':>9} {'ms':>8} {'alpha':>7}")
+    for n_attempts, n_questions in SIZES:
+        answers, attempt_ids, questions, options = synthetic_quiz(n_attempts, n_questions)
+        best = float("inf")
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            result = analyze_items(answers, attempt_ids, questions, options)
+            best = min(best, time.perf_counter() - start)
+        print(f"{n_attempts:>9} {n_questions:>10} {len(answers):>9} {best * 1000:>8.1f} {result['cronbach_alpha']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Compare latency and throughput of the LLM backends in llm.py.
+
+Usage (from backend/):
+    python benchmarks/bench_llm_backends.py [--requests 20] [--concurrency 4]
+
+Gemini is included when GEMINI_API_KEY is set, llama.cpp when LLAMA_MODEL_PATH
+points at a GGUF file and llama-cpp-python is installed. The template engine
+always runs, so the script also works offline.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm import GeminiProvider, LlamaCppProvider, TemplateProvider  # noqa: E402
+from quiz_generation import QuizStreamParser, build_quiz_prompt  # noqa: E402
+
+CHAT_PROMPT = "Explain the difference between speed and velocity in two sentences."
+QUIZ_PROMPT = build_quiz_prompt("Physics", "Kinematics", "Medium", 10)
+
+
+def _timed_call(provider, prompt, stream):
+    start = time.perf_counter()
+    if stream:
+        parser = QuizStreamParser()
+        questions = 0
+        for part in provider.generate_content(prompt, stream=True):
+            questions += len(parser.feed(part.text))
+        return time.perf_counter() - start, questions
+    provider.generate_content(prompt)
+    return time.perf_counter() - start, 0
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run(provider, prompt, stream, requests, concurrency):
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: _timed_call(provider, prompt, stream), range(requests)))
+    wall = time.perf_counter() - wall_start
+
+    latencies = [latency for latency, _ in results]
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": _percentile(latencies, 95) * 1000,
+        "req_per_s": requests / wall,
+        "questions_per_req": statistics.mean(q for _, q in results) if stream else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    providers = [TemplateProvider(), LlamaCppProvider(), GeminiProvider()]
+
+    print(f"{'backend':<10} {'workload':<12} {'p50 ms':>10} {'p95 ms':>10} {'req/s':>8} {'q/req':>6}")
+    for provider in providers:
+        if not provider.available():
+            print(f"{provider.name:<10} (skipped: not configured)")
+            continue
+        for workload, prompt, stream in (("chat", CHAT_PROMPT, False), ("quiz-chunk", QUIZ_PROMPT, True)):
+            stats = run(provider, prompt, stream, args.requests, args.concurrency)
+            q = f"{stats['questions_per_req']:.1f}" if stats["questions_per_req"] is not None else "-"
+            print(
+                f"{provider.name:<10} {workload:<12} {stats['p50_ms']:>10.1f} "
+                f"{stats['p95_ms']:>10.1f} {stats['req_per_s']:>8.1f} {q:>6}"
+            )
+
+
+if __name__ == "__main__":
+    main()
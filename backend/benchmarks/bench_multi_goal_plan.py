@@ -0,0 +1,63 @@
+"""
+Scaling of multi_goal_planner: allocation over the per-day capacity index plus
+plan row construction, for growing goal counts and horizons (up to 10 goals x
+365 days). A manual-task load is placed on every third day.
+
+Usage (from backend/):
+    python benchmarks/bench_multi_goal_plan.py
+"""
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from multi_goal_planner import allocate_goals, build_allocation_rows  # noqa: E402
+
+SCENARIOS = ((1, 30), (3, 90), (3, 365), (10, 180), (10, 365))
+CAPACITY_MINUTES = 6 * 60
+REPEATS = 5
+
+
+def _inputs(goals, days):
+    start = date(2030, 1, 1)
+    plan_goals = [
+        {
+            "goal_id": g + 1,
+            # Deadlines spread over the horizon so goals drop out at different times
+            "deadline": start + timedelta(days=days * (g + 1) // goals - 1),
+            "weight": 1.0 + (g % 3),
+            "topics": [f"Topic {g}.{t}" for t in range(12)],
+        }
+        for g in range(goals)
+    ]
+    load = {start + timedelta(days=i): 60 for i in range(0, days, 3)}
+    return plan_goals, start, start + timedelta(days=days - 1), load
+
+
+def main():
+    print(f"{'goals':>6} {'days':>6} {'alloc ms':>9} {'rows ms':>9} {'tasks':>7} {'max day min':>12}")
+    for goals, days in SCENARIOS:
+        plan_goals, start, end, load = _inputs(goals, days)
+        best_alloc = best_rows = None
+        for _ in range(REPEATS):
+            t0 = time.perf_counter()
+            allocation = allocate_goals(plan_goals, start, end, CAPACITY_MINUTES, load)
+            t1 = time.perf_counter()
+            rows = build_allocation_rows(plan_goals, allocation, student_id=1)
+            t2 = time.perf_counter()
+            best_alloc = t1 - t0 if best_alloc is None else min(best_alloc, t1 - t0)
+            best_rows = t2 - t1 if best_rows is None else min(best_rows, t2 - t1)
+
+        per_day = dict(load)
+        for row in rows:
+            per_day[row[4]] = per_day.get(row[4], 0) + row[5]
+        print(
+            f"{goals:>6} {days:>6} {best_alloc * 1000:>9.2f} {best_rows * 1000:>9.2f} "
+            f"{len(rows):>7} {max(per_day.values()):>12}"
+        )
+
+
+if __name__ == "__main__":
+    main()
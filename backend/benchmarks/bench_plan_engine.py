@@ -0,0 +1,65 @@
+"""
+Micro-benchmark of plan_engine.build_plan_rows against the per-day loop the
+two generate routes used before (topic slicing and datetime building per day).
+
+Usage (from backend/):
+    python benchmarks/bench_plan_engine.py
+"""
+import os
+import sys
+import timeit
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plan_engine import PlanState, build_plan_rows  # noqa: E402
+
+START = date(2030, 1, 1)
+TOPICS = ",".join(f"Topic {i}" for i in range(25))
+PLAN_LENGTHS = (7, 30, 365, 3650)
+
+
+def legacy_rows(topics, start_dt, end_dt, hours_per_day, existing_dates=frozenset(), start_seq=1):
+    topic_list = [t.strip() for t in topics.split(',') if t.strip()] or ["General Study"]
+    total_days = (end_dt - start_dt).days + 1
+    rows = []
+    current_seq = start_seq
+    for i in range(total_days):
+        current_date = start_dt + timedelta(days=i)
+        if current_date in existing_dates:
+            continue
+        if len(topic_list) > total_days:
+            day_topics = topic_list[int(i * len(topic_list) / total_days):int((i + 1) * len(topic_list) / total_days)]
+            if not day_topics:
+                day_topics = [topic_list[i % len(topic_list)]]
+        else:
+            day_topics = [topic_list[i % len(topic_list)]]
+        task_time = datetime.combine(current_date, datetime.min.time()).replace(hour=9)
+        rows.append((1, 1, f"Study {' & '.join(day_topics)}", task_time, current_date,
+                     hours_per_day * 60, current_seq, "active"))
+        current_seq += 1
+    return rows
+
+
+def main():
+    print(f"{'days':>6} {'legacy us':>10} {'engine us':>10} {'extend us':>10}")
+    for days in PLAN_LENGTHS:
+        end = START + timedelta(days=days - 1)
+        assert legacy_rows(TOPICS, START, end, 2) == build_plan_rows(1, 1, TOPICS, START, end, 2)
+
+        # extend_only over a plan whose first half already exists
+        half = START + timedelta(days=days // 2)
+        state = PlanState(frozenset(START + timedelta(days=i) for i in range(days // 2)), half - timedelta(days=1), days // 2)
+
+        number = max(1, 20000 // days)
+        legacy = min(timeit.repeat(lambda: legacy_rows(TOPICS, START, end, 2), number=number, repeat=5)) / number
+        engine = min(timeit.repeat(lambda: build_plan_rows(1, 1, TOPICS, START, end, 2), number=number, repeat=5)) / number
+        extend = min(timeit.repeat(
+            lambda: build_plan_rows(1, 1, TOPICS, START, end, 2, mode="extend_only", state=state),
+            number=number, repeat=5
+        )) / number
+        print(f"{days:>6} {legacy * 1e6:>10.1f} {engine * 1e6:>10.1f} {extend * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Time schedule_optimizer.optimize_schedule on synthetic plans: several goals with
+one task per day each, plus a manual (locked) task every other day.
+
+Usage (from backend/):
+    python benchmarks/bench_schedule_optimizer.py
+"""
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schedule_optimizer import optimize_schedule  # noqa: E402
+
+TITLES = ("Study Chapter {}", "Study Quick revision {}", "Study Algebra {}", "Study Difficult proofs {}")
+SCENARIOS = ((1, 30), (3, 180), (10, 365))
+REPEATS = 3
+
+
+def _tasks(goals, days):
+    start = date(2030, 1, 1)
+    tasks = []
+    task_id = 1
+    for g in range(goals):
+        for i in range(days):
+            task_date = start + timedelta(days=i)
+            tasks.append({
+                "task_id": task_id, "task_type": "ai", "title": TITLES[(g + i) % len(TITLES)].format(i),
+                "task_date": task_date, "task_time": datetime.combine(task_date, datetime.min.time()).replace(hour=9),
+                "duration_minutes": 60, "sequence_no": i + 1,
+            })
+            task_id += 1
+    for i in range(0, days, 2):
+        task_date = start + timedelta(days=i)
+        tasks.append({
+            "task_id": i + 1, "task_type": "manual", "title": "Class", "task_date": task_date,
+            "task_time": datetime.combine(task_date, datetime.min.time()).replace(hour=11),
+            "duration_minutes": 60, "locked": True,
+        })
+    return tasks, start + timedelta(days=days + 30)
+
+
+def main():
+    print(f"{'goals':>6} {'days':>6} {'tasks':>7} {'ms':>9} {'unscheduled':>12}")
+    for goals, days in SCENARIOS:
+        tasks, horizon_end = _tasks(goals, days)
+        best = None
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            result = optimize_schedule(tasks, preference="morning", max_minutes_per_day=8 * 60, horizon_end=horizon_end)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"{goals:>6} {days:>6} {len(tasks):>7} {best * 1000:>9.1f} {len(result['unscheduled']):>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Compare per-object ORM inserts against the bulk INSERT ... RETURNING path used
+by generate_study_plan, for 30/180/365/1000-day plans.
+
+Usage (from backend/):
+    DATABASE_URL=postgresql://... python benchmarks/bench_study_plan_insert.py
+
+Defaults to a throwaway SQLite database when DATABASE_URL is not set. Against
+Postgres the rows are written to the real tables inside a transaction that is
+rolled back, so nothing is left behind.
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.gettempdir(), "bench_study_plan.db"))
+
+from database import SessionLocal, engine  # noqa: E402
+from models import Base, CreateTaskAI, StudyGoal, User  # noqa: E402
+from api.study_planner import StudyTaskResponse  # noqa: E402
+from plan_engine import insert_plan_rows  # noqa: E402
+
+PLAN_LENGTHS = (30, 180, 365, 1000)
+REPEATS = 3
+
+
+def _plan_rows(goal_id, student_id, days):
+    start = date(2030, 1, 1)
+    rows = []
+    for i in range(days):
+        current_date = start + timedelta(days=i)
+        task_time = datetime.combine(current_date, datetime.min.time()).replace(hour=9)
+        rows.append((goal_id, student_id, f"Study Topic {i % 7}", task_time, current_date, 120, i + 1, "active"))
+    return rows
+
+
+def orm_insert(db, rows):
+    # Previous implementation: one ORM object per day, then read back after commit
+    tasks = []
+    for goal_id, student_id, title, task_time, task_date, duration, seq, status in rows:
+        task = CreateTaskAI(
+            goal_id=goal_id, student_id=student_id, title=title, task_time=task_time,
+            task_date=task_date, duration_minutes=duration, sequence_no=seq, task_status=status
+        )
+        db.add(task)
+        tasks.append(task)
+    db.commit()
+    return [
+        StudyTaskResponse(
+            task_id=t.task_id, goal_id=t.goal_id, title=t.title, task_date=t.task_date, task_time=t.task_time,
+            duration_minutes=t.duration_minutes, sequence_no=t.sequence_no, task_status=t.task_status,
+            is_manual=False, task_type="ai"
+        )
+        for t in tasks
+    ]
+
+
+def bulk_insert(db, rows):
+    response = [StudyTaskResponse(**task) for task in insert_plan_rows(db, rows)]
+    db.commit()
+    return response
+
+
+def _timed(fn, days, fixture):
+    best = None
+    for _ in range(REPEATS):
+        connection = engine.connect()
+        transaction = connection.begin()
+        # Commits inside fn become savepoint releases; everything is rolled back at the end
+        db = SessionLocal(bind=connection, join_transaction_mode="create_savepoint")
+        try:
+            rows = _plan_rows(fixture["goal_id"], fixture["student_id"], days)
+            start = time.perf_counter()
+            fn(db, rows)
+            elapsed = time.perf_counter() - start
+        finally:
+            db.close()
+            transaction.rollback()
+            connection.close()
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _fixture():
+    db = SessionLocal()
+    try:
+        user = User(email=f"bench-{time.time()}@example.com", full_name="Bench", role="student")
+        db.add(user)
+        db.flush()
+        goal = StudyGoal(student_id=user.id, title="Bench Goal", type="exam", current_status="active")
+        db.add(goal)
+        db.commit()
+        return {"goal_id": goal.goal_id, "student_id": user.id, "user_id": user.id}
+    finally:
+        db.close()
+
+
+def _cleanup(fixture):
+    db = SessionLocal()
+    try:
+        db.query(StudyGoal).filter(StudyGoal.goal_id == fixture["goal_id"]).delete()
+        db.query(User).filter(User.id == fixture["user_id"]).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def main():
+    if engine.dialect.name == "sqlite":
+        Base.metadata.create_all(bind=engine)
+
+    fixture = _fixture()
+    try:
+        print(f"{'days':>6} {'orm ms':>10} {'bulk ms':>10} {'speedup':>8}")
+        for days in PLAN_LENGTHS:
+            orm = _timed(orm_insert, days, fixture)
+            bulk = _timed(bulk_insert, days, fixture)
+            print(f"{days:>6} {orm * 1000:>10.1f} {bulk * 1000:>10.1f} {orm / bulk:>7.1f}x")
+    finally:
+        _cleanup(fixture)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import hashlib
+import hmac
+import os
+from datetime import datetime, timedelta
+
+# Feed URLs are signed instead of carrying a login token; rotating this secret revokes them all.
+# There is deliberately no default: without a secret, feeds are disabled
+CALENDAR_FEED_SECRET = os.getenv("CALENDAR_FEED_SECRET") or None
+
+PRODID = "-//SmartLearn AI//Study Planner//EN"
+UID_DOMAIN = "smartlearn.study-planner"
+
+# Events rendered per streamed chunk
+EVENTS_PER_CHUNK = 200
+
+# RFC 5545: content lines longer than 75 octets are folded
+MAX_LINE_OCTETS = 75
+
+
+def feeds_enabled() -> bool:
+    return CALENDAR_FEED_SECRET is not None
+
+
+def feed_signature(student_id: int) -> str:
+    if not feeds_enabled():
+        raise RuntimeError("CALENDAR_FEED_SECRET is not set")
+    message = f"ics:{student_id}".encode()
+    return hmac.new(CALENDAR_FEED_SECRET.encode(), message, hashlib.sha256).hexdigest()[:32]
+
+
+def verify_feed_signature(student_id: int, signature: str) -> bool:
+    if not feeds_enabled():
+        return False
+    return hmac.compare_digest(feed_signature(student_id), signature)
+
+
+def feed_etag(student_id: int, version: int) -> str:
+    return f'"{student_id}-{version}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def _escape(text: str) -> str:
+    return (
+        (text or "")
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def _fold(line: str) -> str:
+    if len(line.encode()) <= MAX_LINE_OCTETS:
+        return line + "\r\n"
+
+    parts, current, size = [], "", 0
+    for char in line:
+        char_size = len(char.encode())
+        # Continuation lines start with a space, which counts towards the limit
+        limit = MAX_LINE_OCTETS if not parts else MAX_LINE_OCTETS - 1
+        if size + char_size > limit:
+            parts.append(current)
+            current, size = "", 0
+        current += char
+        size += char_size
+    parts.append(current)
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _event(task: dict, stamp: str) -> str:
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{task['task_type']}-{task['task_id']}@{UID_DOMAIN}",
+        f"DTSTAMP:{stamp}",
+    ]
+    if task["task_time"]:
+        # Floating local time: shown at the same wall-clock time the planner uses
+        lines.append(f"DTSTART:{task['task_time'].strftime('%Y%m%dT%H%M%S')}")
+        lines.append(f"DURATION:PT{task['duration_minutes'] or 60}M")
+    else:
+        lines.append(f"DTSTART;VALUE=DATE:{task['task_date'].strftime('%Y%m%d')}")
+        lines.append(f"DTEND;VALUE=DATE:{(task['task_date'] + timedelta(days=1)).strftime('%Y%m%d')}")
+
+    summary = task["title"]
+    if task["task_status"] == "completed":
+        summary = f"✓ {summary}"
+    lines.append(f"SUMMARY:{_escape(summary)}")
+    lines.append(f"CATEGORIES:{'Manual Task' if task['task_type'] == 'manual' else 'Study Plan'}")
+    lines.append("END:VEVENT")
+    return "".join(_fold(line) for line in lines)
+
+
+def render_calendar(tasks, name: str = "SmartLearn Study Plan"):
+    """
+    Yield an iCalendar document in chunks. `tasks` is any iterable of task
+    dicts (api.study_planner._row_to_task), consumed lazily.
+    """
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    yield "".join(_fold(line) for line in (
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{_escape(name)}",
+    ))
+
+    chunk = []
+    for task in tasks:
+        if not task["task_time"] and not task["task_date"]:
+            continue
+        chunk.append(_event(task, stamp))
+        if len(chunk) >= EVENTS_PER_CHUNK:
+            yield "".join(chunk)
+            chunk = []
+    chunk.append("END:VCALENDAR\r\n")
+    yield "".join(chunk)
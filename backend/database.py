@@ -20,6 +20,17 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Base class for models
 Base = declarative_base()
 
+# INSERT construct with ON CONFLICT support for the configured database
+def dialect_insert(db):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise RuntimeError(f"Upserts are not supported on '{dialect}'")
+    return insert
+
 # Dependency to get DB session
 def get_db():
     db = SessionLocal()
@@ -0,0 +1,122 @@
+import asyncio
+import os
+import threading
+from collections import deque
+from datetime import datetime, timezone
+
+
+class Subscription:
+    """
+    One subscriber's bounded queue. When the subscriber falls behind, the
+    oldest events are dropped (and counted) so a slow consumer never holds
+    memory or blocks publishers.
+    """
+
+    def __init__(self, bus: "EventBus", topic: str, max_queue: int):
+        self.bus = bus
+        self.topic = topic
+        self.dropped = 0
+        self._events = deque(maxlen=max_queue)
+        self._lock = threading.Lock()
+        self._loop = None
+        self._ready = None
+
+    def _push(self, event: dict):
+        with self._lock:
+            if len(self._events) == self._events.maxlen:
+                self.dropped += 1
+            self._events.append(event)
+            waiter = (self._loop, self._ready) if self._ready is not None else None
+        if waiter:
+            loop, ready = waiter
+            try:
+                loop.call_soon_threadsafe(ready.set)
+            except RuntimeError:
+                pass # Subscriber's loop already closed
+
+    def _drain(self) -> tuple:
+        events, self._events = list(self._events), deque(maxlen=self._events.maxlen)
+        dropped, self.dropped = self.dropped, 0
+        return events, dropped
+
+    async def next_events(self, timeout: float) -> tuple:
+        """
+        Wait up to `timeout` seconds for events, then return
+        (events, number dropped since the last call).
+        """
+        with self._lock:
+            if self._events or self.dropped:
+                return self._drain()
+            self._loop = asyncio.get_running_loop()
+            self._ready = asyncio.Event()
+            ready = self._ready
+        try:
+            await asyncio.wait_for(ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        with self._lock:
+            self._loop = self._ready = None
+            return self._drain()
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    """
+    In-process publish/subscribe with fan-out to per-subscriber bounded
+    queues. publish() is safe from any thread (request handlers, background
+    workers) and never blocks on subscribers.
+
+    Only subscribers in the same process see an event; with several API
+    workers, a teacher sees events from the worker serving their stream.
+    """
+
+    def __init__(self, max_queue: int):
+        self.max_queue = max_queue
+        self._topics = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic: str) -> Subscription:
+        subscription = Subscription(self, topic, self.max_queue)
+        with self._lock:
+            self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._topics.get(subscription.topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._topics[subscription.topic]
+
+    def publish(self, topic: str, event: dict) -> int:
+        with self._lock:
+            subscribers = list(self._topics.get(topic, ()))
+        for subscription in subscribers:
+            subscription._push(event)
+        return len(subscribers)
+
+    def subscriber_count(self, topic: str) -> int:
+        with self._lock:
+            return len(self._topics.get(topic, ()))
+
+
+def quiz_topic(quiz_id: int) -> str:
+    return f"quiz:{quiz_id}"
+
+
+def publish_attempt_event(event_type: str, quiz_id: int, attempt_id: int, student_id: int, **fields):
+    """Live attempt event (started, warning, submitted) for teachers watching the quiz."""
+    event_bus.publish(quiz_topic(quiz_id), {
+        "type": event_type,
+        "quiz_id": quiz_id,
+        "attempt_id": attempt_id,
+        "student_id": student_id,
+        "at": datetime.now(timezone.utc).isoformat(),
+        **fields
+    })
+
+
+event_bus = EventBus(max_queue=int(os.getenv("EVENT_QUEUE_SIZE", "200")))
@@ -0,0 +1,185 @@
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from models import Option, Question, QuizAttempt, StudentAnswer
+
+# Upper/lower groups for distractor analysis: top and bottom 27% by total score
+GROUP_FRACTION = 0.27
+
+# Thresholds for the per-question flags
+TOO_EASY = 0.9
+TOO_HARD = 0.2
+LOW_DISCRIMINATION = 0.2
+# A distractor picked by fewer responders than this isn't doing any work
+MIN_DISTRACTOR_SHARE = 0.05
+
+
+def _round(value, digits: int = 3) -> Optional[float]:
+    if value is None or not np.isfinite(value):
+        return None
+    return round(float(value), digits)
+
+
+def _indices(sorted_ids: np.ndarray, ids: np.ndarray):
+    """Positions of `ids` in `sorted_ids`, plus a mask of the ids that were found."""
+    if not len(sorted_ids):
+        return np.zeros(len(ids), dtype=np.int64), np.zeros(len(ids), dtype=bool)
+    pos = np.searchsorted(sorted_ids, ids)
+    pos = np.minimum(pos, len(sorted_ids) - 1)
+    return pos, sorted_ids[pos] == ids
+
+
+def analyze_items(answers: np.ndarray, attempt_ids: np.ndarray, questions: list, options: list) -> dict:
+    """
+    `answers` is an (n, 4) int array of (attempt_id, question_id, option_id,
+    is_correct) rows; `attempt_ids` are all completed attempts (unanswered
+    questions count as incorrect). `questions` is [(question_id, text)] in
+    quiz order and `options` is [(option_id, question_id, text, is_correct)].
+    """
+    attempts = np.unique(np.asarray(attempt_ids, dtype=np.int64))
+    n, k = len(attempts), len(questions)
+
+    question_ids = np.array([q[0] for q in questions], dtype=np.int64)
+    question_order = np.argsort(question_ids)
+    sorted_question_ids = question_ids[question_order]
+
+    answers = np.asarray(answers, dtype=np.int64).reshape(-1, 4)
+    rows, row_found = _indices(attempts, answers[:, 0])
+    q_sorted, q_found = _indices(sorted_question_ids, answers[:, 1])
+    keep = row_found & q_found
+    rows, cols = rows[keep], question_order[q_sorted[keep]]
+    answer_options, answer_correct = answers[keep, 2], answers[keep, 3]
+
+    # 1. Correctness matrix
+    matrix = np.zeros((n, k), dtype=np.float64)
+    matrix[rows, cols] = answer_correct > 0
+    responses = np.bincount(cols, minlength=k)
+
+    total = matrix.sum(axis=1)
+
+    # 2. Difficulty (proportion correct) and corrected point-biserial:
+    # each item against the total score without that item
+    with np.errstate(invalid="ignore", divide="ignore"):
+        difficulty = matrix.mean(axis=0) if n else np.full(k, np.nan)
+        rest = total[:, None] - matrix
+        cov = (matrix * rest).mean(axis=0) - difficulty * rest.mean(axis=0) if n else np.full(k, np.nan)
+        discrimination = cov / (matrix.std(axis=0) * rest.std(axis=0)) if n else np.full(k, np.nan)
+
+    # 3. Cronbach's alpha
+    alpha = None
+    if n > 1 and k > 1:
+        total_var = total.var(ddof=1)
+        if total_var > 0:
+            alpha = k / (k - 1) * (1 - matrix.var(axis=0, ddof=1).sum() / total_var)
+
+    # 4. Distractors: option picks overall and within the upper/lower score groups
+    group = np.zeros(n, dtype=np.int8)
+    if n >= 2:
+        size = min(max(1, int(round(n * GROUP_FRACTION))), n // 2)
+        order = np.argsort(total, kind="stable")
+        group[order[:size]] = -1
+        group[order[-size:]] = 1
+        group_size = size
+    else:
+        group_size = 0
+
+    option_ids = np.array(sorted(o[0] for o in options), dtype=np.int64)
+    opt_pos, opt_found = _indices(option_ids, answer_options)
+    opt_pos, opt_rows = opt_pos[opt_found], rows[opt_found]
+    picks = np.bincount(opt_pos, minlength=len(option_ids))
+    upper_picks = np.bincount(opt_pos, weights=group[opt_rows] == 1, minlength=len(option_ids))
+    lower_picks = np.bincount(opt_pos, weights=group[opt_rows] == -1, minlength=len(option_ids))
+
+    options_by_question = {}
+    for option_id, question_id, text, is_correct in options:
+        options_by_question.setdefault(question_id, []).append((option_id, text, bool(is_correct)))
+
+    items = []
+    for j, (question_id, text) in enumerate(questions):
+        answered = int(responses[j])
+        option_rows = []
+        flags = []
+        for option_id, option_text, is_correct in options_by_question.get(question_id, []):
+            i = int(np.searchsorted(option_ids, option_id))
+            share = picks[i] / answered if answered else None
+            option_rows.append({
+                "option_id": option_id,
+                "text": option_text,
+                "is_correct": is_correct,
+                "chosen": int(picks[i]),
+                "share": _round(share),
+                "upper_share": _round(upper_picks[i] / group_size) if group_size else None,
+                "lower_share": _round(lower_picks[i] / group_size) if group_size else None,
+            })
+            if not is_correct and answered and share < MIN_DISTRACTOR_SHARE:
+                flags.append(f"non_functioning_distractor:{option_id}")
+            elif not is_correct and group_size and upper_picks[i] > lower_picks[i]:
+                flags.append(f"distractor_attracts_upper_group:{option_id}")
+
+        p, r = _round(difficulty[j]), _round(discrimination[j])
+        if p is not None and p > TOO_EASY:
+            flags.insert(0, "too_easy")
+        elif p is not None and p < TOO_HARD:
+            flags.insert(0, "too_hard")
+        if r is not None and r < 0:
+            flags.insert(0, "negative_discrimination")
+        elif r is not None and r < LOW_DISCRIMINATION:
+            flags.insert(0, "low_discrimination")
+
+        items.append({
+            "question_id": question_id,
+            "text": text,
+            "responses": answered,
+            "difficulty": p,
+            "discrimination": r,
+            "flags": flags,
+            "options": option_rows,
+        })
+
+    return {
+        "attempts": n,
+        "questions": k,
+        "mean_score": _round(total.mean()) if n else None,
+        "score_sd": _round(total.std(ddof=1)) if n > 1 else None,
+        "cronbach_alpha": _round(alpha),
+        "items": items,
+    }
+
+
+def load_item_analysis(db: Session, quiz_id: int) -> dict:
+    """
+    Item analysis for a quiz's completed attempts: one query for the
+    questions and options, one for the whole answer matrix.
+    """
+    # 1. Questions and options
+    questions, options = [], []
+    seen = set()
+    for question_id, question_text, option_id, option_text, is_correct in db.execute(
+        select(Question.id, Question.text, Option.id, Option.text, Option.is_correct)
+        .outerjoin(Option, Option.question_id == Question.id)
+        .where(Question.quiz_id == quiz_id)
+        .order_by(Question.id, Option.id)
+    ):
+        if question_id not in seen:
+            seen.add(question_id)
+            questions.append((question_id, question_text))
+        if option_id is not None:
+            options.append((option_id, question_id, option_text, is_correct))
+
+    # 2. Every completed attempt with its answers (attempts without answers come back once, with -1s)
+    rows = db.execute(
+        select(
+            QuizAttempt.id,
+            func.coalesce(StudentAnswer.question_id, -1),
+            func.coalesce(StudentAnswer.selected_option_id, -1),
+            func.coalesce(StudentAnswer.is_correct, 0)
+        )
+        .outerjoin(StudentAnswer, StudentAnswer.attempt_id == QuizAttempt.id)
+        .where(QuizAttempt.quiz_id == quiz_id, QuizAttempt.status == "completed")
+    ).all()
+
+    answers = np.array(rows, dtype=np.int64).reshape(-1, 4)
+    return analyze_items(answers, answers[:, 0], questions, options)
@@ -0,0 +1,256 @@
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, update
+
+from database import SessionLocal
+from event_bus import event_bus
+from models import AIJob
+
+# Terminal states; anything else is still in flight
+JOB_DONE_STATES = ("completed", "failed")
+
+# Minimum seconds between progress writes for a single job
+PROGRESS_WRITE_INTERVAL = 0.5
+
+# Running jobs renew their lease every JOB_HEARTBEAT_SECONDS; a job whose lease
+# is older than JOB_LEASE_SECONDS lost its worker (crash, restart) and is
+# queued again, up to MAX_JOB_ATTEMPTS runs in total
+JOB_HEARTBEAT_SECONDS = 15
+JOB_LEASE_SECONDS = 60
+MAX_JOB_ATTEMPTS = 3
+
+
+def job_topic(job_id: str) -> str:
+    return f"job:{job_id}"
+
+
+class JobQueue:
+    """
+    Database-backed job queue executed by an in-process worker pool.
+
+    Jobs are rows in `ai_jobs`, so any API process can report their status.
+    A worker only runs a job after atomically claiming it (queued -> running),
+    which keeps jobs from running twice when several processes resume the queue.
+    While it runs, a heartbeat renews the job's lease; jobs whose lease ran
+    out are requeued (or failed after MAX_JOB_ATTEMPTS) by any process.
+    Every write a run makes is conditional on the job still being on the
+    attempt it claimed, so a run that lost its lease can't overwrite the
+    progress or result of the run that replaced it.
+    """
+
+    def __init__(self, max_workers: int):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ai-job")
+        self._handlers = {}
+        self._running = {} # job_id -> attempt claimed by this process
+        self._running_lock = threading.Lock()
+        self._heartbeat = None
+        self._stopped = threading.Event()
+
+    def register(self, kind: str, handler):
+        """
+        Register handler(payload: dict, progress: callable) -> dict for a job kind.
+        """
+        self._handlers[kind] = handler
+
+    def submit(self, db, kind: str, user_id: int, payload: dict, total: int = None) -> AIJob:
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'")
+
+        job = AIJob(
+            job_id=uuid.uuid4().hex,
+            user_id=user_id,
+            kind=kind,
+            status="queued",
+            progress=0,
+            total=total,
+            payload=json.dumps(payload)
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+
+        self._executor.submit(self._run, job.job_id)
+        return job
+
+    def resume_pending(self):
+        """
+        Pick up jobs left queued by a restart, and requeue running jobs whose
+        worker is gone. Called once on startup; also starts the heartbeat,
+        which keeps reclaiming expired leases afterwards.
+        """
+        self.reclaim_expired()
+
+        db = SessionLocal()
+        try:
+            pending = db.query(AIJob.job_id).filter(AIJob.status == "queued").all()
+        finally:
+            db.close()
+
+        for (job_id,) in pending:
+            self._executor.submit(self._run, job_id)
+
+        if self._heartbeat is None:
+            self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="ai-job-heartbeat", daemon=True)
+            self._heartbeat.start()
+
+    def reclaim_expired(self) -> list:
+        """
+        Requeue running jobs whose lease expired; fail those out of attempts.
+        Returns the requeued job ids (already dispatched to this process).
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=JOB_LEASE_SECONDS)
+        db = SessionLocal()
+        try:
+            expired = (AIJob.status == "running", AIJob.heartbeat_at.is_(None) | (AIJob.heartbeat_at < cutoff))
+            stale = db.query(AIJob.job_id, AIJob.attempts).filter(*expired).all()
+
+            requeued = []
+            for job_id, attempts in stale:
+                out_of_attempts = (attempts or 0) >= MAX_JOB_ATTEMPTS
+                # Conditional on the lease still being expired, so only one process reclaims it
+                changed = db.query(AIJob).filter(AIJob.job_id == job_id, *expired).update(
+                    {AIJob.status: "failed", AIJob.error: "Job worker stopped before finishing"} if out_of_attempts
+                    else {AIJob.status: "queued"},
+                    synchronize_session=False
+                )
+                db.commit()
+                if changed and not out_of_attempts:
+                    requeued.append(job_id)
+                elif changed:
+                    event_bus.publish(job_topic(job_id), {"status": "failed"})
+        finally:
+            db.close()
+
+        for job_id in requeued:
+            print(f"[WARN] Requeued job {job_id}: its worker stopped before finishing")
+            self._executor.submit(self._run, job_id)
+        return requeued
+
+    def _heartbeat_loop(self):
+        while not self._stopped.wait(JOB_HEARTBEAT_SECONDS):
+            with self._running_lock:
+                running = list(self._running.items())
+            db = SessionLocal()
+            try:
+                now = datetime.utcnow()
+                for job_id, attempt in running:
+                    db.query(AIJob).filter(*self._owned(job_id, attempt))\
+                        .update({AIJob.heartbeat_at: now}, synchronize_session=False)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                print(f"[WARN] Job heartbeat failed: {e}")
+            finally:
+                db.close()
+            try:
+                self.reclaim_expired()
+            except Exception as e:
+                print(f"[WARN] Could not reclaim expired jobs: {e}")
+
+    def _claim(self, db, job_id: str):
+        """Claim a queued job; returns the attempt number claimed, or None."""
+        now = datetime.utcnow()
+        attempt = db.execute(
+            update(AIJob)
+            .where(AIJob.job_id == job_id, AIJob.status == "queued")
+            .values(
+                status="running",
+                attempts=func.coalesce(AIJob.attempts, 0) + 1,
+                heartbeat_at=now,
+                updated_at=now
+            )
+            .returning(AIJob.attempts)
+        ).scalar()
+        db.commit()
+        return attempt
+
+    @staticmethod
+    def _owned(job_id: str, attempt: int) -> tuple:
+        # The job is still running on the attempt this worker claimed
+        return (AIJob.job_id == job_id, AIJob.status == "running", AIJob.attempts == attempt)
+
+    def _write(self, db, job_id: str, attempt: int, values: dict) -> bool:
+        """Conditional update of a claimed job; False if the claim was lost."""
+        values[AIJob.updated_at] = datetime.utcnow()
+        changed = db.query(AIJob).filter(*self._owned(job_id, attempt)).update(values, synchronize_session=False)
+        db.commit()
+        return changed == 1
+
+    def _run(self, job_id: str):
+        db = SessionLocal()
+        attempt = None
+        try:
+            attempt = self._claim(db, job_id)
+            if attempt is None:
+                return
+            with self._running_lock:
+                self._running[job_id] = attempt
+            event_bus.publish(job_topic(job_id), {"status": "running"})
+
+            kind, raw_payload = db.query(AIJob.kind, AIJob.payload).filter(AIJob.job_id == job_id).one()
+            handler = self._handlers.get(kind)
+            payload = json.loads(raw_payload or "{}")
+
+            last_write = [0.0]
+
+            def progress(done: int, total: int = None):
+                # Throttle writes; callers may report after every question
+                now = time.monotonic()
+                if now - last_write[0] < PROGRESS_WRITE_INTERVAL:
+                    return
+                last_write[0] = now
+                values = {AIJob.progress: done}
+                if total is not None:
+                    values[AIJob.total] = total
+                if self._write(db, job_id, attempt, values):
+                    event_bus.publish(job_topic(job_id), {"status": "running", "progress": done})
+
+            try:
+                result = handler(payload, progress)
+                status = "completed"
+                values = {
+                    AIJob.result: json.dumps(result),
+                    AIJob.status: status,
+                    AIJob.progress: func.coalesce(func.nullif(AIJob.total, 0), AIJob.progress)
+                }
+            except Exception as e:
+                print(f"[ERROR] Job {job_id} ({kind}) failed: {e}")
+                status = "failed"
+                values = {AIJob.status: status, AIJob.error: str(e)[:500]}
+            if self._write(db, job_id, attempt, values):
+                event_bus.publish(job_topic(job_id), {"status": status})
+            else:
+                print(f"[WARN] Job {job_id} lost its lease to another worker; discarding this run's {status} result")
+
+        except Exception as e:
+            db.rollback()
+            print(f"[ERROR] Job runner error for {job_id}: {e}")
+        finally:
+            with self._running_lock:
+                # A newer attempt of the same job may be running in this process too
+                if attempt is not None and self._running.get(job_id) == attempt:
+                    del self._running[job_id]
+            db.close()
+
+
+def job_to_response(job: AIJob) -> dict:
+    return {
+        "job_id": job.job_id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress,
+        "total": job.total,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at
+    }
+
+
+job_queue = JobQueue(max_workers=int(os.getenv("AI_JOB_WORKERS", "2")))
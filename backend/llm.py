@@ -0,0 +1,311 @@
+import json
+import os
+import re
+import threading
+
+import google.generativeai as genai
+from dotenv import load_dotenv
+from pathlib import Path
+
+# Explicitly load .env from project root
+env_path = Path(__file__).resolve().parent.parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+# Backends:
+#   'gemini'   - Google Gemini (default)
+#   'local'    - deterministic template engine, no network (CI / offline demo)
+#   'llamacpp' - local GGUF model on CPU via llama-cpp-python (LLAMA_MODEL_PATH)
+#   'auto'     - route between a local backend and Gemini (see RoutedProvider)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini").lower()
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-flash-latest")
+LLAMA_MODEL_PATH = os.getenv("LLAMA_MODEL_PATH")
+
+# 'auto' routing: chat prompts up to this many characters try the local backend first
+LOCAL_MAX_PROMPT_CHARS = int(os.getenv("LLM_LOCAL_MAX_PROMPT_CHARS", "400"))
+
+TASK_CHAT = "chat"
+TASK_QUIZ = "quiz"
+
+
+class _TextResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _ProviderChat:
+    def __init__(self, provider):
+        self._provider = provider
+
+    def send_message(self, message: str):
+        return self._provider.generate_content(message)
+
+
+class LLMProvider:
+    """
+    Minimal interface shared by every backend. It mirrors the subset of
+    google.generativeai.GenerativeModel used by the app, so call sites and
+    wrappers (e.g. rate_limit.GovernedModel) work with any provider.
+
+    generate_content(prompt, stream=False) returns an object with `.text`,
+    or an iterator of such objects when streaming.
+    """
+
+    name = "base"
+    # Remote, quota-bound backends go through rate_limit's governor (see rate_limit.govern)
+    rate_limited = False
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        raise NotImplementedError
+
+    def start_chat(self, history=None):
+        return _ProviderChat(self)
+
+    def available(self) -> bool:
+        return True
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+    rate_limited = True
+
+    def __init__(self, model_name: str = GEMINI_MODEL):
+        self.model_name = model_name
+        self._model = None
+
+    def available(self) -> bool:
+        return bool(os.getenv("GEMINI_API_KEY"))
+
+    def _get_model(self):
+        if self._model is None:
+            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+            self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        return self._get_model().generate_content(prompt, stream=stream)
+
+    def start_chat(self, history=None):
+        return self._get_model().start_chat(history=history or [])
+
+
+class TemplateProvider(LLMProvider):
+    """
+    Deterministic, offline template engine. Produces well-formed quiz JSON and
+    canned chat answers instantly; used as the CI test double and offline demo.
+    """
+
+    name = "local"
+    STREAM_CHUNK_CHARS = 64
+
+    # Question k combines CONCEPTS[k % 17], SETTINGS[k % 19] and ASPECTS[k % 23]:
+    # the list lengths are coprime, so questions less than 17 * 19 apart differ
+    # in their number and at least two of these words and are never near-duplicates
+    CONCEPTS = (
+        "definitions", "core principles", "notation", "worked examples", "edge cases",
+        "common mistakes", "terminology", "assumptions", "key formulas", "diagrams",
+        "historical context", "standard procedures", "special cases", "proof techniques",
+        "estimation", "classification", "representations",
+    )
+    SETTINGS = (
+        "a small input", "a large input", "an exam question", "a lab exercise", "a real project",
+        "a timed quiz", "a group task", "a revision session", "a case study", "an interview",
+        "a textbook problem", "a design review", "a debugging session", "a lecture demo",
+        "a homework set", "a practical test", "a mock exam", "a tutorial", "a research summary",
+    )
+    ASPECTS = (
+        "accuracy", "speed", "memory use", "clarity", "correctness", "scalability", "simplicity",
+        "robustness", "precision", "efficiency", "readability", "generality", "consistency",
+        "completeness", "reliability", "cost", "safety", "flexibility", "portability",
+        "maintainability", "testability", "fairness", "stability",
+    )
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        text = self._respond(prompt)
+        if stream:
+            return (
+                _TextResponse(text[i:i + self.STREAM_CHUNK_CHARS])
+                for i in range(0, len(text), self.STREAM_CHUNK_CHARS)
+            )
+        return _TextResponse(text)
+
+    def _respond(self, prompt: str) -> str:
+        if "Generate a quiz" in prompt:
+            return self._quiz(prompt)
+        return f"(offline) You asked: {prompt.strip()}"
+
+    def _quiz(self, prompt: str) -> str:
+        def field(name, default):
+            match = re.search(rf"{name}:\s*(.+)", prompt)
+            return match.group(1).strip() if match else default
+
+        topic = field("Topic", "General")
+        count = int(field("Number of Questions", "5"))
+        part_match = re.search(r"question set (\d+) of (\d+)", prompt)
+        part, parts = (int(part_match.group(1)), int(part_match.group(2))) if part_match else (1, 1)
+        # Questions the prompt lists as already given (retries and top-ups)
+        excluded = set(re.findall(r"^\s*- (.+)$", prompt, re.MULTILINE))
+
+        # Each question set takes every parts-th number, so concurrent sets never overlap
+        questions = []
+        k = part - 1
+        while len(questions) < count:
+            question = self._question(k)
+            k += parts
+            if question["text"] not in excluded:
+                questions.append(question)
+
+        return json.dumps({
+            "title": f"{topic} Practice",
+            "description": f"Offline practice questions on {topic}.",
+            "questions": questions
+        })
+
+    def _question(self, k: int) -> dict:
+        concept = self.CONCEPTS[k % len(self.CONCEPTS)]
+        setting = self.SETTINGS[k % len(self.SETTINGS)]
+        aspect = self.ASPECTS[k % len(self.ASPECTS)]
+        return {
+            # The topic is left out of the stem so it can't dominate the similarity check
+            "text": f"Question {k + 1}: when applying {concept} to {setting}, what matters most for {aspect}?",
+            "options": [
+                {"text": f"Checking {concept} against the {aspect} requirement first", "is_correct": True},
+                {"text": f"Ignoring {aspect} until {setting} is finished", "is_correct": False},
+                {"text": f"Replacing {concept} with guesswork", "is_correct": False},
+                {"text": "None of these choices", "is_correct": False},
+            ]
+        }
+
+
+class LlamaCppProvider(LLMProvider):
+    """
+    CPU inference on a local GGUF model through llama-cpp-python (optional dependency).
+    """
+
+    name = "llamacpp"
+    MAX_TOKENS = 2048
+    # Longest wait for the model while another generation holds it; routed calls then fall back to remote
+    LOCK_TIMEOUT_SECONDS = float(os.getenv("LLAMA_LOCK_TIMEOUT_SECONDS", "60"))
+
+    # Loading a GGUF model takes seconds, so instances are shared per path.
+    # A llama.cpp context is not thread-safe; calls are serialized per model.
+    _models = {}
+    _lock = threading.Lock()
+
+    def __init__(self, model_path: str = LLAMA_MODEL_PATH):
+        self.model_path = model_path
+
+    def available(self) -> bool:
+        if not self.model_path or not os.path.exists(self.model_path):
+            return False
+        try:
+            import llama_cpp  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def _get_llm(self):
+        # Called with _lock held, so concurrent first calls load the model once
+        llm = self._models.get(self.model_path)
+        if llm is None:
+            from llama_cpp import Llama
+            llm = Llama(model_path=self.model_path, n_ctx=4096, verbose=False)
+            self._models[self.model_path] = llm
+        return llm
+
+    def _acquire(self):
+        if not self._lock.acquire(timeout=self.LOCK_TIMEOUT_SECONDS):
+            raise RuntimeError("Local model is busy")
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        self._acquire()
+        try:
+            llm = self._get_llm()
+            if stream:
+                # Generated in full while holding the model and yielded afterwards, so a
+                # slow or abandoned consumer never keeps the model from other requests
+                pieces = [
+                    chunk["choices"][0]["text"]
+                    for chunk in llm.create_completion(prompt, max_tokens=self.MAX_TOKENS, stream=True)
+                ]
+            else:
+                completion = llm.create_completion(prompt, max_tokens=self.MAX_TOKENS)
+        finally:
+            self._lock.release()
+
+        if stream:
+            return iter([_TextResponse(piece) for piece in pieces])
+        return _TextResponse(completion["choices"][0]["text"])
+
+
+class RoutedProvider(LLMProvider):
+    """
+    Local-first routing: short chat prompts go to the local backend, anything
+    long or marked hard (quiz generation) goes to the remote one. If the chosen
+    backend is unavailable or errors before producing output, the other is tried.
+    """
+
+    name = "auto"
+
+    def __init__(self, local: LLMProvider, remote: LLMProvider, task: str = TASK_CHAT,
+                 max_local_chars: int = LOCAL_MAX_PROMPT_CHARS):
+        self.local = local
+        self.remote = remote
+        self.task = task
+        self.max_local_chars = max_local_chars
+
+    def available(self) -> bool:
+        return self.local.available() or self.remote.available()
+
+    @property
+    def rate_limited(self) -> bool:
+        return self.remote.rate_limited
+
+    def route(self, prompt: str) -> list:
+        prefer_local = self.task == TASK_CHAT and len(prompt) <= self.max_local_chars
+        order = [self.local, self.remote] if prefer_local else [self.remote, self.local]
+        return [provider for provider in order if provider.available()]
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        candidates = self.route(prompt)
+        if not candidates:
+            raise RuntimeError("No LLM backend available")
+
+        last_error = None
+        for provider in candidates:
+            try:
+                response = provider.generate_content(prompt, stream=stream)
+                if stream:
+                    # Pull the first piece so connection errors still fall through
+                    iterator = iter(response)
+                    first = next(iterator, None)
+                    return self._prepend(first, iterator)
+                return response
+            except Exception as e:
+                print(f"[WARN] LLM backend '{provider.name}' failed, trying next: {e}")
+                last_error = e
+        raise last_error
+
+    @staticmethod
+    def _prepend(first, iterator):
+        if first is not None:
+            yield first
+        yield from iterator
+
+
+def get_model(task: str = TASK_CHAT) -> LLMProvider:
+    """
+    Return the provider for the configured backend.
+    `task` lets the 'auto' backend route chat and quiz generation differently.
+    """
+    if LLM_BACKEND == "local":
+        return TemplateProvider()
+    if LLM_BACKEND == "llamacpp":
+        return LlamaCppProvider()
+    if LLM_BACKEND == "auto":
+        # Only a real model is used as the local side; the template engine is for tests/offline
+        return RoutedProvider(LlamaCppProvider(), GeminiProvider(), task=task)
+    return GeminiProvider()
+
+
+def llm_configured(task: str = TASK_CHAT) -> bool:
+    return get_model(task).available()
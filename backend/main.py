@@ -1,8 +1,12 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from api import chat, quiz, study_planner, ai, goals
+from api import chat, quiz, study_planner, ai, goals, analytics
 import auth, models, database, users
+from rate_limit import llm_governor
+from jobs import job_queue
+from write_buffer import answer_buffer, warning_buffer
+from attempt_scheduler import attempt_scheduler
 
 
 # Create Database Tables if strictly necessary, but preferably managed externally
@@ -11,6 +15,25 @@ import auth, models, database, users
 app = FastAPI(title="SmartLearn AI Backend")
 
 
+@app.on_event("startup")
+def resume_background_jobs():
+    # Re-dispatch AI jobs that were still queued when the process last stopped
+    try:
+        job_queue.resume_pending()
+    except Exception as e:
+        print(f"[WARN] Could not resume background jobs: {e}")
+    # Auto-submits quiz attempts whose time limit or deadline has passed
+    attempt_scheduler.start()
+
+
+@app.on_event("shutdown")
+def flush_write_buffers():
+    attempt_scheduler.stop()
+    # Autosaved quiz answers and proctoring warnings still waiting in memory
+    answer_buffer.stop()
+    warning_buffer.stop()
+
+
 # Include Routers
 
 app.include_router(chat.router, prefix="/api/chat", tags=["Doubt Solver"])
@@ -19,6 +42,7 @@ app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(study_planner.router, prefix="/api/study-planner", tags=["Study Planner"])
 app.include_router(ai.router, prefix="/api/ai", tags=["AI Task Generation"])
 app.include_router(goals.router, prefix="/api/goals", tags=["Goals"])
+app.include_router(analytics.router, prefix="/api/analytics", tags=["Analytics"])
 
 
 app.include_router(users.router)
@@ -49,6 +73,11 @@ def read_root():
 def health_check():
     return {"status": "healthy"}
 
+@app.get("/health/llm")
+def llm_health_check():
+    # Limiter metrics: queue depth, admissions, rejections and wait times per priority
+    return llm_governor.snapshot()
+
 import os
 
 if __name__ == "__main__":
@@ -0,0 +1,19 @@
+-- Background job queue for slow AI work (quiz generation).
+-- Schema is managed outside the app (create_all is disabled in main.py); apply with psql.
+
+CREATE TABLE IF NOT EXISTS ai_jobs (
+    job_id      VARCHAR(36) PRIMARY KEY,
+    user_id     INTEGER NOT NULL REFERENCES users(id),
+    kind        VARCHAR(50) NOT NULL,
+    status      VARCHAR(50) NOT NULL DEFAULT 'queued',
+    progress    INTEGER NOT NULL DEFAULT 0,
+    total       INTEGER,
+    payload     TEXT,
+    result      TEXT,
+    error       VARCHAR(500),
+    created_at  TIMESTAMP DEFAULT (NOW() AT TIME ZONE 'utc'),
+    updated_at  TIMESTAMP DEFAULT (NOW() AT TIME ZONE 'utc')
+);
+
+CREATE INDEX IF NOT EXISTS ix_ai_jobs_user_id ON ai_jobs (user_id);
+CREATE INDEX IF NOT EXISTS ix_ai_jobs_status ON ai_jobs (status);
@@ -0,0 +1,5 @@
+-- Range queries for the planner calendar (/api/study-planner/tasks/calendar)
+-- filter by student and task_date on both task tables.
+
+CREATE INDEX IF NOT EXISTS ix_create_task_ai_student_date ON create_task_ai (student_id, task_date);
+CREATE INDEX IF NOT EXISTS ix_create_task_manual_student_date ON create_task_manual (student_id, task_date);
@@ -0,0 +1,25 @@
+-- Delta sync for the study planner (/api/study-planner/tasks/sync):
+-- change timestamps on both task tables plus tombstones for deleted tasks.
+
+ALTER TABLE create_task_ai ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP;
+UPDATE create_task_ai SET updated_at = COALESCE(created_at, NOW() AT TIME ZONE 'utc') WHERE updated_at IS NULL;
+ALTER TABLE create_task_ai ALTER COLUMN updated_at SET DEFAULT (NOW() AT TIME ZONE 'utc');
+ALTER TABLE create_task_ai ALTER COLUMN updated_at SET NOT NULL;
+
+ALTER TABLE create_task_manual ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP;
+UPDATE create_task_manual SET updated_at = COALESCE(created_at, NOW() AT TIME ZONE 'utc') WHERE updated_at IS NULL;
+ALTER TABLE create_task_manual ALTER COLUMN updated_at SET DEFAULT (NOW() AT TIME ZONE 'utc');
+ALTER TABLE create_task_manual ALTER COLUMN updated_at SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS ix_create_task_ai_student_updated ON create_task_ai (student_id, updated_at);
+CREATE INDEX IF NOT EXISTS ix_create_task_manual_student_updated ON create_task_manual (student_id, updated_at);
+
+CREATE TABLE IF NOT EXISTS task_tombstones (
+    id          SERIAL PRIMARY KEY,
+    student_id  INTEGER NOT NULL,
+    task_type   VARCHAR(20) NOT NULL,
+    task_id     INTEGER NOT NULL,
+    deleted_at  TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'utc')
+);
+
+CREATE INDEX IF NOT EXISTS ix_task_tombstones_student_deleted ON task_tombstones (student_id, deleted_at);
@@ -0,0 +1,8 @@
+-- Per-student plan version counter, bumped on every task change.
+-- Backs the ETag of the calendar (.ics) feed: /api/study-planner/calendar/{student_id}/{signature}.ics
+
+CREATE TABLE IF NOT EXISTS plan_versions (
+    student_id  INTEGER PRIMARY KEY,
+    version     INTEGER NOT NULL DEFAULT 0,
+    updated_at  TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'utc')
+);
@@ -0,0 +1,105 @@
+-- Precomputed per-student progress aggregates behind /api/analytics/me.
+-- Kept up to date by student_analytics.py on every task status change and quiz submission;
+-- the backfill below seeds them from existing rows (streaks start fresh).
+
+CREATE TABLE IF NOT EXISTS student_stats (
+    user_id          INTEGER PRIMARY KEY,
+    tasks_completed  INTEGER NOT NULL DEFAULT 0,
+    study_minutes    INTEGER NOT NULL DEFAULT 0,
+    quizzes_taken    INTEGER NOT NULL DEFAULT 0,
+    answers_total    INTEGER NOT NULL DEFAULT 0,
+    answers_correct  INTEGER NOT NULL DEFAULT 0,
+    current_streak   INTEGER NOT NULL DEFAULT 0,
+    longest_streak   INTEGER NOT NULL DEFAULT 0,
+    last_active_date DATE,
+    updated_at       TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'utc')
+);
+
+CREATE TABLE IF NOT EXISTS student_daily_stats (
+    user_id          INTEGER NOT NULL,
+    stat_date        DATE NOT NULL,
+    tasks_completed  INTEGER NOT NULL DEFAULT 0,
+    study_minutes    INTEGER NOT NULL DEFAULT 0,
+    quizzes_taken    INTEGER NOT NULL DEFAULT 0,
+    answers_total    INTEGER NOT NULL DEFAULT 0,
+    answers_correct  INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, stat_date)
+);
+
+CREATE TABLE IF NOT EXISTS student_goal_stats (
+    user_id          INTEGER NOT NULL,
+    goal_id          INTEGER NOT NULL,
+    tasks_completed  INTEGER NOT NULL DEFAULT 0,
+    study_minutes    INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, goal_id)
+);
+
+CREATE TABLE IF NOT EXISTS student_topic_stats (
+    user_id          INTEGER NOT NULL,
+    topic            VARCHAR(100) NOT NULL,
+    quizzes_taken    INTEGER NOT NULL DEFAULT 0,
+    answers_total    INTEGER NOT NULL DEFAULT 0,
+    answers_correct  INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, topic)
+);
+
+-- Backfill (manual tasks count as 60 minutes, as in student_analytics.MANUAL_TASK_MINUTES)
+
+CREATE TEMP TABLE completed_tasks AS
+    SELECT student_id AS user_id, goal_id, task_date, COALESCE(duration_minutes, 0) AS minutes
+    FROM create_task_ai WHERE task_status = 'completed'
+    UNION ALL
+    SELECT student_id, NULL, task_date, 60
+    FROM create_task_manual WHERE status = 'completed';
+
+CREATE TEMP TABLE submitted_quizzes AS
+    SELECT s.user_id,
+           CAST(a.timestamp AS DATE) AS stat_date,
+           COALESCE(NULLIF(TRIM(q.topic), ''), 'General') AS topic,
+           (SELECT COUNT(*) FROM student_answers sa WHERE sa.attempt_id = a.id) AS answered,
+           (SELECT COUNT(*) FROM student_answers sa WHERE sa.attempt_id = a.id AND sa.is_correct = 1) AS correct
+    FROM quiz_attempts a
+    JOIN students s ON s.id = a.student_id
+    JOIN quizzes q ON q.id = a.quiz_id
+    WHERE a.status = 'completed';
+
+INSERT INTO student_daily_stats (user_id, stat_date, tasks_completed, study_minutes, quizzes_taken, answers_total, answers_correct)
+SELECT user_id, stat_date, SUM(tasks_completed), SUM(study_minutes), SUM(quizzes_taken), SUM(answers_total), SUM(answers_correct)
+FROM (
+    SELECT user_id, task_date AS stat_date, COUNT(*) AS tasks_completed, SUM(minutes) AS study_minutes,
+           0 AS quizzes_taken, 0 AS answers_total, 0 AS answers_correct
+    FROM completed_tasks WHERE task_date IS NOT NULL GROUP BY user_id, task_date
+    UNION ALL
+    SELECT user_id, stat_date, 0, 0, COUNT(*), SUM(answered), SUM(correct)
+    FROM submitted_quizzes WHERE stat_date IS NOT NULL GROUP BY user_id, stat_date
+) t
+GROUP BY user_id, stat_date
+ON CONFLICT DO NOTHING;
+
+INSERT INTO student_goal_stats (user_id, goal_id, tasks_completed, study_minutes)
+SELECT user_id, goal_id, COUNT(*), SUM(minutes)
+FROM completed_tasks WHERE goal_id IS NOT NULL
+GROUP BY user_id, goal_id
+ON CONFLICT DO NOTHING;
+
+INSERT INTO student_topic_stats (user_id, topic, quizzes_taken, answers_total, answers_correct)
+SELECT user_id, LEFT(topic, 100), COUNT(*), SUM(answered), SUM(correct)
+FROM submitted_quizzes
+GROUP BY user_id, LEFT(topic, 100)
+ON CONFLICT DO NOTHING;
+
+INSERT INTO student_stats (user_id, tasks_completed, study_minutes, quizzes_taken, answers_total, answers_correct)
+SELECT user_id, SUM(tasks_completed), SUM(study_minutes), SUM(quizzes_taken), SUM(answers_total), SUM(answers_correct)
+FROM (
+    SELECT user_id, COUNT(*) AS tasks_completed, SUM(minutes) AS study_minutes,
+           0 AS quizzes_taken, 0 AS answers_total, 0 AS answers_correct
+    FROM completed_tasks GROUP BY user_id
+    UNION ALL
+    SELECT user_id, 0, 0, COUNT(*), SUM(answered), SUM(correct)
+    FROM submitted_quizzes GROUP BY user_id
+) t
+GROUP BY user_id
+ON CONFLICT DO NOTHING;
+
+DROP TABLE completed_tasks;
+DROP TABLE submitted_quizzes;
@@ -0,0 +1,73 @@
+-- Teacher-level quiz rollups behind /api/analytics/teacher.
+-- Kept up to date by teacher_analytics.py when attempts are started and submitted;
+-- the backfill below seeds them from existing attempts and answers.
+
+CREATE TABLE IF NOT EXISTS quiz_stats (
+    quiz_id             INTEGER PRIMARY KEY,
+    teacher_id          INTEGER NOT NULL,
+    attempts_started    INTEGER NOT NULL DEFAULT 0,
+    attempts_completed  INTEGER NOT NULL DEFAULT 0,
+    score_total         INTEGER NOT NULL DEFAULT 0,
+    questions_total     INTEGER NOT NULL DEFAULT 0,
+    timed_attempts      INTEGER NOT NULL DEFAULT 0,
+    time_total_seconds  INTEGER NOT NULL DEFAULT 0,
+    updated_at          TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'utc')
+);
+
+CREATE INDEX IF NOT EXISTS ix_quiz_stats_teacher_id ON quiz_stats (teacher_id);
+
+CREATE TABLE IF NOT EXISTS quiz_score_counts (
+    quiz_id   INTEGER NOT NULL,
+    score     INTEGER NOT NULL,
+    attempts  INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (quiz_id, score)
+);
+
+CREATE TABLE IF NOT EXISTS teacher_topic_daily_stats (
+    teacher_id       INTEGER NOT NULL,
+    topic            VARCHAR(100) NOT NULL,
+    stat_date        DATE NOT NULL,
+    attempts         INTEGER NOT NULL DEFAULT 0,
+    answers_total    INTEGER NOT NULL DEFAULT 0,
+    answers_correct  INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (teacher_id, topic, stat_date)
+);
+
+-- Backfill
+
+INSERT INTO quiz_stats (quiz_id, teacher_id, attempts_started, attempts_completed, score_total,
+                        questions_total, timed_attempts, time_total_seconds)
+SELECT q.id,
+       q.teacher_id,
+       COUNT(a.id),
+       COUNT(*) FILTER (WHERE a.status = 'completed'),
+       COALESCE(SUM(a.score) FILTER (WHERE a.status = 'completed'), 0),
+       COALESCE(SUM(a.total_questions) FILTER (WHERE a.status = 'completed'), 0),
+       COUNT(*) FILTER (WHERE a.status = 'completed' AND a.timestamp >= a.start_time),
+       COALESCE(SUM(EXTRACT(EPOCH FROM (a.timestamp - a.start_time)))
+                FILTER (WHERE a.status = 'completed' AND a.timestamp >= a.start_time), 0)::INTEGER
+FROM quizzes q
+JOIN quiz_attempts a ON a.quiz_id = q.id
+GROUP BY q.id, q.teacher_id
+ON CONFLICT DO NOTHING;
+
+INSERT INTO quiz_score_counts (quiz_id, score, attempts)
+SELECT quiz_id, score, COUNT(*)
+FROM quiz_attempts
+WHERE status = 'completed' AND score IS NOT NULL
+GROUP BY quiz_id, score
+ON CONFLICT DO NOTHING;
+
+INSERT INTO teacher_topic_daily_stats (teacher_id, topic, stat_date, attempts, answers_total, answers_correct)
+SELECT q.teacher_id,
+       LEFT(COALESCE(NULLIF(TRIM(q.topic), ''), 'General'), 100),
+       CAST(a.timestamp AS DATE),
+       COUNT(DISTINCT a.id),
+       COUNT(sa.id),
+       COUNT(sa.id) FILTER (WHERE sa.is_correct = 1)
+FROM quiz_attempts a
+JOIN quizzes q ON q.id = a.quiz_id
+LEFT JOIN student_answers sa ON sa.attempt_id = a.id
+WHERE a.status = 'completed' AND a.timestamp IS NOT NULL
+GROUP BY 1, 2, 3
+ON CONFLICT DO NOTHING;
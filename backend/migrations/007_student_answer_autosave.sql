@@ -0,0 +1,11 @@
+-- Quiz answer autosave (/api/quiz/attempt/{attempt_id}/answers) upserts one row per
+-- (attempt, question). Keep the newest row of any existing duplicates, then enforce it.
+
+DELETE FROM student_answers a
+USING student_answers b
+WHERE a.attempt_id = b.attempt_id
+  AND a.question_id = b.question_id
+  AND a.id < b.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_student_answers_attempt_question
+    ON student_answers (attempt_id, question_id);
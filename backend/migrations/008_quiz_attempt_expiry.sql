@@ -0,0 +1,6 @@
+-- Attempts still open, which the auto-submit scheduler (attempt_scheduler.py)
+-- reloads on startup and periodically to finalize them when time runs out.
+
+CREATE INDEX IF NOT EXISTS ix_quiz_attempts_open
+    ON quiz_attempts (quiz_id)
+    WHERE status <> 'completed';
@@ -0,0 +1,22 @@
+-- Quiz attempt times were written as ISO strings into timestamp columns and
+-- re-parsed per row on every results request. Store them as timestamptz
+-- (existing naive values are UTC) and keep the time taken in its own column,
+-- so results can be computed, ordered and indexed in SQL.
+
+ALTER TABLE quiz_attempts
+    ALTER COLUMN start_time TYPE timestamptz USING start_time AT TIME ZONE 'UTC',
+    ALTER COLUMN "timestamp" TYPE timestamptz USING "timestamp" AT TIME ZONE 'UTC';
+
+ALTER TABLE quizzes
+    ALTER COLUMN deadline TYPE timestamptz USING deadline AT TIME ZONE 'UTC';
+
+ALTER TABLE quiz_attempts ADD COLUMN IF NOT EXISTS duration_seconds integer;
+
+UPDATE quiz_attempts
+SET duration_seconds = EXTRACT(EPOCH FROM ("timestamp" - start_time))::integer
+WHERE duration_seconds IS NULL
+  AND start_time IS NOT NULL
+  AND "timestamp" >= start_time;
+
+CREATE INDEX IF NOT EXISTS ix_quiz_attempts_quiz_submitted
+    ON quiz_attempts (quiz_id, "timestamp");
@@ -0,0 +1,10 @@
+-- Leases for running AI jobs (jobs.py): workers renew heartbeat_at while a job
+-- runs, and jobs whose lease expired (worker crashed or restarted) are queued
+-- again until they have been attempted MAX_JOB_ATTEMPTS times.
+
+ALTER TABLE ai_jobs ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE ai_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP;
+
+CREATE INDEX IF NOT EXISTS ix_ai_jobs_running_heartbeat
+    ON ai_jobs (heartbeat_at)
+    WHERE status = 'running';
@@ -0,0 +1,4 @@
+-- Adaptive attempts (adaptive_quiz.py) serve only part of a quiz; the number of
+-- questions served is kept on the attempt and used as its total when graded.
+
+ALTER TABLE quiz_attempts ADD COLUMN IF NOT EXISTS questions_served INTEGER;
@@ -0,0 +1,21 @@
+-- Delta sync cursor for the study planner (/api/study-planner/tasks/sync).
+-- Task rows and tombstones are stamped with the student's plan_versions.version in the
+-- transaction that changes them, so the cursor follows commit order instead of the
+-- app server's clock. NULL marks a row written but not yet stamped.
+
+ALTER TABLE create_task_ai ADD COLUMN IF NOT EXISTS sync_version INTEGER;
+ALTER TABLE create_task_manual ADD COLUMN IF NOT EXISTS sync_version INTEGER;
+ALTER TABLE task_tombstones ADD COLUMN IF NOT EXISTS sync_version INTEGER;
+ALTER TABLE plan_versions ADD COLUMN IF NOT EXISTS pruned_version INTEGER NOT NULL DEFAULT 0;
+
+-- Existing rows predate every token handed out from now on (old timestamp tokens get a full resync)
+UPDATE create_task_ai SET sync_version = 0 WHERE sync_version IS NULL;
+UPDATE create_task_manual SET sync_version = 0 WHERE sync_version IS NULL;
+UPDATE task_tombstones SET sync_version = 0 WHERE sync_version IS NULL;
+
+DROP INDEX IF EXISTS ix_create_task_ai_student_updated;
+DROP INDEX IF EXISTS ix_create_task_manual_student_updated;
+
+CREATE INDEX IF NOT EXISTS ix_create_task_ai_student_sync ON create_task_ai (student_id, sync_version);
+CREATE INDEX IF NOT EXISTS ix_create_task_manual_student_sync ON create_task_manual (student_id, sync_version);
+CREATE INDEX IF NOT EXISTS ix_task_tombstones_student_sync ON task_tombstones (student_id, sync_version);
@@ -0,0 +1,15 @@
+-- When an attempt runs out of time (the quiz deadline or start_time + duration_minutes,
+-- whichever comes first), stored once when it starts. The auto-submit scheduler and the
+-- autosave endpoint read it instead of recomputing it from the quiz on every request.
+
+ALTER TABLE quiz_attempts ADD COLUMN IF NOT EXISTS expires_at timestamptz;
+
+-- LEAST ignores NULLs: attempts with neither a deadline nor a time limit stay NULL (never expire)
+UPDATE quiz_attempts a
+SET expires_at = LEAST(
+        q.deadline,
+        CASE WHEN q.duration_minutes > 0 THEN a.start_time + q.duration_minutes * INTERVAL '1 minute' END
+    )
+FROM quizzes q
+WHERE q.id = a.quiz_id
+  AND a.expires_at IS NULL;
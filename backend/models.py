@@ -1,8 +1,26 @@
-from sqlalchemy import Column, Integer, String, LargeBinary, ForeignKey, DateTime, Date
-from datetime import datetime
+from sqlalchemy import Column, Integer, String, LargeBinary, ForeignKey, DateTime, Date, Text, Index, text, null
+from sqlalchemy.types import TypeDecorator
+from datetime import datetime, timezone
 from sqlalchemy.orm import relationship
 from database import Base
 
+
+class UTCDateTime(TypeDecorator):
+    """
+    timestamptz that always loads as an aware UTC datetime, so stored quiz
+    times compare directly with datetime.now(timezone.utc) (SQLite returns
+    naive values, which are UTC).
+    """
+    impl = DateTime(timezone=True)
+    cache_ok = True
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc)
+
 # ===================== USERS =====================
 
 class User(Base):
@@ -76,7 +94,7 @@ class Quiz(Base):
     duration_minutes = Column(Integer)
     teacher_id = Column(Integer, ForeignKey("teachers.id"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
-    deadline = Column(DateTime)
+    deadline = Column(UTCDateTime)
     difficulty = Column(String(50))
     topic = Column(String(100))
 
@@ -94,15 +112,26 @@ class QuizAttempt(Base):
     score = Column(Integer)
     total_questions = Column(Integer)
     status = Column(String(50))
-    start_time = Column(DateTime)
-    timestamp = Column(DateTime)
+    start_time = Column(UTCDateTime)
+    timestamp = Column(UTCDateTime)
+    # Quiz deadline or start_time + duration_minutes, whichever is first; set when the attempt starts
+    expires_at = Column(UTCDateTime)
+    duration_seconds = Column(Integer) # timestamp - start_time, set when the attempt is graded
     submission_type = Column(String(50))
     warnings_count = Column(Integer)
     tab_switch_count = Column(Integer)
+    questions_served = Column(Integer) # Adaptive runs only: graded against this instead of the whole quiz
 
     student = relationship("Student", back_populates="quiz_attempts")
     quiz = relationship("Quiz", back_populates="attempts")
 
+    __table_args__ = (
+        # Open attempts, loaded by the auto-submit scheduler
+        Index("ix_quiz_attempts_open", "quiz_id", postgresql_where=text("status <> 'completed'")),
+        # Per-quiz results, newest submission first
+        Index("ix_quiz_attempts_quiz_submitted", "quiz_id", "timestamp"),
+    )
+
 # ===================== QUESTIONS =====================
 
 class Question(Base):
@@ -133,6 +162,11 @@ class StudentAnswer(Base):
     selected_option_id = Column(Integer, ForeignKey("quiz_options.id"), nullable=False)
     is_correct = Column(Integer)
 
+    __table_args__ = (
+        # One saved answer per question; autosave upserts on it
+        Index("ux_student_answers_attempt_question", "attempt_id", "question_id", unique=True),
+    )
+
 # ===================== STUDY GOALS =====================
 
 class StudyGoal(Base):
@@ -165,9 +199,17 @@ class CreateTaskAI(Base):
     sequence_no = Column(Integer, nullable=True)
     task_status = Column(String(50), nullable=False, default="active")
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Delta sync cursor: NULL on every write, stamped with the plan version by task_sync.bump_plan_version
+    sync_version = Column(Integer, nullable=True, onupdate=null())
     # Relationship
     goal = relationship("StudyGoal", back_populates="tasks")
 
+    __table_args__ = (
+        Index("ix_create_task_ai_student_date", "student_id", "task_date"),
+        Index("ix_create_task_ai_student_sync", "student_id", "sync_version"),
+    )
+
 # ===================== MANUAL TASKS =====================
 
 class CreateTaskManual(Base):
@@ -181,3 +223,137 @@ class CreateTaskManual(Base):
     task_time = Column(DateTime, nullable=True)
     status = Column(String(50), nullable=False, default='pending')
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    sync_version = Column(Integer, nullable=True, onupdate=null())
+
+    __table_args__ = (
+        Index("ix_create_task_manual_student_date", "student_id", "task_date"),
+        Index("ix_create_task_manual_student_sync", "student_id", "sync_version"),
+    )
+
+# ===================== TASK TOMBSTONES =====================
+
+class TaskTombstone(Base):
+    __tablename__ = "task_tombstones"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    student_id = Column(Integer, nullable=False)
+    task_type = Column(String(20), nullable=False) # 'ai' or 'manual'
+    task_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    sync_version = Column(Integer, nullable=True)
+
+    __table_args__ = (
+        Index("ix_task_tombstones_student_deleted", "student_id", "deleted_at"),
+        Index("ix_task_tombstones_student_sync", "student_id", "sync_version"),
+    )
+
+# ===================== PLAN VERSIONS =====================
+
+class PlanVersion(Base):
+    __tablename__ = "plan_versions"
+
+    # Bumped on every change to a student's tasks; used as the calendar feed ETag
+    student_id = Column(Integer, primary_key=True, autoincrement=False)
+    version = Column(Integer, nullable=False, default=0)
+    # Highest version among pruned tombstones; older sync tokens need a full resync
+    pruned_version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+# ===================== BACKGROUND JOBS =====================
+
+class AIJob(Base):
+    __tablename__ = "ai_jobs"
+
+    job_id = Column(String(36), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    kind = Column(String(50), nullable=False)
+    status = Column(String(50), nullable=False, default="queued", index=True) # queued, running, completed, failed
+    progress = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=True)
+    payload = Column(Text, nullable=True)  # JSON request
+    result = Column(Text, nullable=True)   # JSON result
+    error = Column(String(500), nullable=True)
+    attempts = Column(Integer, nullable=False, default=0) # runs started, see jobs.MAX_JOB_ATTEMPTS
+    heartbeat_at = Column(DateTime, nullable=True) # lease renewed by the worker while running
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# ===================== STUDENT ANALYTICS =====================
+# Incrementally maintained aggregates (see student_analytics.py), keyed by users.id
+
+class StudentStats(Base):
+    __tablename__ = "student_stats"
+
+    user_id = Column(Integer, primary_key=True, autoincrement=False)
+    tasks_completed = Column(Integer, nullable=False, default=0)
+    study_minutes = Column(Integer, nullable=False, default=0)
+    quizzes_taken = Column(Integer, nullable=False, default=0)
+    answers_total = Column(Integer, nullable=False, default=0)
+    answers_correct = Column(Integer, nullable=False, default=0)
+    current_streak = Column(Integer, nullable=False, default=0)
+    longest_streak = Column(Integer, nullable=False, default=0)
+    last_active_date = Column(Date, nullable=True)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class StudentDailyStats(Base):
+    __tablename__ = "student_daily_stats"
+
+    user_id = Column(Integer, primary_key=True, autoincrement=False)
+    stat_date = Column(Date, primary_key=True)
+    tasks_completed = Column(Integer, nullable=False, default=0)
+    study_minutes = Column(Integer, nullable=False, default=0)
+    quizzes_taken = Column(Integer, nullable=False, default=0)
+    answers_total = Column(Integer, nullable=False, default=0)
+    answers_correct = Column(Integer, nullable=False, default=0)
+
+class StudentGoalStats(Base):
+    __tablename__ = "student_goal_stats"
+
+    user_id = Column(Integer, primary_key=True, autoincrement=False)
+    goal_id = Column(Integer, primary_key=True, autoincrement=False)
+    tasks_completed = Column(Integer, nullable=False, default=0)
+    study_minutes = Column(Integer, nullable=False, default=0)
+
+class StudentTopicStats(Base):
+    __tablename__ = "student_topic_stats"
+
+    user_id = Column(Integer, primary_key=True, autoincrement=False)
+    topic = Column(String(100), primary_key=True)
+    quizzes_taken = Column(Integer, nullable=False, default=0)
+    answers_total = Column(Integer, nullable=False, default=0)
+    answers_correct = Column(Integer, nullable=False, default=0)
+
+# ===================== TEACHER ANALYTICS =====================
+# Per-quiz and per-topic rollups (see teacher_analytics.py), keyed by teachers.id
+
+class QuizStats(Base):
+    __tablename__ = "quiz_stats"
+
+    quiz_id = Column(Integer, primary_key=True, autoincrement=False)
+    teacher_id = Column(Integer, nullable=False, index=True)
+    attempts_started = Column(Integer, nullable=False, default=0)
+    attempts_completed = Column(Integer, nullable=False, default=0)
+    score_total = Column(Integer, nullable=False, default=0)
+    questions_total = Column(Integer, nullable=False, default=0)
+    timed_attempts = Column(Integer, nullable=False, default=0)
+    time_total_seconds = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class QuizScoreCount(Base):
+    # Score histogram: medians without reading the attempts
+    __tablename__ = "quiz_score_counts"
+
+    quiz_id = Column(Integer, primary_key=True, autoincrement=False)
+    score = Column(Integer, primary_key=True, autoincrement=False)
+    attempts = Column(Integer, nullable=False, default=0)
+
+class TeacherTopicDailyStats(Base):
+    __tablename__ = "teacher_topic_daily_stats"
+
+    teacher_id = Column(Integer, primary_key=True, autoincrement=False)
+    topic = Column(String(100), primary_key=True)
+    stat_date = Column(Date, primary_key=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    answers_total = Column(Integer, nullable=False, default=0)
+    answers_correct = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,118 @@
+import heapq
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from plan_engine import topic_titles
+
+# Study time is handed out in blocks of this many minutes
+DEFAULT_BLOCK_MINUTES = 30
+
+# Generated tasks for a day are stacked from this hour, in deadline order
+DAY_START_HOUR = 9
+
+
+def free_blocks_per_day(start: date, days: int, capacity_minutes: int, load_minutes: dict,
+                        block_minutes: int) -> list:
+    """
+    Per-day capacity index: free blocks for each day offset from `start`, after
+    the existing load (manual tasks, other goals' tasks) is taken out.
+    """
+    free = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        minutes = capacity_minutes - load_minutes.get(day, 0)
+        free.append(max(0, minutes // block_minutes))
+    return free
+
+
+def allocate_goals(goals: list, start: date, end: date, capacity_minutes: int,
+                   load_minutes: Optional[dict] = None,
+                   block_minutes: int = DEFAULT_BLOCK_MINUTES) -> dict:
+    """
+    Split each day's free study time between several goals.
+
+    `goals` are dicts with goal_id, deadline (date or None for `end`), and
+    optionally weight and max_minutes_per_day. Returns {goal_id: [(date, minutes)]}.
+
+    Each day's free blocks (from the capacity index) are shared between the
+    goals still before their deadline as a weighted max-min fair split: every
+    block goes to the goal with the least time today per unit of weight, then
+    the least time so far, then the nearest deadline. Goals at their daily cap
+    drop out for the day and their share flows to the others, so no day is
+    ever booked beyond its capacity. A heap keeps each block O(log goals).
+    """
+    load_minutes = load_minutes or {}
+    days = (end - start).days + 1
+    if days <= 0 or not goals:
+        return {goal["goal_id"]: [] for goal in goals}
+
+    free = free_blocks_per_day(start, days, capacity_minutes, load_minutes, block_minutes)
+
+    # 1. Per-goal state, ordered by deadline so expired goals fall off the front
+    state = []
+    for goal in goals:
+        deadline = goal.get("deadline") or end
+        cap = goal.get("max_minutes_per_day")
+        state.append({
+            "goal_id": goal["goal_id"],
+            "last": min((deadline - start).days, days - 1),
+            "weight": goal.get("weight") or 1.0,
+            "day_cap": cap // block_minutes if cap else None,
+            "allocated": 0,
+            "per_day": {},
+        })
+    active = sorted((s for s in state if s["last"] >= 0), key=lambda s: s["last"])
+    first_active = 0
+
+    # 2. Hand out each day's blocks
+    for d in range(days):
+        while first_active < len(active) and active[first_active]["last"] < d:
+            first_active += 1
+        if first_active == len(active):
+            break
+        if not free[d]:
+            continue
+
+        heap = [
+            (0.0, s["allocated"] / s["weight"], s["last"], i)
+            for i, s in enumerate(active[first_active:], start=first_active)
+        ]
+        heapq.heapify(heap)
+        for _ in range(free[d]):
+            if not heap:
+                break
+            _, _, _, i = heapq.heappop(heap)
+            s = active[i]
+            today = s["per_day"].get(d, 0) + 1
+            s["per_day"][d] = today
+            s["allocated"] += 1
+            if s["day_cap"] is None or today < s["day_cap"]:
+                heapq.heappush(heap, (today / s["weight"], s["allocated"] / s["weight"], s["last"], i))
+
+    return {
+        s["goal_id"]: [(start + timedelta(days=d), blocks * block_minutes) for d, blocks in sorted(s["per_day"].items())]
+        for s in state
+    }
+
+
+def build_allocation_rows(goals: list, allocation: dict, student_id: int, start_seq: Optional[dict] = None) -> list:
+    """
+    Turn an allocation into plan rows (plan_engine.PLAN_ROW_COLUMNS order).
+    Each goal gets one task per allocated day; a day's tasks are stacked from
+    DAY_START_HOUR in deadline order so generated tasks never overlap.
+    """
+    start_seq = start_seq or {}
+    order = sorted(goals, key=lambda g: (g.get("deadline") or date.max, g["goal_id"]))
+
+    cursor = {} # Next free start per day
+    rows = []
+    for goal in order:
+        days = allocation.get(goal["goal_id"], [])
+        titles = topic_titles(goal.get("topics") or ["General Study"], len(days))
+        seq = start_seq.get(goal["goal_id"], 1)
+        for (task_date, minutes), title in zip(days, titles):
+            task_time = cursor.get(task_date) or datetime.combine(task_date, datetime.min.time()).replace(hour=DAY_START_HOUR)
+            cursor[task_date] = task_time + timedelta(minutes=minutes)
+            rows.append((goal["goal_id"], student_id, title, task_time, task_date, minutes, seq, "active"))
+            seq += 1
+    return rows
@@ -0,0 +1,238 @@
+import hashlib
+from datetime import date, datetime, timedelta
+from typing import NamedTuple, Optional
+
+from sqlalchemy.orm import Session
+
+# Generation modes shared by /api/study-planner/generate and /api/ai/generate-plan
+REPLACE_MODES = ("create", "full_regenerate", "spaced_repetition")
+PLAN_MODES = REPLACE_MODES + ("extend_only", "keep_existing")
+
+DEFAULT_TASK_HOUR = 9
+
+# Column order of generated plan rows (create_task_ai columns)
+PLAN_ROW_COLUMNS = (
+    "goal_id",
+    "student_id",
+    "title",
+    "task_time",
+    "task_date",
+    "duration_minutes",
+    "sequence_no",
+    "task_status",
+)
+
+
+class PlanState(NamedTuple):
+    """What generation needs to know about a goal's existing AI tasks."""
+    dates: frozenset
+    max_date: Optional[date]
+    max_sequence: int
+
+
+EMPTY_PLAN = PlanState(frozenset(), None, 0)
+
+
+def load_plan_state(db: Session, goal_id: int, student_id: int) -> PlanState:
+    """
+    Existing dates, last date and last sequence number of a goal's AI tasks,
+    from a single grouped query.
+    """
+    # Imported here so the generation functions stay usable without a configured database
+    from sqlalchemy import func
+    from models import CreateTaskAI
+
+    rows = db.query(CreateTaskAI.task_date, func.max(CreateTaskAI.sequence_no)).filter(
+        CreateTaskAI.goal_id == goal_id,
+        CreateTaskAI.student_id == student_id
+    ).group_by(CreateTaskAI.task_date).all()
+
+    dates = frozenset(task_date for task_date, _ in rows if task_date is not None)
+    return PlanState(
+        dates=dates,
+        max_date=max(dates) if dates else None,
+        max_sequence=max((seq or 0 for _, seq in rows), default=0)
+    )
+
+
+def plan_state_from_tasks(tasks: list) -> PlanState:
+    """PlanState from task dicts that were already loaded (task_date, sequence_no)."""
+    dates = frozenset(t["task_date"] for t in tasks if t["task_date"] is not None)
+    return PlanState(
+        dates=dates,
+        max_date=max(dates) if dates else None,
+        max_sequence=max((t["sequence_no"] or 0 for t in tasks), default=0)
+    )
+
+
+def parse_topics(topics: str) -> list:
+    topic_list = [t.strip() for t in (topics or "").split(',') if t.strip()]
+    return topic_list or ["General Study"]
+
+
+def topic_titles(topic_list: list, total_days: int, mode: str = "create", accuracy: Optional[dict] = None) -> list:
+    """
+    Task title for every day offset of the plan. Round-robin over topics, or
+    several topics per day when there are more topics than days; the
+    spaced_repetition mode uses the expanding-interval schedule instead.
+    """
+    if mode == "spaced_repetition":
+        from spaced_repetition import day_title, schedule_topics
+        return [day_title(day) for day in schedule_topics(topic_list, total_days, accuracy)]
+
+    n = len(topic_list)
+    if n <= total_days:
+        return [f"Study {topic_list[i % n]}" for i in range(total_days)]
+
+    titles = []
+    for i in range(total_days):
+        day_topics = topic_list[i * n // total_days:(i + 1) * n // total_days] or [topic_list[i % n]]
+        titles.append(f"Study {' & '.join(day_topics)}")
+    return titles
+
+
+def plan_window(mode: str, start_date: date, end_date: date, state: PlanState = EMPTY_PLAN,
+                today: Optional[date] = None) -> Optional[tuple]:
+    """
+    (start, end) dates to generate, or None when there is nothing to add.
+    extend_only continues the day after the goal's last task (or today).
+    Raises ValueError for an invalid user-supplied range.
+    """
+    if mode == "keep_existing":
+        return None
+
+    if mode == "extend_only":
+        start_date = state.max_date + timedelta(days=1) if state.max_date else (today or date.today())
+        if start_date > end_date:
+            return None
+    elif start_date > end_date:
+        raise ValueError("Start Date must be before End Date")
+
+    return start_date, end_date
+
+
+def build_plan_rows(goal_id: int, student_id: int, topics: str, start_date: date, end_date: date,
+                    hours_per_day: int, mode: str = "create", state: PlanState = EMPTY_PLAN,
+                    accuracy: Optional[dict] = None, today: Optional[date] = None) -> list:
+    """
+    Deterministic plan generation, no database access. Returns rows in
+    PLAN_ROW_COLUMNS order, one task per day.
+
+    Replace modes number from 1 (the caller deletes the old tasks first).
+    extend_only skips dates that already have tasks and continues the goal's
+    sequence numbers.
+    """
+    if mode not in PLAN_MODES:
+        raise ValueError(f"Unknown mode '{mode}'")
+
+    window = plan_window(mode, start_date, end_date, state, today)
+    if window is None:
+        return []
+    start_dt, end_dt = window
+
+    total_days = (end_dt - start_dt).days + 1
+    titles = topic_titles(parse_topics(topics), total_days, mode, accuracy)
+
+    extending = mode == "extend_only"
+    skip = state.dates if extending else frozenset()
+    seq = state.max_sequence + 1 if extending else 1
+    duration_minutes = hours_per_day * 60
+    base_time = datetime.combine(start_dt, datetime.min.time()).replace(hour=DEFAULT_TASK_HOUR)
+
+    rows = []
+    for i in range(total_days):
+        current_date = start_dt + timedelta(days=i)
+        if current_date in skip:
+            continue
+        rows.append((
+            goal_id,
+            student_id,
+            titles[i],
+            base_time + timedelta(days=i),
+            current_date,
+            duration_minutes,
+            seq,
+            "active"
+        ))
+        seq += 1
+    return rows
+
+
+# Row positions (PLAN_ROW_COLUMNS) compared when diffing a regenerated plan
+DIFF_FIELDS = tuple(
+    (field, PLAN_ROW_COLUMNS.index(field)) for field in ("title", "task_time", "task_date", "duration_minutes")
+)
+SEQUENCE_INDEX = PLAN_ROW_COLUMNS.index("sequence_no")
+
+
+def insert_plan_rows(db: Session, plan_rows: list) -> list:
+    """
+    Persist generated plan rows with one bulk INSERT ... RETURNING and map the
+    returned rows straight to task dicts in the StudyTaskResponse shape (no
+    per-object flush or refresh). Does not commit.
+    """
+    if not plan_rows:
+        return []
+
+    from sqlalchemy import insert
+    from models import CreateTaskAI
+
+    stmt = insert(CreateTaskAI).returning(
+        CreateTaskAI.task_id,
+        CreateTaskAI.goal_id,
+        CreateTaskAI.title,
+        CreateTaskAI.task_date,
+        CreateTaskAI.task_time,
+        CreateTaskAI.duration_minutes,
+        CreateTaskAI.sequence_no,
+        CreateTaskAI.task_status,
+        sort_by_parameter_order=True
+    )
+    result = db.execute(stmt, [dict(zip(PLAN_ROW_COLUMNS, row)) for row in plan_rows])
+
+    return [{**row._mapping, "is_manual": False, "task_type": "ai"} for row in result]
+
+
+def diff_plan(existing: list, new_rows: list) -> dict:
+    """
+    Compare a goal's current AI tasks (dicts with task_id, sequence_no and the
+    DIFF_FIELDS) with freshly generated rows, matching them by sequence number.
+
+    Returns {"added": [rows], "removed": [task dicts], "moved": [(task dict, {field: new})],
+    "unchanged": count}. Applying it touches only rows that actually change, and
+    matched tasks keep their id and status.
+    """
+    by_seq = {}
+    removed = []
+    for task in existing:
+        seq = task["sequence_no"]
+        if seq is None or seq in by_seq:
+            removed.append(task)
+        else:
+            by_seq[seq] = task
+
+    added, moved = [], []
+    unchanged = 0
+    for row in new_rows:
+        task = by_seq.pop(row[SEQUENCE_INDEX], None)
+        if task is None:
+            added.append(row)
+            continue
+        changes = {field: row[i] for field, i in DIFF_FIELDS if task[field] != row[i]}
+        if changes:
+            moved.append((task, changes))
+        else:
+            unchanged += 1
+
+    removed.extend(by_seq.values())
+    return {"added": added, "removed": removed, "moved": moved, "unchanged": unchanged}
+
+
+def plan_fingerprint(existing: list) -> str:
+    """
+    Short token identifying the exact state a diff was computed against.
+    """
+    digest = hashlib.sha256()
+    for task in sorted(existing, key=lambda t: t["task_id"]):
+        digest.update(repr((task["task_id"], task["sequence_no"]) + tuple(task[f] for f, _ in DIFF_FIELDS)).encode())
+    return digest.hexdigest()[:20]
@@ -0,0 +1,188 @@
+import csv
+import io
+import zlib
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import Option, Question, QuizAttempt, Student, StudentAnswer, User
+
+EXPORT_KINDS = ("attempts", "answers")
+EXPORT_FORMATS = ("csv", "parquet")
+
+# Rows fetched per server-side cursor batch, and per CSV chunk / Parquet row group
+EXPORT_BATCH_ROWS = 1000
+
+# (column, Parquet type)
+ATTEMPT_COLUMNS = (
+    ("attempt_id", "int64"), ("student_name", "string"), ("student_email", "string"),
+    ("status", "string"), ("score", "int64"), ("total_questions", "int64"), ("percentage", "float64"),
+    ("start_time", "timestamp"), ("submitted_at", "timestamp"), ("time_taken_seconds", "int64"),
+    ("submission_type", "string"), ("warnings_count", "int64"), ("tab_switch_count", "int64"),
+)
+ANSWER_COLUMNS = (
+    ("attempt_id", "int64"), ("student_email", "string"), ("question_id", "int64"),
+    ("question_text", "string"), ("selected_option_id", "int64"), ("selected_option_text", "string"),
+    ("is_correct", "bool"),
+)
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _attempt_rows(db: Session, quiz_id: int):
+    result = db.execute(
+        select(
+            QuizAttempt.id, Student.full_name, User.full_name.label("user_name"), User.email,
+            QuizAttempt.status, QuizAttempt.score, QuizAttempt.total_questions, QuizAttempt.start_time,
+            QuizAttempt.timestamp, QuizAttempt.duration_seconds, QuizAttempt.submission_type, QuizAttempt.warnings_count,
+            QuizAttempt.tab_switch_count
+        )
+        .join(Student, QuizAttempt.student_id == Student.id)
+        .join(User, Student.user_id == User.id)
+        .where(QuizAttempt.quiz_id == quiz_id)
+        .order_by(QuizAttempt.id)
+        .execution_options(yield_per=EXPORT_BATCH_ROWS)
+    )
+    for row in result:
+        yield (
+            row.id,
+            row.full_name or row.user_name,
+            row.email,
+            row.status,
+            row.score,
+            row.total_questions,
+            round(row.score / row.total_questions * 100, 1) if row.score is not None and row.total_questions else None,
+            row.start_time,
+            row.timestamp,
+            row.duration_seconds,
+            row.submission_type or "manual",
+            row.warnings_count,
+            row.tab_switch_count,
+        )
+
+
+def _answer_rows(db: Session, quiz_id: int):
+    result = db.execute(
+        select(
+            StudentAnswer.attempt_id, User.email, StudentAnswer.question_id, Question.text,
+            StudentAnswer.selected_option_id, Option.text.label("option_text"), StudentAnswer.is_correct
+        )
+        .join(QuizAttempt, StudentAnswer.attempt_id == QuizAttempt.id)
+        .join(Student, QuizAttempt.student_id == Student.id)
+        .join(User, Student.user_id == User.id)
+        .join(Question, StudentAnswer.question_id == Question.id)
+        .outerjoin(Option, StudentAnswer.selected_option_id == Option.id)
+        .where(QuizAttempt.quiz_id == quiz_id)
+        .order_by(StudentAnswer.attempt_id, StudentAnswer.question_id)
+        .execution_options(yield_per=EXPORT_BATCH_ROWS)
+    )
+    for row in result:
+        yield (
+            row.attempt_id, row.email, row.question_id, row.text, row.selected_option_id,
+            row.option_text, bool(row.is_correct) if row.is_correct is not None else None,
+        )
+
+
+def _batches(rows, size: int = EXPORT_BATCH_ROWS):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _csv_chunks(columns: tuple, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(name for name, _ in columns)
+    for batch in _batches(rows):
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands out what was written since the last drain."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _parquet_chunks(columns: tuple, rows, compression: str):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {"int64": pa.int64(), "float64": pa.float64(), "string": pa.string(),
+             "bool": pa.bool_(), "timestamp": pa.timestamp("us", tz="UTC")}
+    schema = pa.schema([(name, types[type_name]) for name, type_name in columns])
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression=compression)
+    try:
+        # One row group per batch, handed out as soon as it is written
+        for batch in _batches(rows):
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(zip(*batch), schema)],
+                schema=schema
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_quiz_export(db: Session, quiz_id: int, kind: str, fmt: str, gzip: bool = False):
+    """
+    Yield an export of a quiz's attempts or answers as bytes, reading rows
+    through a server-side cursor in batches so memory stays flat however
+    large the cohort is. CSV is gzipped on the fly when asked; Parquet
+    compresses its column chunks with gzip (or snappy) instead.
+    """
+    columns, rows = (
+        (ATTEMPT_COLUMNS, _attempt_rows(db, quiz_id)) if kind == "attempts"
+        else (ANSWER_COLUMNS, _answer_rows(db, quiz_id))
+    )
+    if fmt == "parquet":
+        yield from _parquet_chunks(columns, rows, "gzip" if gzip else "snappy")
+    elif gzip:
+        yield from _gzip(_csv_chunks(columns, rows))
+    else:
+        yield from _csv_chunks(columns, rows)
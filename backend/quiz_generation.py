@@ -0,0 +1,350 @@
+import json
+import re
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from difflib import SequenceMatcher
+
+from quiz_schemas import QuestionCreate
+
+# Large quizzes are split into chunks that are generated concurrently.
+# Small chunks keep each model response short, which is both faster and far
+# less likely to come back as malformed JSON.
+CHUNK_SIZE = 10
+MAX_PARALLEL_CHUNKS = 4
+MAX_CHUNK_RETRIES = 2
+
+# Top-up requests after deduplication, per chunk of the quiz
+MAX_TOPUP_REQUESTS_PER_CHUNK = 2
+
+# Questions whose word sequences are at least this similar are treated as duplicates.
+# Compared word-by-word so "binary search" vs "linear search" stays distinct.
+DUPLICATE_SIMILARITY = 0.9
+
+
+def build_quiz_prompt(subject: str, topic: str, difficulty: str, count: int, part: int = 1, parts: int = 1, exclude: Optional[list] = None) -> str:
+    # When a quiz is split, nudge every part towards a different slice of the topic
+    # so that merged chunks overlap as little as possible.
+    part_hint = ""
+    if parts > 1:
+        part_hint = f"""
+    This is question set {part} of {parts} for the same quiz. Focus on aspects of the topic
+    that the other sets are unlikely to cover, and avoid generic introductory questions.
+    """
+
+    # Repair passes only ask for the missing questions, so tell the model what it already gave us
+    exclude_hint = ""
+    if exclude:
+        listed = "\n".join(f"    - {text}" for text in exclude)
+        exclude_hint = f"""
+    Do not repeat any of these questions:
+{listed}
+    """
+
+    return f"""
+    Generate a quiz for the following parameters:
+    Subject: {subject}
+    Topic: {topic}
+    Difficulty: {difficulty}
+    Number of Questions: {count}
+    {part_hint}{exclude_hint}
+    Provide the response strictly in valid JSON format with the following structure:
+    {{
+        "title": "A creative, short, professional title (e.g., 'Routing Protocols Fundamentals' instead of 'Routing Quiz')",
+        "description": "A brief, professional description of what the quiz covers (1-2 sentences).",
+        "questions": [
+            {{
+                "text": "Question text here?",
+                "options": [
+                    {{"text": "Option A", "is_correct": false}},
+                    {{"text": "Option B", "is_correct": true}},
+                    {{"text": "Option C", "is_correct": false}},
+                    {{"text": "Option D", "is_correct": false}}
+                ]
+            }}
+        ]
+    }}
+    Ensure there are exactly 4 options per question and exactly one correct answer.
+    No markdown code blocks, just raw JSON.
+    """
+
+
+class QuizStreamParser:
+    """
+    Tolerant, incremental parser for streamed quiz JSON.
+
+    Text is fed in as it arrives and every complete question object is returned
+    as soon as its closing brace is seen, so a truncated response, markdown
+    fences or stray prose only cost the questions they actually break.
+    """
+
+    _TITLE_RE = re.compile(r'"title"\s*:\s*"((?:[^"\\]|\\.)*)"')
+    _DESCRIPTION_RE = re.compile(r'"description"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._started = False
+        self._in_string = False
+        self._escape = False
+        self._open_objects = []  # buffer offsets of currently open '{'
+
+    def feed(self, text: str) -> list:
+        """
+        Consume the next piece of the response and return newly completed question dicts.
+        """
+        self._buffer += text
+        buf = self._buffer
+        completed = []
+
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+
+            # Ignore any prose the model puts before the JSON starts
+            if not self._started:
+                if ch != "{":
+                    continue
+                self._started = True
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._open_objects.append(i)
+            elif ch == "}" and self._open_objects:
+                start = self._open_objects.pop()
+                try:
+                    obj = json.loads(buf[start:i + 1])
+                except ValueError:
+                    continue
+                # Question objects are the only ones carrying an options list
+                if isinstance(obj, dict) and "options" in obj:
+                    completed.append(obj)
+
+        self._pos = len(buf)
+        return completed
+
+    def _header_field(self, pattern) -> Optional[str]:
+        # Only look ahead of the questions array so question text can't be picked up
+        header = self._buffer.split('"questions"', 1)[0]
+        match = pattern.search(header)
+        if not match:
+            return None
+        try:
+            return json.loads(f'"{match.group(1)}"')
+        except ValueError:
+            return match.group(1)
+
+    @property
+    def title(self) -> Optional[str]:
+        return self._header_field(self._TITLE_RE)
+
+    @property
+    def description(self) -> Optional[str]:
+        return self._header_field(self._DESCRIPTION_RE)
+
+
+def validate_question(obj: dict) -> Optional[dict]:
+    """
+    Validate a parsed question against QuestionCreate.
+    Returns the normalized question, or None if it must be discarded.
+    """
+    try:
+        question = QuestionCreate.model_validate(obj)
+    except ValueError:
+        return None
+
+    if not question.text.strip():
+        return None
+    if len(question.options) != 4:
+        return None
+    if sum(1 for opt in question.options if opt.is_correct) != 1:
+        return None
+
+    return question.model_dump()
+
+
+def split_into_chunks(count: int, chunk_size: int = CHUNK_SIZE) -> list:
+    """
+    Split a question count into chunk sizes, e.g. 25 -> [10, 10, 5].
+    """
+    sizes = [chunk_size] * (count // chunk_size)
+    if count % chunk_size:
+        sizes.append(count % chunk_size)
+    return sizes
+
+
+def _normalize_question_text(text: str) -> tuple:
+    text = re.sub(r"[^a-z0-9 ]", " ", (text or "").lower())
+    return tuple(text.split())
+
+
+def _is_similar(a: tuple, b: tuple, threshold: float) -> bool:
+    matcher = SequenceMatcher(None, a, b)
+    # Cheap upper bounds first; ratio() is the expensive one
+    return (
+        matcher.real_quick_ratio() >= threshold
+        and matcher.quick_ratio() >= threshold
+        and matcher.ratio() >= threshold
+    )
+
+
+def dedupe_questions(questions: list, threshold: float = DUPLICATE_SIMILARITY) -> list:
+    """
+    Drop questions whose text is a near-duplicate of an earlier question.
+    Order is preserved, so earlier chunks win.
+    """
+    kept = []
+    kept_texts = []
+    seen_exact = set()
+
+    for question in questions:
+        norm = _normalize_question_text(question.get("text", ""))
+        if not norm or norm in seen_exact:
+            continue
+        if any(_is_similar(norm, other, threshold) for other in kept_texts):
+            continue
+
+        seen_exact.add(norm)
+        kept_texts.append(norm)
+        kept.append(question)
+
+    return kept
+
+
+class IncompleteQuizError(RuntimeError):
+    """The model could not produce enough distinct valid questions."""
+
+
+def _stream_chunk(model, prompt: str):
+    """
+    Stream one chunk and keep every valid question that arrived, even if the
+    stream breaks part way. Returns (data, error).
+    """
+    parser = QuizStreamParser()
+    questions = []
+    error = None
+
+    try:
+        for part in model.generate_content(prompt, stream=True):
+            for obj in parser.feed(part.text):
+                question = validate_question(obj)
+                if question:
+                    questions.append(question)
+    except Exception as e:
+        error = e
+
+    data = {
+        "title": parser.title,
+        "description": parser.description,
+        "questions": questions
+    }
+    return data, error
+
+
+def generate_quiz(model, subject: str, topic: str, difficulty: str, count: int, progress=None) -> dict:
+    """
+    Generate a quiz of `count` questions by fanning chunks out in parallel.
+
+    Every chunk is streamed and parsed incrementally. Chunks that come back
+    short (API error, truncation, invalid questions) are topped up with a repair
+    request for only the missing questions, up to MAX_CHUNK_RETRIES times.
+    Questions dropped as duplicates after merging are topped up until the quiz
+    is full, within MAX_TOPUP_REQUESTS_PER_CHUNK requests per chunk; a quiz
+    that is still short raises IncompleteQuizError rather than being returned.
+
+    `progress(done, total)` is called as chunks finish, for background jobs.
+    """
+    sizes = split_into_chunks(count)
+    parts = len(sizes)
+
+    collected = {idx: [] for idx in range(parts)}
+    headers = {}
+    last_error = None
+
+    for attempt in range(MAX_CHUNK_RETRIES + 1):
+        pending = [idx for idx in range(parts) if len(collected[idx]) < sizes[idx]]
+        if not pending:
+            break
+
+        with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_CHUNKS, len(pending))) as pool:
+            futures = {
+                pool.submit(
+                    _stream_chunk,
+                    model,
+                    build_quiz_prompt(
+                        subject, topic, difficulty,
+                        sizes[idx] - len(collected[idx]),
+                        part=idx + 1,
+                        parts=parts,
+                        exclude=[q["text"] for q in collected[idx]]
+                    )
+                ): idx
+                for idx in pending
+            }
+            for future in as_completed(futures):
+                idx = futures[future]
+                data, error = future.result()
+                collected[idx].extend(data["questions"])
+                if data["title"] and idx not in headers:
+                    headers[idx] = data
+
+                missing = sizes[idx] - len(collected[idx])
+                if error or missing > 0:
+                    last_error = error or last_error
+                    print(f"[WARN] Quiz chunk {idx + 1}/{parts} short by {max(missing, 0)} (attempt {attempt + 1}): {error}")
+
+                if progress:
+                    done = sum(min(len(collected[i]), sizes[i]) for i in range(parts))
+                    progress(done, count)
+
+    # Merge in chunk order so earlier chunks win duplicates
+    merged_questions = []
+    for idx in range(parts):
+        merged_questions.extend(collected[idx])
+
+    questions = dedupe_questions(merged_questions)[:count]
+
+    # Duplicates across chunks leave the quiz short; top it up, excluding what survived
+    budget = MAX_TOPUP_REQUESTS_PER_CHUNK * parts
+    attempt = 0
+    while len(questions) < count and attempt < budget:
+        attempt += 1
+        missing = count - len(questions)
+        data, error = _stream_chunk(
+            model,
+            build_quiz_prompt(
+                subject, topic, difficulty, min(missing, CHUNK_SIZE),
+                exclude=[q["text"] for q in questions]
+            )
+        )
+        if error:
+            last_error = error
+            print(f"[WARN] Quiz top-up short by {missing} (attempt {attempt}/{budget}): {error}")
+        questions = dedupe_questions(questions + data["questions"])[:count]
+        if progress:
+            progress(len(questions), count)
+
+    if not questions:
+        # Surface the underlying failure (e.g. rate limiting) rather than a generic error
+        if last_error:
+            raise last_error
+        raise RuntimeError("No valid questions generated")
+
+    if len(questions) < count:
+        raise IncompleteQuizError(f"Only {len(questions)} of {count} distinct questions could be generated")
+
+    header = headers[min(headers)] if headers else {}
+
+    return {
+        "title": header.get("title") or f"{topic} Quiz",
+        "description": header.get("description") or "",
+        "questions": questions
+    }
@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from adaptive_quiz import adaptive_engine
+from models import Option, Question, Quiz, QuizAttempt, StudentAnswer
+from student_analytics import record_quiz_submission
+from teacher_analytics import elapsed_seconds, record_attempt_completed
+from write_buffer import answer_buffer, warning_buffer
+
+
+def is_past(moment: Optional[datetime], now: Optional[datetime] = None) -> bool:
+    """Whether a stored quiz time (aware UTC, see models.UTCDateTime) has passed."""
+    return moment is not None and (now or datetime.now(timezone.utc)) > moment
+
+
+def attempt_expires_at(start_time: Optional[datetime], duration_minutes: Optional[int],
+                       deadline: Optional[datetime]) -> Optional[datetime]:
+    """
+    When an attempt runs out of time: the earlier of the quiz deadline and
+    start_time + duration_minutes, or None if neither applies. Computed once
+    when the attempt starts and stored as QuizAttempt.expires_at.
+    """
+    candidates = []
+    if deadline is not None:
+        candidates.append(deadline)
+    if start_time is not None and duration_minutes:
+        candidates.append(start_time + timedelta(minutes=duration_minutes))
+    return min(candidates) if candidates else None
+
+
+def format_duration(seconds: Optional[int]) -> str:
+    """Time taken as shown in results, e.g. "4m 12s"."""
+    if seconds is None:
+        return "—"
+    minutes, seconds = divmod(seconds, 60)
+    return f"{minutes}m {seconds}s" if minutes > 0 else f"{seconds}s"
+
+
+def grade_attempt(db: Session, attempt: QuizAttempt, quiz: Optional[Quiz], user_id: int,
+                  submitted_answers: list = (), submission_type: str = "manual",
+                  tab_switch_count: Optional[int] = None, finished_at: Optional[datetime] = None,
+                  taken_rows: Optional[list] = None) -> Optional[dict]:
+    """
+    Finalize an attempt from its saved answers plus `submitted_answers`
+    (objects with question_id / selected_option_id, overriding saved ones).
+    Shared by /submit and the expiry scheduler.
+
+    The attempt is claimed with a conditional UPDATE first, so a submit and
+    the scheduler racing on the same attempt grade it once; returns None for
+    the loser. Does not commit: buffered answers and warnings moved into the
+    transaction are appended to `taken_rows`, for write_buffer.restore_rows()
+    if the caller rolls back.
+    """
+    # 1. Claim (new attempts need an id first)
+    db.flush()
+    claimed = db.execute(
+        update(QuizAttempt)
+        .where(QuizAttempt.id == attempt.id, QuizAttempt.status != "completed")
+        .values(status="completed")
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not claimed:
+        return None
+
+    # 2. Autosaved answers, overridden by the submitted ones
+    answer_buffer.flush(db, match=lambda key: key[0] == attempt.id, taken_rows=taken_rows)
+    warning_buffer.flush(db, match=lambda key: key[0] == attempt.id, taken_rows=taken_rows)
+    final_answers = dict(
+        db.query(StudentAnswer.question_id, StudentAnswer.selected_option_id)
+        .filter(StudentAnswer.attempt_id == attempt.id).all()
+    )
+    submitted = [answer for answer in submitted_answers if answer.selected_option_id]
+    for answer in submitted:
+        final_answers[answer.question_id] = answer.selected_option_id
+
+    # 3. Score
+    options_map = {}
+    if final_answers:
+        options_map = {
+            opt.id: opt for opt in db.query(Option).filter(Option.id.in_(list(final_answers.values()))).all()
+        }
+    score = sum(1 for option_id in final_answers.values() if options_map.get(option_id) and options_map[option_id].is_correct)
+    if attempt.questions_served:
+        # Adaptive run: only the questions it served count
+        total_questions = max(attempt.questions_served, len(final_answers))
+    else:
+        total_questions = db.query(Question).filter(Question.quiz_id == attempt.quiz_id).count()
+
+    attempt.score = score
+    attempt.total_questions = total_questions
+    attempt.status = "completed"
+    attempt.timestamp = finished_at or datetime.now(timezone.utc)
+    attempt.duration_seconds = elapsed_seconds(attempt.start_time, attempt.timestamp)
+    attempt.submission_type = submission_type
+    if tab_switch_count is not None:
+        attempt.tab_switch_count = tab_switch_count
+
+    # 4. Store the submitted answers (autosaved ones are already there)
+    answer_rows = []
+    for answer in submitted:
+        option = options_map.get(answer.selected_option_id)
+        answer_rows.append({
+            "attempt_id": attempt.id,
+            "question_id": answer.question_id,
+            "selected_option_id": answer.selected_option_id,
+            "is_correct": 1 if (option and option.is_correct) else 0
+        })
+    answer_buffer.write(db, answer_rows)
+    # Autosaves that raced the submit must not change a finished attempt
+    answer_buffer.discard(lambda key: key[0] == attempt.id, taken_rows)
+
+    adaptive_engine.end_session(attempt.student_id, attempt.quiz_id)
+
+    # 5. Progress aggregates for the student and teacher dashboards
+    answered_count = len(final_answers)
+    record_quiz_submission(db, user_id, quiz.topic if quiz else None, answered_count, score)
+    if quiz:
+        record_attempt_completed(
+            db, quiz, score, total_questions,
+            attempt.duration_seconds, answered_count, score
+        )
+
+    return {"score": score, "total_questions": total_questions, "answered": answered_count}
@@ -0,0 +1,13 @@
+from typing import List
+
+from pydantic import BaseModel
+
+
+# Question payloads shared by the quiz API and AI quiz generation
+class OptionCreate(BaseModel):
+    text: str
+    is_correct: bool
+
+class QuestionCreate(BaseModel):
+    text: str
+    options: List[OptionCreate]
@@ -0,0 +1,297 @@
+import copy
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Lower value = served first when callers are queued
+PRIORITY_GENERATION = 0  # Teachers generating quizzes
+PRIORITY_CHAT = 1        # Doubt solver chat
+
+PRIORITY_NAMES = {
+    PRIORITY_GENERATION: "generation",
+    PRIORITY_CHAT: "chat",
+}
+
+# Per-user (and per-role) buckets kept in memory; least recently used ones go first
+MAX_BUCKETS = 10000
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"LLM rate limit exceeded ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` tokens per second, holding at most `capacity`.
+    Not thread-safe on its own; LLMGovernor guards every bucket with its lock.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        """True once the bucket has refilled, i.e. it is no different from a new one."""
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class LLMGovernor:
+    """
+    Shared limiter for every outbound LLM call in this process.
+
+    - Per-user buckets are charged once per request (check_user): a user over
+      their own limit is rejected immediately instead of occupying the queue.
+    - Per-role and global buckets plus a concurrency cap are charged per model
+      call (acquire/slot), so callers wait in a bounded priority queue (teacher
+      generation before chat, FIFO within a priority) for up to `max_wait` seconds.
+    """
+
+    def __init__(
+        self,
+        global_rpm: float,
+        role_rpm: dict,
+        user_rpm: float,
+        max_concurrent: int,
+        max_queue: int,
+        max_wait: float,
+    ):
+        self.global_bucket = TokenBucket(global_rpm / 60, max(1, global_rpm / 6))
+        self.role_rpm = role_rpm
+        self.user_rpm = user_rpm
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+
+        self._role_buckets = OrderedDict()
+        self._user_buckets = OrderedDict()
+        self._waiters = []
+        self._counter = itertools.count()
+        self._active = 0
+        self._cond = threading.Condition()
+
+        self._metrics = {
+            name: {"admitted": 0, "rejected": {}, "wait_total": 0.0, "wait_max": 0.0}
+            for name in PRIORITY_NAMES.values()
+        }
+
+    @staticmethod
+    def _bucket(buckets: OrderedDict, key, rate: float, capacity: float) -> TokenBucket:
+        """
+        Bucket for `key`, created on first use. Buckets are kept in LRU order:
+        idle ones that have refilled are dropped (a new bucket starts full, so
+        nothing is lost), and the least recently used beyond MAX_BUCKETS.
+        """
+        bucket = buckets.get(key)
+        if bucket is not None:
+            buckets.move_to_end(key)
+            return bucket
+
+        now = time.monotonic()
+        while buckets:
+            oldest_key, oldest = next(iter(buckets.items()))
+            if len(buckets) < MAX_BUCKETS and not oldest.is_full(now):
+                break
+            del buckets[oldest_key]
+        bucket = buckets[key] = TokenBucket(rate, capacity)
+        return bucket
+
+    def _role_bucket(self, role: str) -> TokenBucket:
+        rpm = self.role_rpm.get(role, self.role_rpm.get("default", 30))
+        return self._bucket(self._role_buckets, role, rpm / 60, max(1, rpm / 6))
+
+    def _user_bucket(self, user_id) -> TokenBucket:
+        return self._bucket(self._user_buckets, user_id, self.user_rpm / 60, max(1, self.user_rpm / 3))
+
+    def _reject(self, priority: int, reason: str, retry_after: float):
+        rejected = self._metrics[PRIORITY_NAMES[priority]]["rejected"]
+        rejected[reason] = rejected.get(reason, 0) + 1
+        raise RateLimitExceeded(reason, retry_after)
+
+    def check_user(self, user_id, priority: int):
+        """
+        Charge one request against the user's own bucket, rejecting immediately
+        if they are over it. Called once per API request, not per model call.
+        """
+        with self._cond:
+            bucket = self._user_bucket(user_id)
+            delay = bucket.delay(time.monotonic())
+            if delay > 0:
+                self._reject(priority, "user_limit", delay)
+            bucket.take()
+
+    def acquire(self, role: str, priority: int):
+        start = time.monotonic()
+        deadline = start + self.max_wait
+
+        with self._cond:
+            if len(self._waiters) >= self.max_queue:
+                self._reject(priority, "queue_full", 1.0)
+
+            role_bucket = self._role_bucket(role)
+            entry = (priority, next(self._counter))
+            heapq.heappush(self._waiters, entry)
+
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait_for = deadline - now
+
+                    if self._waiters[0] == entry and self._active < self.max_concurrent:
+                        shared_delay = max(role_bucket.delay(now), self.global_bucket.delay(now))
+                        if shared_delay == 0:
+                            role_bucket.take()
+                            self.global_bucket.take()
+                            heapq.heappop(self._waiters)
+                            self._active += 1
+                            break
+                        wait_for = min(wait_for, shared_delay)
+
+                    if now >= deadline:
+                        self._reject(priority, "timeout", 1.0)
+
+                    self._cond.wait(wait_for)
+            finally:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+            waited = time.monotonic() - start
+            stats = self._metrics[PRIORITY_NAMES[priority]]
+            stats["admitted"] += 1
+            stats["wait_total"] += waited
+            stats["wait_max"] = max(stats["wait_max"], waited)
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, role: str, priority: int):
+        self.acquire(role, priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            by_priority = {}
+            for name, stats in self._metrics.items():
+                admitted = stats["admitted"]
+                by_priority[name] = {
+                    "admitted": admitted,
+                    "rejected": dict(stats["rejected"]),
+                    "avg_wait_seconds": round(stats["wait_total"] / admitted, 4) if admitted else 0.0,
+                    "max_wait_seconds": round(stats["wait_max"], 4),
+                }
+            return {
+                "active": self._active,
+                "queued": len(self._waiters),
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "by_priority": by_priority,
+            }
+
+
+class GovernedModel:
+    """
+    Wraps a generative model so every generate_content call (streamed or not)
+    and every chat message holds a governor slot for its whole duration.
+    Use govern() to wrap a provider; it only governs remote backends.
+    """
+
+    def __init__(self, model, role: str, priority: int, governor: LLMGovernor = None):
+        self._model = model
+        self._role = role
+        self._priority = priority
+        self._governor = governor or llm_governor
+
+    def __getattr__(self, name):
+        # name, available(), rate_limited, ... of the wrapped provider
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._model, name)
+
+    def generate_content(self, prompt, stream: bool = False, **kwargs):
+        if stream:
+            return self._stream(prompt, **kwargs)
+        with self._governor.slot(self._role, self._priority):
+            return self._model.generate_content(prompt, **kwargs)
+
+    def _stream(self, prompt, **kwargs):
+        with self._governor.slot(self._role, self._priority):
+            yield from self._model.generate_content(prompt, stream=True, **kwargs)
+
+    def start_chat(self, history=None):
+        return _GovernedChat(self._model.start_chat(history=history), self)
+
+
+class _GovernedChat:
+    def __init__(self, chat, governed: GovernedModel):
+        self._chat = chat
+        self._governed = governed
+
+    def send_message(self, message: str):
+        with self._governed._governor.slot(self._governed._role, self._governed._priority):
+            return self._chat.send_message(message)
+
+
+def govern(model, role: str, priority: int, governor: LLMGovernor = None):
+    """
+    Put the governor in front of `model`'s remote calls only. Local backends
+    (template engine, llama.cpp) have no quota and are returned as they are;
+    for a routed provider only its remote side is wrapped.
+    """
+    remote = getattr(model, "remote", None)
+    if remote is not None:
+        routed = copy.copy(model)
+        routed.remote = govern(remote, role, priority, governor)
+        return routed
+    if not getattr(model, "rate_limited", False):
+        return model
+    return GovernedModel(model, role, priority, governor)
+
+
+# Process-wide governor shared by chat and quiz generation
+llm_governor = LLMGovernor(
+    global_rpm=_env_float("LLM_GLOBAL_RPM", 60),
+    role_rpm={
+        "teacher": _env_float("LLM_TEACHER_RPM", 40),
+        "student": _env_float("LLM_STUDENT_RPM", 30),
+        "default": _env_float("LLM_DEFAULT_RPM", 20),
+    },
+    user_rpm=_env_float("LLM_USER_RPM", 10),
+    max_concurrent=int(_env_float("LLM_MAX_CONCURRENT", 8)),
+    max_queue=int(_env_float("LLM_MAX_QUEUE", 50)),
+    max_wait=_env_float("LLM_MAX_WAIT_SECONDS", 20),
+)
@@ -0,0 +1,350 @@
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+# Scheduling works on a grid of 15-minute blocks (96 per day)
+BLOCK_MINUTES = 15
+BLOCKS_PER_DAY = 24 * 60 // BLOCK_MINUTES
+
+# Minutes assumed for tasks that have no duration (manual tasks)
+DEFAULT_TASK_MINUTES = 60
+
+# Relocation passes of the local search per day
+LOCAL_SEARCH_PASSES = 3
+
+# Same windows as frontend/src/utils/energyPlanner.ts getEnergySlots()
+ENERGY_SLOTS = {
+    "morning": [(6, 10, "peak"), (16, 21, "low")],
+    "afternoon": [(12, 16, "peak"), (8, 11, "low")],
+    "night": [(19, 23, "peak"), (13, 17, "low")],
+    "none": [],
+}
+
+# First hour tasks may be placed at, per preference (energyPlanner startHour, widened
+# so the low-energy window of 'afternoon'/'night' is usable too)
+DEFAULT_DAY_START = {"morning": 6, "afternoon": 8, "night": 13, "none": 9}
+DEFAULT_DAY_END = 23
+
+# Penalty per 15-minute block for a task of a given difficulty in a given slot type.
+# Hard tasks belong in peak slots, easy ones should not waste them; tasks of
+# unknown difficulty go anywhere (hard tasks are placed first, so they still get the peak)
+SLOT_PENALTY = {
+    "high": {"peak": 0, "neutral": 2, "low": 4},
+    "neutral": {"peak": 0, "neutral": 0, "low": 0},
+    "low": {"peak": 2, "neutral": 1, "low": 0},
+}
+
+# Small per-block cost of starting later, so equal-cost placements stay compact and early
+LATENESS_PENALTY = 0.01
+
+DIFFICULTY_ORDER = {"high": 0, "neutral": 1, "low": 2}
+
+# Quiz accuracy on a task's topic below/above which it counts as hard/easy
+WEAK_TOPIC_ACCURACY = 0.6
+STRONG_TOPIC_ACCURACY = 0.85
+
+_HIGH_TYPE_WORDS = ("new concept", "problem solving", "numerical", "hard", "assignment", "project")
+_HIGH_TITLE_WORDS = ("difficult", "chapter")
+_LOW_TYPE_WORDS = ("revision", "review", "notes", "easy", "video")
+_LOW_TITLE_WORDS = ("quick", "intro")
+
+
+def parse_task_title(title: str) -> tuple:
+    """
+    (kind, topics) of a generated plan title such as "Study A & B + Review C":
+    kind is 'Review' when the day only revises topics, else 'Study'.
+    """
+    kinds, topics = set(), []
+    for part in (title or "").split(" + "):
+        verb, _, rest = part.strip().partition(" ")
+        if verb in ("Study", "Review") and rest:
+            kinds.add(verb)
+            topics.extend(t.strip() for t in rest.split(" & ") if t.strip())
+    return ("Review" if kinds == {"Review"} else "Study"), topics
+
+
+def classify_task_difficulty(task_type: str, title: str, feedback: Optional[str] = None,
+                             accuracy: Optional[float] = None) -> str:
+    """
+    Server-side port of classifyTaskDifficulty() in energyPlanner.ts, plus the
+    student's quiz accuracy on the task's topic when known.
+    Returns 'high', 'low' or 'neutral'.
+    """
+    if feedback == "hard":
+        return "high"
+    if feedback == "easy":
+        return "low"
+    if accuracy is not None:
+        if accuracy < WEAK_TOPIC_ACCURACY:
+            return "high"
+        if accuracy >= STRONG_TOPIC_ACCURACY:
+            return "low"
+
+    lower_type = (task_type or "").lower()
+    lower_title = (title or "").lower()
+
+    if any(w in lower_type for w in _HIGH_TYPE_WORDS) or any(w in lower_title for w in _HIGH_TITLE_WORDS):
+        return "high"
+    if any(w in lower_type for w in _LOW_TYPE_WORDS) or any(w in lower_title for w in _LOW_TITLE_WORDS):
+        return "low"
+    return "neutral"
+
+
+def _block_types(preference: str) -> list:
+    types = ["neutral"] * BLOCKS_PER_DAY
+    # Later entries win on overlap; list peak last so it takes precedence
+    for start, end, slot_type in sorted(ENERGY_SLOTS.get(preference, []), key=lambda s: s[2] == "peak"):
+        for b in range(start * 60 // BLOCK_MINUTES, end * 60 // BLOCK_MINUTES):
+            types[b] = slot_type
+    return types
+
+
+def _prefix(values) -> list:
+    out = [0]
+    for v in values:
+        out.append(out[-1] + v)
+    return out
+
+
+class _CostTable:
+    """
+    Prefix sums of the per-block penalty for each difficulty. The day grid is the
+    same for every day of the horizon, so the cost of any placement is O(1).
+    """
+
+    def __init__(self, preference: str):
+        self.block_types = _block_types(preference)
+        self.prefix = {
+            difficulty: _prefix(SLOT_PENALTY[difficulty][t] for t in self.block_types)
+            for difficulty in SLOT_PENALTY
+        }
+
+    def cost(self, difficulty: str, start: int, blocks: int) -> float:
+        p = self.prefix[difficulty]
+        return p[start + blocks] - p[start] + start * LATENESS_PENALTY
+
+    def tag(self, start: int) -> Optional[str]:
+        slot_type = self.block_types[start]
+        return slot_type if slot_type != "neutral" else None
+
+
+def _blocks_for(minutes: int) -> int:
+    return max(1, -(-int(minutes) // BLOCK_MINUTES))
+
+
+def _start_block(moment: datetime) -> int:
+    return (moment.hour * 60 + moment.minute) // BLOCK_MINUTES
+
+
+class _Day:
+    def __init__(self, day: date, window: tuple):
+        self.day = day
+        self.window = window
+        self.busy = [0] * BLOCKS_PER_DAY
+        self.busy_prefix = None
+        self.locked_blocks = 0
+
+    def occupy(self, start: int, blocks: int, amount: int = 1):
+        for b in range(max(0, start), min(BLOCKS_PER_DAY, start + blocks)):
+            self.busy[b] += amount
+        self.busy_prefix = None
+
+    def best_start(self, costs: _CostTable, difficulty: str, blocks: int):
+        if self.busy_prefix is None:
+            self.busy_prefix = _prefix(1 if b else 0 for b in self.busy)
+        busy = self.busy_prefix
+        first, last = self.window
+        best, best_cost = None, None
+        for start in range(first, last - blocks + 1):
+            if busy[start + blocks] - busy[start]:
+                continue
+            c = costs.cost(difficulty, start, blocks)
+            if best_cost is None or c < best_cost:
+                best, best_cost = start, c
+        return best, best_cost
+
+
+def _schedule_day(day: _Day, tasks: list, costs: _CostTable) -> list:
+    """
+    Greedy placement (hardest and longest first, each at its cheapest free start),
+    then relocation local search until no move lowers the day's cost.
+    Returns the tasks that did not fit in the day window.
+    """
+    tasks.sort(key=lambda t: (DIFFICULTY_ORDER[t["difficulty"]], -t["blocks"], t["order"]))
+
+    placed, overflow = [], []
+    for task in tasks:
+        start, _ = day.best_start(costs, task["difficulty"], task["blocks"])
+        if start is None:
+            overflow.append(task)
+            continue
+        task["start"] = start
+        day.occupy(start, task["blocks"])
+        placed.append(task)
+
+    for _ in range(LOCAL_SEARCH_PASSES):
+        improved = False
+        for task in placed:
+            current = costs.cost(task["difficulty"], task["start"], task["blocks"])
+            day.occupy(task["start"], task["blocks"], -1)
+            start, c = day.best_start(costs, task["difficulty"], task["blocks"])
+            if start is not None and c < current - 1e-9:
+                task["start"] = start
+                improved = True
+            day.occupy(task["start"], task["blocks"])
+        if not improved:
+            break
+
+    return overflow
+
+
+def optimize_schedule(
+    tasks: list,
+    preference: str = "none",
+    max_minutes_per_day: Optional[int] = None,
+    day_start_hour: Optional[int] = None,
+    day_end_hour: int = DEFAULT_DAY_END,
+    horizon_end: Optional[date] = None,
+) -> dict:
+    """
+    Assign start times to a student's tasks over a plan horizon.
+
+    `tasks` are dicts with task_id, task_type, title, task_date, task_time,
+    duration_minutes and optionally locked, sequence_no, kind (e.g. 'Revision'),
+    topic_accuracy and difficulty_feedback. Locked tasks keep their time and
+    block the grid (untimed ones only count towards the daily limit).
+    Floating tasks are placed day by day: hard tasks into peak-energy slots,
+    easy ones into low slots, never overlapping and never exceeding
+    `max_minutes_per_day` of work (locked tasks included); whatever does not fit a day is
+    carried to the next one (up to `horizon_end`) and otherwise reported
+    as unscheduled.
+    """
+    preference = preference if preference in ENERGY_SLOTS else "none"
+    start_hour = DEFAULT_DAY_START[preference] if day_start_hour is None else day_start_hour
+    window = (start_hour * 60 // BLOCK_MINUTES, min(day_end_hour, 24) * 60 // BLOCK_MINUTES)
+    costs = _CostTable(preference)
+
+    # 1. Bucket tasks per day; locked tasks occupy the grid up front
+    days = {}
+    floating_by_day = {}
+    locked = []
+    for order, task in enumerate(tasks):
+        task_date = task["task_date"]
+        day = days.get(task_date)
+        if day is None:
+            day = days[task_date] = _Day(task_date, window)
+
+        item = {
+            "task": task,
+            "order": (task.get("sequence_no") or 0, order),
+            "blocks": _blocks_for(task.get("duration_minutes") or DEFAULT_TASK_MINUTES),
+            "difficulty": classify_task_difficulty(
+                task.get("kind"), task.get("title"), task.get("difficulty_feedback"), task.get("topic_accuracy")
+            ),
+        }
+        if task.get("locked"):
+            if task.get("task_time"):
+                item["start"] = _start_block(task["task_time"])
+                day.occupy(item["start"], item["blocks"])
+            else:
+                item["start"] = None
+            day.locked_blocks += item["blocks"]
+            locked.append(item)
+            continue
+        floating_by_day.setdefault(task_date, []).append(item)
+
+    if horizon_end is None:
+        horizon_end = max(days) if days else None
+
+    # 2. Walk the horizon in date order, carrying overflow forward
+    scheduled, unscheduled = [], []
+    carry = []
+    pending_days = sorted(floating_by_day)
+    next_pending = 0
+    current = pending_days[0] if pending_days else None
+    while current is not None:
+        queue = carry + floating_by_day.get(current, [])
+        carry = []
+
+        day = days.get(current)
+        if day is None:
+            day = days[current] = _Day(current, window)
+
+        # Daily hour limit (locked tasks count towards it): keep the
+        # earliest-sequenced work, carry the rest
+        if max_minutes_per_day is not None:
+            queue.sort(key=lambda t: t["order"])
+            budget = max_minutes_per_day // BLOCK_MINUTES - day.locked_blocks
+            fits = []
+            for item in queue:
+                if item["blocks"] <= budget:
+                    fits.append(item)
+                    budget -= item["blocks"]
+                else:
+                    carry.append(item)
+            queue = fits
+
+        carry.extend(_schedule_day(day, queue, costs))
+        for item in queue:
+            if "start" in item:
+                item["date"] = current
+                scheduled.append(item)
+
+        while next_pending < len(pending_days) and pending_days[next_pending] <= current:
+            next_pending += 1
+        next_day = current + timedelta(days=1)
+        if carry and next_day <= horizon_end:
+            current = next_day
+        else:
+            unscheduled.extend(carry)
+            carry = []
+            current = pending_days[next_pending] if next_pending < len(pending_days) else None
+
+    # 3. Build results
+    def result(item, task_date, start, moved):
+        task = item["task"]
+        return {
+            "task_id": task["task_id"],
+            "task_type": task["task_type"],
+            "title": task["title"],
+            "task_date": task_date,
+            # Locked tasks without a time keep none
+            "task_time": (
+                datetime.combine(task_date, datetime.min.time()) + timedelta(minutes=start * BLOCK_MINUTES)
+                if start is not None else None
+            ),
+            "duration_minutes": task.get("duration_minutes") or DEFAULT_TASK_MINUTES,
+            "difficulty": item["difficulty"],
+            "energy_tag": costs.tag(start) if start is not None else None,
+            "locked": moved is None,
+            "moved": bool(moved),
+        }
+
+    optimized = [result(item, item["task"]["task_date"], item["start"], None) for item in locked]
+    total_cost = 0.0
+    for item in scheduled:
+        task = item["task"]
+        new_time = datetime.combine(item["date"], datetime.min.time()) + timedelta(minutes=item["start"] * BLOCK_MINUTES)
+        total_cost += costs.cost(item["difficulty"], item["start"], item["blocks"])
+        optimized.append(result(item, item["date"], item["start"], new_time != task.get("task_time")))
+    optimized.sort(key=lambda t: (
+        t["task_time"] or datetime.combine(t["task_date"], datetime.min.time()), t["task_type"], t["task_id"]
+    ))
+
+    if preference == "none":
+        explanation = "Schedule evenly distributed."
+    else:
+        explanation = f"Schedule optimized for {preference.capitalize()} energy."
+    if locked:
+        explanation += " Manual overrides respected."
+    if unscheduled:
+        explanation += f" {len(unscheduled)} task(s) did not fit the daily limits."
+
+    return {
+        "tasks": optimized,
+        "unscheduled": [
+            {"task_id": item["task"]["task_id"], "task_type": item["task"]["task_type"], "title": item["task"]["title"]}
+            for item in unscheduled
+        ],
+        "cost": round(total_cost, 2),
+        "explanation": explanation,
+    }
@@ -0,0 +1,107 @@
+import heapq
+import math
+from typing import Optional
+
+# SM-2 style intervals: first review the next day, then a few days later,
+# then each interval is multiplied by the topic's ease factor
+FIRST_INTERVAL = 1
+SECOND_INTERVAL = 3
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+MAX_EASE = 3.0
+
+
+def ease_from_accuracy(accuracy: Optional[float]) -> float:
+    """
+    Map quiz accuracy (0..1) onto an ease factor: weak topics come back often,
+    strong ones are spaced out. Unknown accuracy uses the SM-2 default.
+    """
+    if accuracy is None:
+        return DEFAULT_EASE
+    accuracy = min(1.0, max(0.0, accuracy))
+    return MIN_EASE + (MAX_EASE - MIN_EASE) * accuracy
+
+
+def _next_interval(interval: int, reps: int, ease: float) -> int:
+    if reps == 1:
+        return FIRST_INTERVAL
+    if reps == 2:
+        return SECOND_INTERVAL
+    return max(interval + 1, int(round(interval * ease)))
+
+
+def _reviewed_interval(interval: int, reps: int, ease: float, elapsed: int) -> int:
+    """
+    Interval after the `reps`-th review, `elapsed` days after the previous one.
+    A review pulled forward (elapsed < interval) only earns the share of the
+    growth the topic actually waited for, so early reviews don't inflate the
+    intervals that follow.
+    """
+    grown = _next_interval(interval, reps, ease)
+    if elapsed >= interval:
+        return grown
+    return interval + int(round((grown - interval) * elapsed / interval))
+
+
+def schedule_topics(topics: list, n_days: int, accuracy: Optional[dict] = None) -> list:
+    """
+    Expanding-interval schedule of `topics` over `n_days` study days.
+
+    Returns one entry per day: {"new": [topics introduced], "review": [topic or nothing]}.
+    New topics are introduced in order, spread so all of them are covered
+    before the last day; each day also reviews the most overdue topic from a
+    min-heap keyed by due day, so a full plan costs O(days * log(topics)).
+    Once every topic is introduced and nothing is due, the topic due soonest
+    is pulled forward so no day is left empty; its interval then grows only
+    in proportion to the days actually elapsed.
+    """
+    accuracy = accuracy or {}
+    topics = topics or ["General Study"]
+
+    ease = [ease_from_accuracy(accuracy.get(t.lower())) for t in topics]
+    interval = [0] * len(topics)
+    reps = [0] * len(topics)
+    last_seen = [0] * len(topics)
+
+    due = [] # (due_day, topic_index)
+    next_new = 0
+    days = []
+
+    for d in range(n_days):
+        day = {"new": [], "review": []}
+
+        # 1. Introduce new topics, spreading what's left over the remaining days
+        remaining_new = len(topics) - next_new
+        if remaining_new:
+            # Spread the remaining topics evenly over the days left (at least one a day)
+            introduce = math.ceil(remaining_new / (n_days - d))
+            for _ in range(introduce):
+                i = next_new
+                next_new += 1
+                reps[i] = 1
+                interval[i] = _next_interval(0, 1, ease[i])
+                last_seen[i] = d
+                heapq.heappush(due, (d + interval[i], i))
+                day["new"].append(topics[i])
+
+        # 2. Review the most overdue topic (or pull the next one forward on an idle day)
+        if due and (due[0][0] <= d or not day["new"]):
+            _, i = heapq.heappop(due)
+            reps[i] += 1
+            interval[i] = _reviewed_interval(interval[i], reps[i], ease[i], d - last_seen[i])
+            last_seen[i] = d
+            heapq.heappush(due, (d + interval[i], i))
+            day["review"].append(topics[i])
+
+        days.append(day)
+
+    return days
+
+
+def day_title(day: dict) -> str:
+    parts = []
+    if day["new"]:
+        parts.append(f"Study {' & '.join(day['new'])}")
+    if day["review"]:
+        parts.append(f"Review {' & '.join(day['review'])}")
+    return " + ".join(parts) or "Study General Study"
@@ -0,0 +1,253 @@
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import case, update
+from sqlalchemy.orm import Session
+
+from database import dialect_insert
+from models import (
+    CreateTaskAI, CreateTaskManual, StudentDailyStats, StudentGoalStats, StudentStats,
+    StudentTopicStats, StudyGoal
+)
+
+COMPLETED = "completed"
+
+# Manual tasks have no duration column; the planner treats them as one hour
+MANUAL_TASK_MINUTES = 60
+
+GENERAL_TOPIC = "General"
+
+
+def add_counts(db: Session, model, key_names: tuple, rows: list, fixed: tuple = ()):
+    """
+    Add counters onto aggregate rows with one INSERT ... ON CONFLICT DO UPDATE,
+    creating missing rows. `rows` are dicts with the key columns and the same
+    counter columns; `fixed` columns are only written when the row is created.
+    """
+    if not rows:
+        return
+    insert = dialect_insert(db)
+    stmt = insert(model).values(rows)
+    table = model.__table__
+    set_ = {
+        name: table.c[name] + stmt.excluded[name]
+        for name in rows[0] if name not in key_names and name not in fixed
+    }
+    if "updated_at" in table.c:
+        set_["updated_at"] = datetime.utcnow()
+    db.execute(stmt.on_conflict_do_update(index_elements=list(key_names), set_=set_))
+
+
+def _touch_streak(db: Session, user_id: int, day: date):
+    """
+    Extend the streak when `day` follows the last active day, restart it after a gap.
+    Done in one UPDATE so concurrent requests don't lose an increment.
+    """
+    new_streak = case(
+        (StudentStats.last_active_date == day, StudentStats.current_streak),
+        (StudentStats.last_active_date == day - timedelta(days=1), StudentStats.current_streak + 1),
+        else_=1
+    )
+    db.execute(
+        update(StudentStats)
+        .where(StudentStats.user_id == user_id)
+        .values(
+            current_streak=new_streak,
+            longest_streak=case((new_streak > StudentStats.longest_streak, new_streak), else_=StudentStats.longest_streak),
+            last_active_date=day
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def record_task_completions(db: Session, user_id: int, tasks: list, delta: int = 1, touch_streak: bool = None):
+    """
+    Update aggregates for tasks that became completed (delta=1) or were
+    un-completed (delta=-1). `tasks` are (goal_id or None, task_date, minutes).
+    Per-day counts are bucketed by the task's scheduled date, so reverting a
+    completion hits the same row. Does not commit.
+    """
+    per_day, per_goal = {}, {}
+    count = minutes_total = 0
+    for goal_id, task_date, minutes in tasks:
+        minutes = minutes or 0
+        count += 1
+        minutes_total += minutes
+        if task_date is not None:
+            n, m = per_day.get(task_date, (0, 0))
+            per_day[task_date] = (n + 1, m + minutes)
+        if goal_id:
+            n, m = per_goal.get(goal_id, (0, 0))
+            per_goal[goal_id] = (n + 1, m + minutes)
+    if not count:
+        return
+
+    add_counts(db, StudentStats, ("user_id",), [
+        {"user_id": user_id, "tasks_completed": delta * count, "study_minutes": delta * minutes_total}
+    ])
+    add_counts(db, StudentDailyStats, ("user_id", "stat_date"), [
+        {"user_id": user_id, "stat_date": d, "tasks_completed": delta * n, "study_minutes": delta * m}
+        for d, (n, m) in per_day.items()
+    ])
+    add_counts(db, StudentGoalStats, ("user_id", "goal_id"), [
+        {"user_id": user_id, "goal_id": g, "tasks_completed": delta * n, "study_minutes": delta * m}
+        for g, (n, m) in per_goal.items()
+    ])
+    if touch_streak is None:
+        touch_streak = delta > 0
+    if touch_streak:
+        _touch_streak(db, user_id, datetime.utcnow().date())
+
+
+def task_state(task_type: str, status: str, goal_id: Optional[int], task_date: Optional[date],
+               minutes: Optional[int]) -> tuple:
+    """(status, goal_id, task_date, minutes) snapshot of a task for record_task_changes."""
+    if task_type == "manual":
+        return (status, None, task_date, MANUAL_TASK_MINUTES)
+    return (status, goal_id, task_date, minutes or 0)
+
+
+def record_task_changes(db: Session, user_id: int, changes: list):
+    """
+    Update aggregates for edited tasks. `changes` are (before, after) task_state
+    pairs; only tasks that were or are completed matter. Editing a completed
+    task's date or duration moves its contribution. Does not commit.
+    """
+    removed, added = [], []
+    newly_completed = False
+    for before, after in changes:
+        was, now = before[0] == COMPLETED, after[0] == COMPLETED
+        if was and now and before[1:] == after[1:]:
+            continue
+        if was:
+            removed.append(before[1:])
+        if now:
+            added.append(after[1:])
+            newly_completed = newly_completed or not was
+
+    record_task_completions(db, user_id, removed, -1)
+    record_task_completions(db, user_id, added, 1, touch_streak=newly_completed)
+
+
+def set_task_status(db: Session, task_type: str, user_id: int, status: str, *criteria) -> int:
+    """
+    Bulk status change for a student's tasks matching `criteria`, keeping the
+    aggregates exact: UPDATE ... RETURNING reports exactly which rows crossed
+    the 'completed' boundary. Returns the number of tasks changed. Does not commit.
+    """
+    if task_type == "ai":
+        model, status_col = CreateTaskAI, CreateTaskAI.task_status
+        returning = (CreateTaskAI.goal_id, CreateTaskAI.task_date, CreateTaskAI.duration_minutes)
+    else:
+        model, status_col = CreateTaskManual, CreateTaskManual.status
+        returning = (CreateTaskManual.task_date,)
+
+    def run(*extra):
+        rows = db.execute(
+            update(model)
+            .where(model.student_id == user_id, *criteria, *extra)
+            .values({status_col: status})
+            .returning(*returning)
+            .execution_options(synchronize_session=False)
+        ).all()
+        if task_type == "ai":
+            return [(row.goal_id, row.task_date, row.duration_minutes or 0) for row in rows]
+        return [(None, row.task_date, MANUAL_TASK_MINUTES) for row in rows]
+
+    if status == COMPLETED:
+        changed = run(status_col != COMPLETED)
+        record_task_completions(db, user_id, changed, 1)
+        return len(changed)
+
+    reverted = run(status_col == COMPLETED)
+    record_task_completions(db, user_id, reverted, -1)
+    others = run(status_col != status)
+    return len(reverted) + len(others)
+
+
+def record_quiz_submission(db: Session, user_id: int, topic: Optional[str], answered: int, correct: int):
+    """Update aggregates for a submitted quiz. Does not commit."""
+    topic = (topic or "").strip()[:100] or GENERAL_TOPIC
+    today = datetime.utcnow().date()
+    counts = {"quizzes_taken": 1, "answers_total": answered, "answers_correct": correct}
+
+    add_counts(db, StudentStats, ("user_id",), [{"user_id": user_id, **counts}])
+    add_counts(db, StudentDailyStats, ("user_id", "stat_date"), [{"user_id": user_id, "stat_date": today, **counts}])
+    add_counts(db, StudentTopicStats, ("user_id", "topic"), [{"user_id": user_id, "topic": topic, **counts}])
+    _touch_streak(db, user_id, today)
+
+
+def _accuracy(correct: int, total: int) -> Optional[float]:
+    return round(correct / total * 100, 1) if total else None
+
+
+def get_student_dashboard(db: Session, user_id: int, days: int = 30, today: Optional[date] = None) -> dict:
+    """
+    Dashboard numbers from the aggregate tables: a fixed number of indexed
+    queries, independent of how much task and quiz history the student has.
+    """
+    today = today or datetime.utcnow().date()
+    since = today - timedelta(days=days - 1)
+
+    stats = db.get(StudentStats, user_id)
+
+    daily = db.query(StudentDailyStats).filter(
+        StudentDailyStats.user_id == user_id,
+        StudentDailyStats.stat_date >= since,
+        StudentDailyStats.stat_date <= today
+    ).order_by(StudentDailyStats.stat_date).all()
+
+    goals = db.query(StudentGoalStats, StudyGoal.title).outerjoin(
+        StudyGoal, StudyGoal.goal_id == StudentGoalStats.goal_id
+    ).filter(StudentGoalStats.user_id == user_id).order_by(StudentGoalStats.goal_id).all()
+
+    topics = db.query(StudentTopicStats).filter(
+        StudentTopicStats.user_id == user_id
+    ).order_by(StudentTopicStats.answers_total.desc()).all()
+
+    # A streak is still "current" if the student was active today or yesterday
+    current_streak = 0
+    if stats and stats.last_active_date and stats.last_active_date >= today - timedelta(days=1):
+        current_streak = stats.current_streak
+
+    return {
+        "totals": {
+            "tasks_completed": stats.tasks_completed if stats else 0,
+            "study_minutes": stats.study_minutes if stats else 0,
+            "quizzes_taken": stats.quizzes_taken if stats else 0,
+            "quiz_accuracy": _accuracy(stats.answers_correct, stats.answers_total) if stats else None,
+        },
+        "streak": {
+            "current": current_streak,
+            "longest": stats.longest_streak if stats else 0,
+            "last_active_date": stats.last_active_date if stats else None,
+        },
+        "daily": [
+            {
+                "date": d.stat_date,
+                "tasks_completed": d.tasks_completed,
+                "study_minutes": d.study_minutes,
+                "quizzes_taken": d.quizzes_taken,
+                "quiz_accuracy": _accuracy(d.answers_correct, d.answers_total),
+            }
+            for d in daily
+        ],
+        "goals": [
+            {
+                "goal_id": g.goal_id,
+                "title": title,
+                "tasks_completed": g.tasks_completed,
+                "study_minutes": g.study_minutes,
+            }
+            for g, title in goals
+        ],
+        "topics": [
+            {
+                "topic": t.topic,
+                "quizzes_taken": t.quizzes_taken,
+                "answers_total": t.answers_total,
+                "accuracy": _accuracy(t.answers_correct, t.answers_total),
+            }
+            for t in topics
+        ],
+    }
@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from database import dialect_insert
+from models import CreateTaskAI, CreateTaskManual, PlanVersion, TaskTombstone
+
+# The sync cursor is the student's plan version, not a timestamp: every task
+# write leaves sync_version NULL and bump_plan_version stamps it with the new
+# version while holding the plan_versions row lock, so versions are handed out
+# in commit order per student and a token never skips a late commit.
+SYNC_TOKEN_PREFIX = "v"
+
+# Tombstones older than this are pruned; clients with older tokens get a full resync
+TOMBSTONE_RETENTION = timedelta(days=30)
+
+TASK_MODELS = {
+    "ai": CreateTaskAI,
+    "manual": CreateTaskManual,
+}
+
+
+def record_tombstones(db: Session, student_id: int, task_type: str, task_ids: list):
+    if not task_ids:
+        return
+    now = datetime.utcnow()
+    db.execute(insert(TaskTombstone), [
+        {"student_id": student_id, "task_type": task_type, "task_id": task_id, "deleted_at": now}
+        for task_id in task_ids
+    ])
+
+
+def delete_tasks(db: Session, task_type: str, student_id: int, *criteria) -> list:
+    """
+    Delete a student's AI or manual tasks matching `criteria` and leave
+    tombstones so delta sync can tell clients. Returns the deleted task ids.
+    Does not commit.
+    """
+    model = TASK_MODELS[task_type]
+    stmt = (
+        delete(model)
+        .where(model.student_id == student_id, *criteria)
+        .returning(model.task_id)
+        .execution_options(synchronize_session=False)
+    )
+    task_ids = db.execute(stmt).scalars().all()
+    record_tombstones(db, student_id, task_type, task_ids)
+    return task_ids
+
+
+def encode_sync_token(version: int) -> str:
+    return f"{SYNC_TOKEN_PREFIX}{version}"
+
+
+def decode_sync_token(token: str) -> Optional[int]:
+    """
+    Plan version of a sync token, or None for a timestamp token from before
+    versioned sync (those clients get a full resync). Raises ValueError for
+    anything else.
+    """
+    if token.startswith(SYNC_TOKEN_PREFIX):
+        return int(token[len(SYNC_TOKEN_PREFIX):])
+    datetime.fromisoformat(token)
+    return None
+
+
+def prune_tombstones(db: Session, student_id: int):
+    cutoff = datetime.utcnow() - TOMBSTONE_RETENTION
+    pruned = db.execute(
+        delete(TaskTombstone)
+        .where(TaskTombstone.student_id == student_id, TaskTombstone.deleted_at < cutoff)
+        .returning(TaskTombstone.sync_version)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    pruned = max((v for v in pruned if v is not None), default=0)
+    if pruned:
+        # Tokens at or below this version may have missed a pruned delete
+        db.execute(
+            update(PlanVersion)
+            .where(PlanVersion.student_id == student_id)
+            .where(PlanVersion.pruned_version < pruned)
+            .values(pruned_version=pruned)
+        )
+
+
+def bump_plan_version(db: Session, student_id: int) -> int:
+    """
+    Increment the student's plan version (creating it on first use) and stamp
+    it on the task rows and tombstones written in this transaction. Call it in
+    the same transaction as, and after, any change to the student's tasks; the
+    calendar feed uses the version as its ETag and delta sync as its cursor.
+    Returns the new version. Does not commit.
+    """
+    # Pending ORM changes must reach the database before they are stamped
+    db.flush()
+    now = datetime.utcnow()
+    # One upsert, so two concurrent first changes both count instead of one failing.
+    # The row lock it takes is held until commit, which orders concurrent stamps.
+    insert = dialect_insert(db)
+    stmt = insert(PlanVersion).values(student_id=student_id, version=1, updated_at=now)
+    version = db.execute(stmt.on_conflict_do_update(
+        index_elements=[PlanVersion.student_id],
+        set_={"version": PlanVersion.version + 1, "updated_at": now}
+    ).returning(PlanVersion.version)).scalar_one()
+
+    for model in (*TASK_MODELS.values(), TaskTombstone):
+        db.execute(
+            update(model)
+            .where(model.student_id == student_id, model.sync_version.is_(None))
+            .values(sync_version=version)
+            .execution_options(synchronize_session=False)
+        )
+    return version
+
+
+def get_plan_version(db: Session, student_id: int) -> int:
+    version = db.execute(
+        select(PlanVersion.version).where(PlanVersion.student_id == student_id)
+    ).scalar()
+    return version or 0
+
+
+def get_pruned_version(db: Session, student_id: int) -> int:
+    pruned = db.execute(
+        select(PlanVersion.pruned_version).where(PlanVersion.student_id == student_id)
+    ).scalar()
+    return pruned or 0
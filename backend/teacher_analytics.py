@@ -0,0 +1,157 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from models import Quiz, QuizScoreCount, QuizStats, TeacherTopicDailyStats
+from student_analytics import GENERAL_TOPIC, add_counts
+
+
+def elapsed_seconds(start: Optional[datetime], end: Optional[datetime]) -> Optional[int]:
+    """Seconds between an attempt's start and end, or None."""
+    if not start or not end:
+        return None
+    # Naive timestamps are UTC
+    start, end = (
+        t.astimezone(timezone.utc).replace(tzinfo=None) if t.tzinfo else t
+        for t in (start, end)
+    )
+    seconds = int((end - start).total_seconds())
+    return seconds if seconds >= 0 else None
+
+
+def record_attempt_started(db: Session, quiz: Quiz):
+    """Count a new attempt towards the quiz's completion rate. Does not commit."""
+    add_counts(db, QuizStats, ("quiz_id",), [
+        {"quiz_id": quiz.id, "teacher_id": quiz.teacher_id, "attempts_started": 1}
+    ], fixed=("teacher_id",))
+
+
+def record_attempt_completed(db: Session, quiz: Quiz, score: int, total_questions: int,
+                             duration_seconds: Optional[int], answered: int, correct: int):
+    """Add a submitted attempt to the quiz, score histogram and topic rollups. Does not commit."""
+    add_counts(db, QuizStats, ("quiz_id",), [{
+        "quiz_id": quiz.id,
+        "teacher_id": quiz.teacher_id,
+        "attempts_completed": 1,
+        "score_total": score,
+        "questions_total": total_questions,
+        "timed_attempts": 1 if duration_seconds is not None else 0,
+        "time_total_seconds": duration_seconds or 0,
+    }], fixed=("teacher_id",))
+    add_counts(db, QuizScoreCount, ("quiz_id", "score"), [
+        {"quiz_id": quiz.id, "score": score, "attempts": 1}
+    ])
+    add_counts(db, TeacherTopicDailyStats, ("teacher_id", "topic", "stat_date"), [{
+        "teacher_id": quiz.teacher_id,
+        "topic": (quiz.topic or "").strip()[:100] or GENERAL_TOPIC,
+        "stat_date": datetime.utcnow().date(),
+        "attempts": 1,
+        "answers_total": answered,
+        "answers_correct": correct,
+    }])
+
+
+def forget_quiz(db: Session, quiz_id: int):
+    """
+    Drop a deleted quiz's rollups. Topic trends keep its answers, like the
+    student aggregates keep deleted tasks. Does not commit.
+    """
+    db.query(QuizScoreCount).filter(QuizScoreCount.quiz_id == quiz_id).delete(synchronize_session=False)
+    db.query(QuizStats).filter(QuizStats.quiz_id == quiz_id).delete(synchronize_session=False)
+
+
+def _median(histogram: list) -> Optional[float]:
+    """Median of a sorted [(value, count)] histogram."""
+    n = sum(count for _, count in histogram)
+    if not n:
+        return None
+    lower_rank, upper_rank = (n - 1) // 2, n // 2
+    lower = upper = None
+    seen = 0
+    for value, count in histogram:
+        if lower is None and seen + count > lower_rank:
+            lower = value
+        if seen + count > upper_rank:
+            upper = value
+            break
+        seen += count
+    return (lower + upper) / 2
+
+
+def _ratio(part: int, whole: int, scale: float = 100) -> Optional[float]:
+    return round(part / whole * scale, 1) if whole else None
+
+
+def get_teacher_rollup(db: Session, teacher_id: int, days: int = 30, today: Optional[date] = None) -> dict:
+    """
+    Cohort overview for a teacher from the rollup tables: three queries,
+    however many attempts and answers sit behind them.
+    """
+    today = today or datetime.utcnow().date()
+    since = today - timedelta(days=days - 1)
+
+    quizzes = db.query(Quiz.id, Quiz.title, Quiz.topic, QuizStats).outerjoin(
+        QuizStats, QuizStats.quiz_id == Quiz.id
+    ).filter(Quiz.teacher_id == teacher_id).order_by(Quiz.created_at.desc()).all()
+
+    histograms = {}
+    for quiz_id, score, attempts in db.query(
+        QuizScoreCount.quiz_id, QuizScoreCount.score, QuizScoreCount.attempts
+    ).join(QuizStats, QuizStats.quiz_id == QuizScoreCount.quiz_id).filter(
+        QuizStats.teacher_id == teacher_id
+    ).order_by(QuizScoreCount.quiz_id, QuizScoreCount.score):
+        histograms.setdefault(quiz_id, []).append((score, attempts))
+
+    topic_days = db.query(TeacherTopicDailyStats).filter(
+        TeacherTopicDailyStats.teacher_id == teacher_id,
+        TeacherTopicDailyStats.stat_date >= since,
+        TeacherTopicDailyStats.stat_date <= today
+    ).order_by(TeacherTopicDailyStats.topic, TeacherTopicDailyStats.stat_date).all()
+
+    quiz_rows = []
+    for quiz_id, title, topic, stats in quizzes:
+        completed = stats.attempts_completed if stats else 0
+        started = stats.attempts_started if stats else 0
+        mean_questions = stats.questions_total / completed if completed else 0
+        median_score = _median(histograms.get(quiz_id, []))
+        quiz_rows.append({
+            "quiz_id": quiz_id,
+            "title": title,
+            "topic": topic,
+            "attempts_started": started,
+            "attempts_completed": completed,
+            # Attempts submitted without calling /start are counted as started too
+            "completion_rate": _ratio(completed, max(started, completed)),
+            "mean_score": _ratio(stats.score_total, completed, 1) if stats else None,
+            "mean_percentage": _ratio(stats.score_total, stats.questions_total) if stats else None,
+            "median_score": median_score,
+            "median_percentage": _ratio(median_score, mean_questions) if median_score is not None else None,
+            "average_time_seconds": _ratio(stats.time_total_seconds, stats.timed_attempts, 1) if stats else None,
+        })
+
+    topics = {}
+    for day in topic_days:
+        topic = topics.setdefault(day.topic, {"topic": day.topic, "attempts": 0, "answers_total": 0, "answers_correct": 0, "trend": []})
+        topic["attempts"] += day.attempts
+        topic["answers_total"] += day.answers_total
+        topic["answers_correct"] += day.answers_correct
+        topic["trend"].append({
+            "date": day.stat_date,
+            "attempts": day.attempts,
+            "accuracy": _ratio(day.answers_correct, day.answers_total),
+        })
+
+    return {
+        "quizzes": quiz_rows,
+        "topics": [
+            {
+                "topic": t["topic"],
+                "attempts": t["attempts"],
+                "answers_total": t["answers_total"],
+                "accuracy": _ratio(t["answers_correct"], t["answers_total"]),
+                "trend": t["trend"],
+            }
+            for t in topics.values()
+        ],
+    }
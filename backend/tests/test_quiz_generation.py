@@ -0,0 +1,74 @@
+"""Quiz generation: chunking, deduplication and the top-up after it."""
+import itertools
+import json
+import threading
+
+import pytest
+
+from quiz_generation import IncompleteQuizError, dedupe_questions, generate_quiz
+
+WORDS = ["stack", "queue", "heap", "graph", "tree", "trie", "hash", "list", "array", "deque",
+         "matrix", "vector", "bitset", "bloom", "segment", "fenwick", "suffix", "rope", "skip", "splay"]
+
+
+class _Text:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """Answers quiz prompts with `count` questions from `make_text(n)`, n counting up across calls."""
+
+    def __init__(self, make_text):
+        self.make_text = make_text
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def generate_content(self, prompt, stream=False):
+        count = int(prompt.split("Number of Questions:")[1].split()[0])
+        with self.lock:
+            self.calls += 1
+            numbers = [next(self.counter) for _ in range(count)]
+        text = json.dumps({"title": "T", "description": "D", "questions": [
+            {"text": self.make_text(n), "options": [
+                {"text": letter, "is_correct": letter == "A"} for letter in "ABCD"
+            ]}
+            for n in numbers
+        ]})
+        return [_Text(text[i:i + 50]) for i in range(0, len(text), 50)]
+
+
+def distinct_text(n: int) -> str:
+    a, b, c = WORDS[n % 20], WORDS[n // 20 % 20], WORDS[n // 400 % 20]
+    return f"Which {a} {b} {c} property holds?"
+
+
+def test_duplicates_are_topped_up_to_the_full_count():
+    # Every question is asked twice, so about half of each chunk is dropped as a duplicate
+    model = FakeModel(lambda n: distinct_text(n // 2))
+
+    quiz = generate_quiz(model, "CS", "Data Structures", "Medium", 45)
+
+    texts = [q["text"] for q in quiz["questions"]]
+    assert len(texts) == 45
+    assert len(dedupe_questions(quiz["questions"])) == 45
+
+
+def test_short_quiz_is_an_error_not_a_partial_result():
+    model = FakeModel(lambda n: "Which option is correct?")
+
+    with pytest.raises(IncompleteQuizError):
+        generate_quiz(model, "CS", "Data Structures", "Medium", 12)
+    # The top-up stops at its budget instead of retrying forever
+    assert model.calls < 20
+
+
+@pytest.mark.parametrize("count", [1, 10, 25, 60])
+def test_template_provider_fills_the_quiz(count):
+    from llm import TemplateProvider
+
+    quiz = generate_quiz(TemplateProvider(), "CS", "Data Structures and Algorithms", "Medium", count)
+
+    assert len(quiz["questions"]) == count
+    assert len(dedupe_questions(quiz["questions"])) == count
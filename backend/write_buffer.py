@@ -0,0 +1,273 @@
+import os
+import threading
+
+from sqlalchemy import func, select, update
+
+from database import SessionLocal, dialect_insert
+from models import QuizAttempt, StudentAnswer
+
+
+class WriteBuffer:
+    """
+    Coalesces row upserts in memory and writes them in the background as one
+    multi-row INSERT ... ON CONFLICT DO UPDATE per flush.
+
+    Rows are keyed by their unique columns; a newer write for the same key
+    replaces the pending one, so a burst of edits costs a single row write.
+    Pending rows are flushed every `flush_interval` seconds, sooner once
+    `max_pending` keys are waiting, and on demand for a subset of keys
+    (e.g. right before an attempt is submitted).
+    """
+
+    def __init__(self, model, key_columns: tuple, flush_interval: float, max_pending: int, name: str):
+        self.model = model
+        self.key_columns = key_columns
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.name = name
+        self._pending = {}
+        self._lock = threading.Lock()
+        # Serializes flushes: once flush() returns, rows taken by a concurrent
+        # background flush are committed too
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._stopped = False
+
+    def put(self, row: dict):
+        key = tuple(row[column] for column in self.key_columns)
+        with self._lock:
+            self._merge(key, row)
+            full = len(self._pending) >= self.max_pending
+            if self._thread is None and not self._stopped:
+                self._thread = threading.Thread(target=self._run, name=f"{self.name}-flush", daemon=True)
+                self._thread.start()
+        if full:
+            self._wake.set()
+
+    def _merge(self, key: tuple, row: dict):
+        # Called with _lock held
+        self._pending[key] = row
+
+    def pending(self, match=None) -> list:
+        """Rows not written yet (matching `match(key)`), newest value per key."""
+        with self._lock:
+            return [row for key, row in self._pending.items() if match is None or match(key)]
+
+    def _take(self, match=None) -> dict:
+        with self._lock:
+            if match is None:
+                taken, self._pending = self._pending, {}
+            else:
+                taken = {key: row for key, row in self._pending.items() if match(key)}
+                for key in taken:
+                    del self._pending[key]
+        return taken
+
+    def _restore(self, taken: dict):
+        # Keep rows that failed to write, unless a newer value arrived meanwhile
+        with self._lock:
+            for key, row in taken.items():
+                self._pending.setdefault(key, row)
+
+    def discard(self, match, taken_rows: list = None) -> int:
+        """
+        Drop pending rows whose key satisfies `match` without writing them
+        (recorded in `taken_rows` like flush() does, to undo on rollback).
+        """
+        taken = self._take(match)
+        if taken and taken_rows is not None:
+            taken_rows.append((self, taken))
+        return len(taken)
+
+    def write(self, db, rows: list):
+        """Upsert `rows` right away in the caller's transaction."""
+        if not rows:
+            return
+        insert = dialect_insert(db)
+        stmt = insert(self.model).values(rows)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=list(self.key_columns),
+            set_={name: stmt.excluded[name] for name in rows[0] if name not in self.key_columns}
+        ))
+
+    def _write_own(self, session, rows: list) -> int:
+        """Write from the buffer's own session (background or standalone flush). Returns rows written."""
+        self.write(session, rows)
+        return len(rows)
+
+    def flush(self, db=None, match=None, taken_rows: list = None) -> int:
+        """
+        Write pending rows (those whose key satisfies `match`, or all).
+        With `db` the write joins the caller's transaction and the caller
+        commits; otherwise it runs and commits in its own session.
+
+        The rows leave the buffer as soon as they are written, so a caller
+        whose transaction may still roll back passes `taken_rows` and hands
+        it to restore_rows() when it does.
+        """
+        with self._flush_lock:
+            taken = self._take(match)
+            if not taken:
+                return 0
+            rows = list(taken.values())
+
+            if db is not None:
+                try:
+                    self.write(db, rows)
+                except Exception:
+                    self._restore(taken)
+                    raise
+                if taken_rows is not None:
+                    taken_rows.append((self, taken))
+                return len(rows)
+
+            session = SessionLocal()
+            try:
+                written = self._write_own(session, rows)
+                session.commit()
+                return written
+            except Exception as e:
+                session.rollback()
+                print(f"[WARN] {self.name} batch write failed, retrying rows one by one: {e}")
+            finally:
+                session.close()
+
+            return self._write_each(taken)
+
+    def _write_each(self, taken: dict) -> int:
+        # A row that breaks a constraint (e.g. its attempt was deleted) must not
+        # block the rest forever: rows that fail alone are dropped. If every row
+        # fails the database is probably unreachable, so all of them are kept.
+        written, succeeded, failed = 0, 0, {}
+        for key, row in taken.items():
+            session = SessionLocal()
+            try:
+                count = self._write_own(session, [row])
+                session.commit()
+                written += count
+                succeeded += 1
+            except Exception as e:
+                session.rollback()
+                failed[key] = (row, e)
+            finally:
+                session.close()
+
+        if failed and not succeeded:
+            self._restore({key: row for key, (row, _) in failed.items()})
+            raise next(iter(failed.values()))[1]
+        for key, (_, e) in failed.items():
+            print(f"[ERROR] {self.name} dropped row {key}: {e}")
+        return written
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[ERROR] {self.name} flush failed, will retry: {e}")
+
+    def stop(self):
+        """Stop the background thread and write whatever is still pending."""
+        self._stopped = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+
+class AnswerBuffer(WriteBuffer):
+    """
+    A WriteBuffer for autosaved answers that never writes to a graded attempt.
+
+    Grading claims the attempt with a conditional UPDATE before it flushes the
+    attempt's answers into its own transaction, so those writes are trusted.
+    A flush from the buffer's own session locks the attempts it writes to and
+    keeps only rows whose attempt is still open: a flush that wins the lock is
+    committed before grading reads the answers, and one that loses it sees the
+    attempt completed and drops the late rows.
+    """
+
+    def _write_own(self, session, rows: list) -> int:
+        attempt_ids = sorted({row["attempt_id"] for row in rows})
+        open_ids = set(session.execute(
+            select(QuizAttempt.id)
+            .where(QuizAttempt.id.in_(attempt_ids), QuizAttempt.status != "completed")
+            .order_by(QuizAttempt.id)
+            .with_for_update()
+        ).scalars())
+        kept = [row for row in rows if row["attempt_id"] in open_ids]
+        if len(kept) < len(rows):
+            print(f"[INFO] {self.name} dropped {len(rows) - len(kept)} answer(s) saved after their attempt was submitted")
+        self.write(session, kept)
+        return len(kept)
+
+
+class CounterBuffer(WriteBuffer):
+    """
+    A WriteBuffer for counters: increments for the same row add up in
+    memory, and a flush applies them as UPDATE ... SET column =
+    COALESCE(column, 0) + n, one statement per distinct increment.
+    """
+
+    def __init__(self, model, column: str, flush_interval: float, max_pending: int, name: str):
+        super().__init__(model, ("id",), flush_interval, max_pending, name)
+        self.column = column
+
+    def add(self, row_id: int, amount: int = 1):
+        self.put({"id": row_id, self.column: amount})
+
+    def _merge(self, key: tuple, row: dict):
+        pending = self._pending.get(key)
+        if pending is None:
+            self._pending[key] = dict(row)
+        else:
+            pending[self.column] += row[self.column]
+
+    def _restore(self, taken: dict):
+        # Increments that failed to write still count, on top of any newer ones
+        with self._lock:
+            for key, row in taken.items():
+                self._merge(key, row)
+
+    def write(self, db, rows: list):
+        by_amount = {}
+        for row in rows:
+            by_amount.setdefault(row[self.column], []).append(row["id"])
+        column = getattr(self.model, self.column)
+        for amount, ids in by_amount.items():
+            db.execute(
+                update(self.model)
+                .where(self.model.id.in_(ids))
+                .values({self.column: func.coalesce(column, 0) + amount})
+                .execution_options(synchronize_session=False)
+            )
+
+
+def restore_rows(taken_rows: list):
+    """Put rows collected by flush()/discard() back after the caller's transaction rolled back."""
+    for buffer, taken in taken_rows:
+        buffer._restore(taken)
+    taken_rows.clear()
+
+
+# Autosaved quiz answers: one row per (attempt, question), latest selection wins
+answer_buffer = AnswerBuffer(
+    StudentAnswer,
+    ("attempt_id", "question_id"),
+    flush_interval=float(os.getenv("ANSWER_FLUSH_SECONDS", "2")),
+    max_pending=int(os.getenv("ANSWER_FLUSH_MAX_PENDING", "500")),
+    name="answer-buffer"
+)
+
+# Proctoring warnings per attempt; 0 seconds disables buffering (each warning is one atomic UPDATE)
+WARNING_FLUSH_SECONDS = float(os.getenv("WARNING_FLUSH_SECONDS", "0"))
+warning_buffer = CounterBuffer(
+    QuizAttempt,
+    "warnings_count",
+    flush_interval=WARNING_FLUSH_SECONDS,
+    max_pending=int(os.getenv("WARNING_FLUSH_MAX_PENDING", "1000")),
+    name="warning-buffer"
+)
@@ -1,4 +1,4 @@
-import { createContext, useContext, useState, useEffect, type ReactNode } from 'react';
+import { createContext, useContext, useState, useEffect, useRef, type ReactNode } from 'react';
 import api from '../api/axios';
 import { useAuth } from './AuthContext';
 
@@ -82,6 +82,15 @@ export const StudyPlannerProvider = ({ children }: { children: ReactNode }) => {
     const [isLoaded, setIsLoaded] = useState(false);
     const [isLoading, setIsLoading] = useState(false);
 
+    // Last delta-sync token and the task list it applies to
+    const syncTokenRef = useRef<string | null>(null);
+    const tasksRef = useRef<StudyTask[]>([]);
+
+    // Keep the sync base in step with optimistic local updates
+    useEffect(() => {
+        tasksRef.current = allTasks;
+    }, [allTasks]);
+
     // userEnergyPref is now handled purely at runtime
     // Removing fetchUserPref logic and setting initial state to null
 
@@ -158,28 +167,60 @@ export const StudyPlannerProvider = ({ children }: { children: ReactNode }) => {
         }
     };
 
+    // Map an API task row to the planner's task shape
+    const mapTask = (t: any): StudyTask => ({
+        id: t.task_id,
+        task_id: t.task_id, // Map explicitly
+        goal_id: t.goal_id, // Added for goal filtering
+        title: toTitleCase(t.title),
+        task_type: t.title.toLowerCase().includes('exam') ? 'Exam' : 'Study',
+        start_time: t.task_time,
+        task_date: t.task_date,
+        duration_minutes: t.duration_minutes || 60,
+        status: t.task_status,
+        color: t.task_status === 'completed' ? 'bg-success' : 'bg-primary',
+        is_manual: t.is_manual || false,
+        source_type: (t.is_manual || t.task_type === 'manual') ? 'manual' : 'ai' // Canonical source type tracking
+    });
+
+    const taskKey = (sourceType: string | undefined, taskId: number) => `${sourceType}:${taskId}`;
+
     const refreshTasks = async () => {
         if (!user) return;
         try {
-            const response = await api.get('/api/study-planner/tasks');
-            const newTasks = response.data.map((t: any) => ({
-                id: t.task_id,
-                task_id: t.task_id, // Map explicitly
-                goal_id: t.goal_id, // Added for goal filtering
-                title: toTitleCase(t.title),
-                task_type: t.title.toLowerCase().includes('exam') ? 'Exam' : 'Study',
-                start_time: t.task_time,
-                task_date: t.task_date,
-                duration_minutes: t.duration_minutes || 60,
-                status: t.task_status,
-                color: t.task_status === 'completed' ? 'bg-success' : 'bg-primary',
-                is_manual: t.is_manual || false,
-                source_type: (t.is_manual || t.task_type === 'manual') ? 'manual' : 'ai' // Canonical source type tracking
-            }));
+            // Delta sync: after the first load only changed/deleted tasks are transferred
+            const response = await api.get('/api/study-planner/tasks/sync', {
+                params: syncTokenRef.current ? { since: syncTokenRef.current } : {}
+            });
+            const { full, upserts, deleted, sync_token } = response.data;
+            const changedTasks: StudyTask[] = upserts.map(mapTask);
+
+            let newTasks: StudyTask[];
+            if (full) {
+                newTasks = changedTasks;
+            } else {
+                const removedKeys = new Set<string>(deleted.map((d: any) => taskKey(d.task_type, d.task_id)));
+                const changedByKey = new Map(changedTasks.map(t => [taskKey(t.source_type, t.task_id), t]));
+
+                newTasks = tasksRef.current
+                    .filter(t => !removedKeys.has(taskKey(t.source_type, t.task_id)))
+                    .map(t => {
+                        const key = taskKey(t.source_type, t.task_id);
+                        const changed = changedByKey.get(key);
+                        if (changed) changedByKey.delete(key);
+                        return changed || t;
+                    });
+                newTasks.push(...changedByKey.values());
+                newTasks.sort((a, b) => (a.task_date || '').localeCompare(b.task_date || ''));
+            }
+
+            syncTokenRef.current = sync_token;
+            tasksRef.current = newTasks;
             setAllTasks(newTasks);
             calculateCalendarRange(newTasks);
         } catch (error) {
             console.error("Failed to fetch tasks:", error);
+            syncTokenRef.current = null;
             setAllTasks([]);
         }
     };
@@ -258,6 +299,7 @@ export const StudyPlannerProvider = ({ children }: { children: ReactNode }) => {
     // Reset on logout (if user becomes null)
     useEffect(() => {
         if (!user) {
+            syncTokenRef.current = null;
             setAllTasks([]);
             setExams([]);
             setIsLoaded(false);